@@ -0,0 +1,167 @@
+"""
+Admission control for /check_realtime.
+
+The browser's speech recognizer can report several results a second per
+reciter and every one becomes a request. In a busy class these bursts pile
+up behind the worker threads, and an interim result that waited long
+enough would be evaluated after newer ones were already answered.
+RealtimeAdmission sits in front of the handler:
+
+- Requests of one session run one at a time. Each session has a
+  single-slot mailbox for interim messages: a newer interim takes over the
+  slot, merged with the one waiting there (see realtime_protocol.coalesce),
+  and the request that had it returns at once as coalesced.
+- Finals are never coalesced. They run in arrival order, ahead of any
+  waiting interim of their session, and a final drops the waiting interim
+  of its own segment.
+- Requests running or waiting in the process are counted. Once that depth
+  reaches shed_depth new interims are turned away with a cheap 503 and a
+  Retry-After; finals only once it reaches max_depth, or after waiting
+  max_wait seconds for their session.
+
+Admitted, coalesced and shed counts are exported on /metrics to size the
+worker pool. Mailboxes and depth are per process; the WebSocket channel
+(see asgi.py) already handles one message at a time and does not need them.
+"""
+import threading
+import time
+from collections import deque
+
+SHED_DEPTH = 32     # requests running or waiting before interims are shed
+MAX_DEPTH = 64      # ... before finals are shed too
+MAX_WAIT = 5.0      # seconds a request may wait for its session
+RETRY_AFTER = 1     # seconds, sent to shed clients
+
+ADMITTED = 'admitted'
+COALESCED = 'coalesced'
+SHED = 'shed'
+
+
+class _Mailbox:
+    """Per-session admission state"""
+
+    __slots__ = ('busy', 'pending', 'finals', 'waiters', 'ready')
+
+    def __init__(self, lock):
+        self.busy = False         # a request of the session is running
+        self.pending = None       # [message] of the interim waiting in the slot; a new list per owner
+        self.finals = deque()     # tokens of waiting finals, oldest first
+        self.waiters = 0
+        self.ready = threading.Condition(lock)
+
+
+class RealtimeAdmission:
+    """Per-session mailboxes and load shedding for realtime checks"""
+
+    def __init__(self, shed_depth=SHED_DEPTH, max_depth=MAX_DEPTH, max_wait=MAX_WAIT,
+                 retry_after=RETRY_AFTER, coalesce=None, clock=time.monotonic):
+        self.shed_depth = shed_depth
+        self.max_depth = max_depth
+        self.max_wait = max_wait
+        self.retry_after = retry_after
+        # (pending, message) -> message to keep waiting, or None; by default the newest interim wins
+        self.coalesce = coalesce or (lambda pending, message: None if message.get('final') else message)
+        self.clock = clock
+        self.depth = 0
+        self.admitted = 0
+        self.coalesced = 0
+        self.shed = 0
+        self._mailboxes = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, key, message, final):
+        """
+        Admit one message of session key: returns (outcome, message).
+
+        Only an ADMITTED caller runs, with the returned message (possibly
+        merged with interims it replaced), and must call release(key)
+        afterwards.
+        """
+        with self._lock:
+            if self.depth >= (self.max_depth if final else self.shed_depth):
+                self.shed += 1
+                return SHED, message
+            mailbox = self._mailboxes.get(key)
+            if mailbox is None:
+                mailbox = self._mailboxes[key] = _Mailbox(self._lock)
+            self.depth += 1
+            if final and mailbox.pending is not None and self.coalesce(mailbox.pending[0], message) is None:
+                # The interim waiting for this segment is out of date
+                mailbox.pending = None
+                mailbox.ready.notify_all()
+            if not mailbox.busy and not mailbox.finals and (final or mailbox.pending is None):
+                return self._admit(mailbox, message)
+
+            mailbox.waiters += 1
+            try:
+                if final:
+                    outcome, message = self._wait_final(mailbox, message)
+                else:
+                    outcome, message = self._wait_interim(mailbox, message)
+            finally:
+                mailbox.waiters -= 1
+            if outcome != ADMITTED:
+                self.depth -= 1
+                self._forget(key, mailbox)
+            return outcome, message
+
+    def release(self, key):
+        """Let the next waiting request of session key run"""
+        with self._lock:
+            self.depth -= 1
+            mailbox = self._mailboxes[key]
+            mailbox.busy = False
+            mailbox.ready.notify_all()
+            self._forget(key, mailbox)
+
+    def _admit(self, mailbox, message):
+        mailbox.busy = True
+        self.admitted += 1
+        return ADMITTED, message
+
+    def _wait_final(self, mailbox, message):
+        token = object()
+        mailbox.finals.append(token)
+        deadline = self.clock() + self.max_wait
+        while mailbox.busy or mailbox.finals[0] is not token:
+            if not self._wait(mailbox, deadline):
+                mailbox.finals.remove(token)
+                mailbox.ready.notify_all()
+                self.shed += 1
+                return SHED, message
+        mailbox.finals.popleft()
+        return self._admit(mailbox, message)
+
+    def _wait_interim(self, mailbox, message):
+        if mailbox.pending is not None:
+            message = self.coalesce(mailbox.pending[0], message)
+        slot = mailbox.pending = [message]
+        # Wakes the request that owned the slot so it can return
+        mailbox.ready.notify_all()
+        deadline = self.clock() + self.max_wait
+        while mailbox.pending is slot and (mailbox.busy or mailbox.finals):
+            if not self._wait(mailbox, deadline):
+                mailbox.pending = None
+                self.shed += 1
+                return SHED, message
+        if mailbox.pending is not slot:
+            self.coalesced += 1
+            return COALESCED, message
+        mailbox.pending = None
+        return self._admit(mailbox, message)
+
+    def _wait(self, mailbox, deadline):
+        remaining = deadline - self.clock()
+        if remaining <= 0:
+            return False
+        mailbox.ready.wait(remaining)
+        return True
+
+    def _forget(self, key, mailbox):
+        if not mailbox.busy and not mailbox.waiters:
+            del self._mailboxes[key]
+
+    def counts(self):
+        """{outcome: requests} since startup"""
+        with self._lock:
+            return {ADMITTED: self.admitted, COALESCED: self.coalesced, SHED: self.shed}
@@ -0,0 +1,252 @@
+"""
+Incremental streaming aligner for realtime recitation checking.
+
+The aligner keeps one row of a banded edit-distance DP over a window of the
+surah's normalized words around the reciter's position. Each spoken word
+advances that row once, so a call costs O(window) no matter how long the
+transcript or the surah is. Besides the usual match / substitute / extra /
+skip moves, any cell in the window can be reached by a "jump" from the best
+previous cell, which lets the aligner re-anchor after long skips, repeated
+phrases and restarted verses instead of reporting every later word wrong.
+
+The state (position, window start and DP row) is a small dict that can be
+kept in the session between requests.
+
+Given the vocabulary ids of the text (see vocabulary.py), the cost of
+aligning a spoken word to each text word of the window is an integer
+comparison against the word's precomputed similar ids. String similarity
+then only runs for spoken words outside the vocabulary and for the scores
+of the errors that are reported. The window is too small for NumPy to pay
+for its per-call overhead, so the row itself stays a Python list.
+"""
+import confusions
+from vocabulary import OOV
+
+INF = float('inf')
+
+# Move costs
+EXTRA_COST = 1.0        # spoken word that is not in the text
+SKIP_COST = 0.9         # text word that was not spoken (just below a mismatch)
+SIMILAR_COST = 0.3      # spoken word close to the expected one
+MISMATCH_COST = 1.0     # spoken word clearly different from the expected one
+JUMP_AHEAD_COST = 2.5   # re-anchor further ahead (long skip)
+JUMP_BACK_COST = 0.9    # re-anchor behind (repeat / restarted verse)
+
+# Window around the current position, in words
+LOOK_BEHIND = 32
+LOOK_AHEAD = 48
+
+ALIGN, EXTRA, SKIP, JUMP = range(4)
+
+
+class JoinedWords:
+    """Two word sequences read as one, so alignment can run on into the next surah"""
+
+    __slots__ = ('first', 'second', 'split')
+
+    def __init__(self, first, second):
+        self.first = first
+        self.second = second
+        self.split = len(first)
+
+    def __len__(self):
+        return self.split + len(self.second)
+
+    def __getitem__(self, key):
+        split = self.split
+        if isinstance(key, slice):
+            start, stop, step = key.indices(len(self))
+            if step != 1:
+                return [self[i] for i in range(start, stop, step)]
+            if stop <= split:
+                return self.first[start:stop]
+            if start >= split:
+                return self.second[start - split:stop - split]
+            return list(self.first[start:split]) + list(self.second[0:stop - split])
+        if key < 0:
+            key += len(self)
+        return self.first[key] if key < split else self.second[key - split]
+
+
+class StreamingAligner:
+    """Resumable banded aligner over a surah's normalized word array"""
+
+    def __init__(self, words, compare, original_words=None, position=0,
+                 look_behind=LOOK_BEHIND, look_ahead=LOOK_AHEAD, ids=None, vocabulary=None):
+        self.words = words
+        self.compare = compare
+        self.original_words = original_words
+        # Vocabulary ids of words; vocabulary.similar_to() must agree with compare
+        self.ids = ids if vocabulary is not None else None
+        self.vocabulary = vocabulary
+        self.look_behind = look_behind
+        self.look_ahead = look_ahead
+        self.position = min(max(position, 0), len(words))
+        # Row over positions [lo, lo + len(row)); position k means k words consumed
+        self.lo = self.position
+        self.row = [0.0]
+
+    @classmethod
+    def from_state(cls, words, compare, state, original_words=None, ids=None, vocabulary=None):
+        aligner = cls(words, compare, original_words, state['position'], ids=ids, vocabulary=vocabulary)
+        aligner.lo = state['lo']
+        aligner.row = list(state['row'])
+        return aligner
+
+    def state(self):
+        return {'position': self.position, 'lo': self.lo, 'row': self.row}
+
+    def rebase(self, offset):
+        """Drop the first offset text words (a finished surah); positions then count from there"""
+        if self.lo < offset:
+            self.row = self.row[offset - self.lo:] or [0.0]
+            self.lo = offset
+        self.lo -= offset
+        self.position = max(self.position - offset, 0)
+
+    def _advance(self, word):
+        """
+        Advance the DP row by one spoken word.
+
+        Returns the trace needed to backtrack through this step: the window
+        start, the move into each cell, the cell a jump came from, and the
+        cost of aligning the word to each cell's text word.
+        """
+        previous = self.position
+        total = len(self.words)
+        lo = max(0, previous - self.look_behind)
+        hi = min(total, previous + self.look_ahead)
+        best_old = min(self.row)
+        jump_from = self.lo + self.row.index(best_old)
+        sub_costs = self._substitution_costs(word, lo, hi)
+        costs, moves = self._relax(lo, hi, sub_costs, best_old, jump_from)
+
+        # Skipped text words (deletions) propagate left to right
+        for i in range(1, len(costs)):
+            skipped = costs[i - 1] + SKIP_COST
+            if skipped < costs[i]:
+                costs[i] = skipped
+                moves[i] = SKIP
+
+        floor = min(costs)
+        self.lo = lo
+        self.row = [cost - floor for cost in costs]
+
+        # Cheapest cell wins; ties go to the cell closest to the expected next position
+        best = min((i for i, cost in enumerate(costs) if cost == floor), key=lambda i: abs(lo + i - previous - 1))
+        self.position = lo + best
+        return lo, moves, jump_from, sub_costs
+
+    def _substitution_costs(self, word, lo, hi):
+        """Cost of aligning word to the text word before each cell in [lo, hi] (none before cell 0)"""
+        base = max(lo - 1, 0)
+        costs = [INF] if lo == 0 else []
+        spoken_id = self.vocabulary.id(word) if self.ids is not None else OOV
+        if spoken_id != OOV:
+            similar = self.vocabulary.similar_to(spoken_id)
+            return costs + [0.0 if expected == spoken_id else SIMILAR_COST if expected in similar else MISMATCH_COST
+                            for expected in self.ids[base:hi]]
+
+        # One slice per step: cheap on tuples, a single decode on a mapped corpus image
+        window = self.words[base:hi]
+        word_costs = {}
+        for expected in window:
+            if expected not in word_costs:
+                if word == expected:
+                    word_costs[expected] = 0.0
+                elif self._similarity(word, expected)[0]:
+                    word_costs[expected] = SIMILAR_COST
+                else:
+                    word_costs[expected] = MISMATCH_COST
+        costs.extend(word_costs[expected] for expected in window)
+        return costs
+
+    def _previous_row(self, lo, hi):
+        """Previous row over cells [lo - 1, hi], INF outside the old window"""
+        old = [INF] * (hi - lo + 2)
+        shift = self.lo - lo + 1
+        first, last = max(shift, 0), min(shift + len(self.row), len(old))
+        if first < last:
+            old[first:last] = self.row[first - shift:last - shift]
+        return old
+
+    def _relax(self, lo, hi, sub_costs, best_old, jump_from):
+        """Cheapest extra / align / jump move into each cell of [lo, hi]"""
+        old = self._previous_row(lo, hi)
+        costs = []
+        moves = []
+        for k, sub_cost, before, here in zip(range(lo, hi + 1), sub_costs, old, old[1:]):
+            cost = here + EXTRA_COST
+            move = EXTRA
+            diagonal = before + sub_cost
+            if diagonal < cost:
+                cost, move = diagonal, ALIGN
+            jump = best_old + sub_cost + (JUMP_BACK_COST if k - 1 < jump_from else JUMP_AHEAD_COST)
+            if jump < cost:
+                cost, move = jump, JUMP
+            costs.append(cost)
+            moves.append(move)
+        return costs, moves
+
+    def _similarity(self, word, expected):
+        if word == expected:
+            return True, 1.0
+        return self.compare(word, expected)
+
+    def feed(self, spoken_words):
+        """
+        Align spoken words in order and return realtime errors in the checker's format.
+
+        The DP decides the cheapest path over the whole batch, so a skipped
+        word is reported as missing rather than as a run of wrong words.
+        Errors are reported once per batch and never retracted later.
+        """
+        start = self.position
+        traces = [(word, self._advance(word)) for word in spoken_words]
+
+        # Backtrack from the final position to recover what each word did
+        errors = []
+        k = self.position
+        for word, (lo, moves, jump_from, sub_costs) in reversed(traces):
+            i = k - lo
+            while moves[i] == SKIP:
+                errors.append(self._error('missing', k - 1))
+                k -= 1
+                i -= 1
+            move = moves[i]
+            if move == EXTRA:
+                errors.append(self._error('extra', k, spoken=word))
+                continue
+            if sub_costs[i] == MISMATCH_COST:
+                similarity = self._similarity(word, self.words[k - 1])[1]
+                errors.append(self._error('incorrect', k - 1, spoken=word, similarity=similarity))
+            if move == JUMP:
+                # Re-anchored: words between the jump origin and here were skipped
+                for skipped in range(k - 2, jump_from - 1, -1):
+                    errors.append(self._error('missing', skipped))
+                k = jump_from
+            else:
+                k -= 1
+
+        # The batch may begin past the last reported position if it skipped ahead
+        for skipped in range(k - 1, start - 1, -1):
+            errors.append(self._error('missing', skipped))
+
+        errors.reverse()
+        return errors
+
+    def _error(self, error_type, position, spoken='', similarity=0.0):
+        expected = self.words[position] if error_type != 'extra' and position < len(self.words) else ''
+        error = {
+            'position': position,
+            'spoken': spoken,
+            'expected': expected,
+            'type': error_type,
+            'similarity': round(similarity * 100, 1),
+            'original_spoken': spoken,
+        }
+        if error_type == 'incorrect':
+            error['confusion'] = confusions.classify(spoken, expected)
+        if expected:
+            error['original_expected'] = self.original_words[position] if self.original_words else expected
+        return error
@@ -0,0 +1,286 @@
+"""
+Chunked final analysis.
+
+A full-surah transcript is cut at ayah boundaries and every segment is
+aligned on its own, on a process pool when the surah is large. Ayah starts
+are anchored in the transcript by looking up each ayah's first words
+(a trigram) after the previous anchor, so a segment only ever pairs one
+stretch of the surah with the words spoken for it. Ayahs whose start
+cannot be found are merged into the previous segment.
+
+Segment results carry the surah word position of each difference, which
+also gives per-ayah accuracy.
+
+When the surah index has vocabulary ids (see vocabulary.py), the
+transcript is encoded once and segments whose ids equal the text's are
+scored without aligning them at all; with NumPy installed the comparisons
+and the per-ayah error counts are array operations.
+"""
+from bisect import bisect_left
+
+import confusions
+import similarity as fast_similarity
+import vocabulary
+import worker_pool
+
+try:
+    import numpy
+except ImportError:  # Optional: vectorized scoring
+    numpy = None
+
+ANCHOR_WORDS = 3
+# Smallest surah (in words) worth shipping to the process pool
+PARALLEL_MIN_WORDS = 1500
+# Segments are grouped into this many tasks per worker to keep IPC cheap
+TASKS_PER_WORKER = 4
+
+
+def compare_word_lists(spoken_words, original_words, offset=0, compare=None):
+    """
+    Align two normalized word lists and return (differences, char_lcs).
+
+    Differences use the checker's format plus the surah word 'position'
+    they refer to (offset is the position of original_words[0]).
+    char_lcs is the character-level LCS of the two joined texts, so
+    segment scores can be summed into an overall similarity.
+    """
+    compare = compare or confusions.compare_words
+    differences = []
+
+    for tag, i1, i2, j1, j2 in fast_similarity.get_opcodes(spoken_words, original_words):
+        if tag == 'replace':
+            # Check each replacement individually for better accuracy
+            spoken_part = spoken_words[i1:i2]
+            correct_part = original_words[j1:j2]
+
+            for k, (s_word, c_word) in enumerate(zip(spoken_part, correct_part)):
+                is_similar, word_similarity = compare(s_word, c_word)
+                if not is_similar:
+                    differences.append({
+                        'type': 'incorrect',
+                        'spoken': s_word,
+                        'correct': c_word,
+                        'similarity': round(word_similarity * 100, 1),
+                        'confusion': confusions.classify(s_word, c_word),
+                        'position': offset + j1 + k
+                    })
+
+            # Handle length differences
+            if len(spoken_part) > len(correct_part):
+                for extra_word in spoken_part[len(correct_part):]:
+                    differences.append({
+                        'type': 'extra',
+                        'extra': extra_word,
+                        'position': offset + j2
+                    })
+            elif len(correct_part) > len(spoken_part):
+                for k, missing_word in enumerate(correct_part[len(spoken_part):], start=j1 + len(spoken_part)):
+                    differences.append({
+                        'type': 'missing',
+                        'missing': missing_word,
+                        'position': offset + k
+                    })
+
+        elif tag == 'insert':
+            # Words of the original that were not spoken
+            for k in range(j1, j2):
+                differences.append({
+                    'type': 'missing',
+                    'missing': original_words[k],
+                    'position': offset + k
+                })
+
+        elif tag == 'delete':
+            # Spoken words that are not in the original
+            for extra_word in spoken_words[i1:i2]:
+                differences.append({
+                    'type': 'extra',
+                    'extra': extra_word,
+                    'position': offset + j1
+                })
+
+    char_lcs = fast_similarity.lcs_length(' '.join(spoken_words), ' '.join(original_words))
+    return differences, char_lcs
+
+
+def segment_transcript(spoken_words, surah_index, spoken_ids=None):
+    """
+    Split a transcript at ayah boundaries.
+
+    Returns a list of (ref_start, ref_end, spoken_start, spoken_end) word
+    ranges that together cover both the surah and the transcript.
+    spoken_ids are the transcript's vocabulary ids, if it was encoded.
+    """
+    words = surah_index.words
+    if spoken_ids is not None and numpy is not None:
+        find = _id_anchor_finder(spoken_ids, surah_index.ids, len(vocabulary.get_vocabulary()))
+    else:
+        find = _word_anchor_finder(spoken_words, words)
+
+    anchors = [(0, 0)]
+    for ayah_start in surah_index.ayah_offsets[1:-1]:
+        last_ref, last_spoken = anchors[-1]
+        if ayah_start == last_ref or ayah_start + ANCHOR_WORDS > len(words):
+            continue
+        # The next ayah should start roughly as far into the transcript as into the surah
+        latest = last_spoken + 2 * (ayah_start - last_ref) + 20
+        found = find(ayah_start, last_spoken, latest)
+        if found is not None:
+            anchors.append((ayah_start, found))
+    anchors.append((len(words), len(spoken_words)))
+
+    segments = []
+    for (ref_start, spoken_start), (ref_end, spoken_end) in zip(anchors, anchors[1:]):
+        if ref_end > ref_start or spoken_end > spoken_start:
+            segments.append((ref_start, ref_end, spoken_start, spoken_end))
+    return segments
+
+
+def _word_anchor_finder(spoken_words, words):
+    """find(ayah_start, first, last): first transcript position in [first, last] where the ayah's start is spoken"""
+    positions = {}
+    for t in range(len(spoken_words) - ANCHOR_WORDS + 1):
+        positions.setdefault(tuple(spoken_words[t:t + ANCHOR_WORDS]), []).append(t)
+
+    def find(ayah_start, first, last):
+        candidates = positions.get(tuple(words[ayah_start:ayah_start + ANCHOR_WORDS]))
+        if candidates:
+            i = bisect_left(candidates, first)
+            if i < len(candidates) and candidates[i] <= last:
+                return candidates[i]
+        return None
+    return find
+
+
+def _id_anchor_finder(spoken_ids, text_ids, vocabulary_size):
+    """_word_anchor_finder() over vocabulary ids, scanning the allowed range of the transcript with NumPy"""
+    # Each run of ANCHOR_WORDS ids packed into one int64, digits shifted by one so OOV (-1) never matches
+    base = vocabulary_size + 1
+    spoken = numpy.asarray(spoken_ids, dtype=numpy.int64) + 1
+    count = max(len(spoken) - ANCHOR_WORDS + 1, 0)
+    keys = numpy.zeros(count, dtype=numpy.int64)
+    for j in range(ANCHOR_WORDS):
+        keys = keys * base + spoken[j:j + count]
+
+    def find(ayah_start, first, last):
+        key = 0
+        for word_id in text_ids[ayah_start:ayah_start + ANCHOR_WORDS]:
+            key = key * base + word_id + 1
+        hits = numpy.flatnonzero(keys[first:last + 1] == key)
+        return first + int(hits[0]) if len(hits) else None
+    return find
+
+
+def exact_segments(spoken_ids, surah_index, segments):
+    """Whether each segment's transcript words are exactly its surah words, compared by vocabulary id"""
+    if spoken_ids is None:
+        return [False] * len(segments)
+    text_ids = surah_index.ids
+    if numpy is not None:
+        text_ids = numpy.frombuffer(text_ids, dtype=numpy.int32)
+        same = numpy.array_equal
+    else:
+        spoken_ids = memoryview(spoken_ids)
+        same = memoryview.__eq__
+    # Out-of-vocabulary words are never equal to a text word, so any segment with one is aligned
+    return [r1 - r0 == s1 - s0 and same(spoken_ids[s0:s1], text_ids[r0:r1]) for r0, r1, s0, s1 in segments]
+
+
+def encode_transcript(spoken_words, surah_index):
+    """Vocabulary ids of a transcript, or None when the surah index has none"""
+    word_vocabulary = vocabulary.get_vocabulary()
+    if surah_index.ids is None or word_vocabulary is None:
+        return None
+    return word_vocabulary.encode(spoken_words)
+
+
+def _analyze_segments(tasks):
+    """Process-pool worker: align a batch of (spoken_words, original_words, offset) segments"""
+    return [compare_word_lists(spoken, original, offset) for spoken, original, offset in tasks]
+
+
+def chunked_compare(spoken_words, surah_index, parallel=True):
+    """
+    Compare a normalized transcript with a whole surah, one ayah segment at a time.
+
+    Returns (differences, similarity, ayah_accuracy) where similarity is the
+    character-level LCS ratio summed over segments and ayah_accuracy lists
+    accuracy per ayah up to the last one the transcript reached. Large
+    surahs are aligned on the shared worker pool (see worker_pool.py) when
+    one is running and parallel is set.
+    """
+    executor = worker_pool.get_pool() if parallel else None
+    words = surah_index.words
+    spoken_ids = encode_transcript(spoken_words, surah_index)
+    segments = segment_transcript(spoken_words, surah_index, spoken_ids)
+    exact = exact_segments(spoken_ids, surah_index, segments)
+    tasks = [(spoken_words[s0:s1], words[r0:r1], r0)
+             for (r0, r1, s0, s1), is_exact in zip(segments, exact) if not is_exact]
+
+    if executor is not None and len(words) >= PARALLEL_MIN_WORDS and len(tasks) > 1:
+        batch_count = min(len(tasks), worker_pool.size() * TASKS_PER_WORKER)
+        batches = [tasks[i::batch_count] for i in range(batch_count)]
+        try:
+            results = [None] * len(tasks)
+            for i, batch_results in enumerate(executor.map(_analyze_segments, batches)):
+                results[i::batch_count] = batch_results
+        except Exception as e:
+            print(f"Parallel analysis failed, falling back to a single process: {e}")
+            results = _analyze_segments(tasks)
+    else:
+        results = _analyze_segments(tasks)
+
+    differences = []
+    char_lcs = 0
+    for segment_differences, segment_lcs in results:
+        differences.extend(segment_differences)
+        char_lcs += segment_lcs
+    for (r0, r1, s0, s1), is_exact in zip(segments, exact):
+        if is_exact:
+            # Equal texts: their LCS is the whole joined text
+            char_lcs += len(' '.join(spoken_words[s0:s1]))
+
+    spoken_chars = len(' '.join(spoken_words))
+    total_chars = spoken_chars + len(surah_index.normalized_text)
+    similarity = 2.0 * char_lcs / total_chars if total_chars else 1.0
+
+    return differences, similarity, ayah_accuracy(differences, surah_index, segments)
+
+
+def ayah_accuracy(differences, surah_index, segments):
+    """Per-ayah accuracy for every ayah up to the furthest one that was recited"""
+    reached = 0
+    for ref_start, ref_end, spoken_start, spoken_end in segments:
+        if spoken_end > spoken_start:
+            reached = ref_end
+
+    positions = [difference['position'] for difference in differences
+                 if difference['type'] in ('incorrect', 'missing')]
+    if numpy is not None and positions and surah_index.total_words:
+        word_ayahs = numpy.asarray(surah_index.word_ayahs)
+        positions = numpy.clip(positions, 0, surah_index.total_words - 1)
+        counts = numpy.bincount(word_ayahs[positions])
+        errors_per_ayah = {ayah: int(counts[ayah]) for ayah in numpy.flatnonzero(counts).tolist()}
+    else:
+        errors_per_ayah = {}
+        for position in positions:
+            ayah = surah_index.ayah_at(position)
+            errors_per_ayah[ayah] = errors_per_ayah.get(ayah, 0) + 1
+
+    results = []
+    for ayah_idx in range(surah_index.ayah_count):
+        start = surah_index.ayah_offsets[ayah_idx]
+        if start >= reached:
+            break
+        word_count = surah_index.ayah_offsets[ayah_idx + 1] - start
+        if word_count == 0:
+            continue
+        ayah = surah_index.word_ayahs[start]
+        errors = errors_per_ayah.get(ayah, 0)
+        results.append({
+            'ayah': ayah,
+            'words': word_count,
+            'errors': errors,
+            'accuracy': round(max(word_count - errors, 0) / word_count * 100, 1)
+        })
+    return results
@@ -1,259 +1,331 @@
-from flask import Flask, request, render_template, session, redirect, url_for, jsonify
-import requests
-import difflib
-import re
+from flask import (Flask, Response, request, render_template, session, redirect, url_for, jsonify, stream_template,
+                   stream_with_context)
+from werkzeug.serving import is_running_from_reloader
+import hashlib
+import hmac
+import os
 from datetime import datetime
-import unicodedata
+
+from admission import COALESCED, SHED, RealtimeAdmission
+import admission
+from aligner import JoinedWords, StreamingAligner
+from analysis import chunked_compare, compare_word_lists
+from arabic_normalizer import ARABIC_NORMALIZATIONS, ArabicNormalizer
+import batch_grading
+import confusions
+import instrumentation
+from instrumentation import CallbackMetric, current_timings, stage
+from page_cache import PageCache
+from quran_api import API_BASE_URL
+from quran_corpus import QuranCorpus
+from realtime_protocol import (PROTOCOL_VERSION, COMPACT_SCHEMA, ERROR_KINDS, MSGPACK_MIMETYPE, RealtimeStream,
+                               RecitationError, DUPLICATE, RESYNC, FINAL, coalesce, encode_result, pack, wants_msgpack)
+from progress_store import ProgressStore
+import report_pages
+from session_store import ServerSideSessionInterface, create_session_store, default_session_backend
+import similarity as fast_similarity
+import vocabulary
+import warmup
+import word_pack
+import worker_pool
 
 app = Flask(__name__)
 app.secret_key = 'your_secure_secret_key_here_2025'  # Change this to a secure key
 
+# Local corpus dump (see quran_corpus.py); the API is only a fallback when it is missing.
+app.config['QURAN_CORPUS_PATH'] = os.environ.get('QURAN_CORPUS_PATH')
+app.config['QURAN_API_FALLBACK'] = os.environ.get('QURAN_API_FALLBACK', '1') == '1'
+app.config['QURAN_API_URL'] = os.environ.get('QURAN_API_URL', API_BASE_URL)
+app.config['QURAN_API_CACHE_DIR'] = os.environ.get('QURAN_API_CACHE_DIR', os.path.join(app.instance_path, 'api-cache'))
+
+# Server-side sessions: the cookie only carries a session id.
+# Worker processes sharing the sessions; gunicorn and uvicorn read the same variable for their worker count
+app.config['WEB_CONCURRENCY'] = int(os.environ.get('WEB_CONCURRENCY', 1))
+app.config['SESSION_BACKEND'] = os.environ.get('SESSION_BACKEND',  # memory | sqlite
+                                               default_session_backend(app.config['WEB_CONCURRENCY']))
+app.config['SESSION_SQLITE_PATH'] = os.environ.get('SESSION_SQLITE_PATH', os.path.join(app.instance_path, 'sessions.sqlite'))
+app.config['SESSION_TTL'] = int(os.environ.get('SESSION_TTL', 6 * 60 * 60))
+app.config['SESSION_MAX_ENTRIES'] = int(os.environ.get('SESSION_MAX_ENTRIES', 10000))
+app.config['MAX_SESSION_ERRORS'] = int(os.environ.get('MAX_SESSION_ERRORS', 500))
+
+# Startup warm-up and the shared corpus image (see warmup.py): "all", "none" or a list like "1,36,67-114"
+app.config['WARMUP_SURAHS'] = os.environ.get('WARMUP_SURAHS', 'all')
+# Persistent recitation history (see progress_store.py)
+app.config['PROGRESS_DB_PATH'] = os.environ.get('PROGRESS_DB_PATH', os.path.join(app.instance_path, 'progress.sqlite'))
+# Sent as the X-Teacher-Token header to read other students' history; unset, everyone only sees their own
+app.config['PROGRESS_TEACHER_TOKEN'] = os.environ.get('PROGRESS_TEACHER_TOKEN')
+# Processes for large surah analyses and /batch_analysis uploads; see worker_pool.py for starting them
+app.config['POOL_WORKERS'] = worker_pool.default_workers()
+app.config['ARTIFACT_DIR'] = os.environ.get('ARTIFACT_DIR', os.path.join(app.instance_path, 'artifacts'))
+# /check_realtime admission (see admission.py): requests running or waiting before interims, then finals, are shed
+app.config['REALTIME_SHED_DEPTH'] = int(os.environ.get('REALTIME_SHED_DEPTH', admission.SHED_DEPTH))
+app.config['REALTIME_MAX_DEPTH'] = int(os.environ.get('REALTIME_MAX_DEPTH', admission.MAX_DEPTH))
+app.config['REALTIME_MAX_WAIT'] = float(os.environ.get('REALTIME_MAX_WAIT', admission.MAX_WAIT))
+# Realtime checking in the browser against a downloaded word pack (see word_pack.py)
+app.config['REALTIME_OFFLOAD'] = os.environ.get('REALTIME_OFFLOAD', '0') == '1'
+
+app.session_interface = ServerSideSessionInterface(create_session_store(
+    app.config['SESSION_BACKEND'],
+    sqlite_path=app.config['SESSION_SQLITE_PATH'],
+    ttl=app.config['SESSION_TTL'],
+    max_entries=app.config['SESSION_MAX_ENTRIES'],
+    workers=app.config['WEB_CONCURRENCY'],
+))
+
+# Prometheus metrics on /metrics; PROFILING=1 allows per-request profiles via the X-Profile header.
+app.config['PROFILING'] = os.environ.get('PROFILING', '0') == '1'
+instrumentation.init_app(app)
+
 class QuranTextChecker:
-    def __init__(self):
+    def __init__(self, corpus=None):
+        self.corpus = corpus
         self.current_surah = None
         self.errors = []
-        # Enhanced Arabic character mappings for better text comparison
-        self.arabic_normalizations = {
-            # Hamza variations
-            'ء': 'ء',  # Hamza
-            'أ': 'ا',  # Alif with Hamza above
-            'إ': 'ا',  # Alif with Hamza below
-            'آ': 'ا',  # Alif with Madda
-            'ٱ': 'ا',  # Alif Wasla (this is the key fix!)
-            
-            # Ya variations
-            'ي': 'ي',  # Ya
-            'ى': 'ي',  # Alif Maksura
-            'ئ': 'ي',  # Ya with Hamza
-            
-            # Ta Marbuta variations
-            'ة': 'ه',  # Ta Marbuta
-            'ت': 'ت',  # Ta
-            
-            # Ha variations
-            'ه': 'ه',  # Ha
-            'ح': 'ح',  # Ha with dot
-            
-            # Other common variations
-            'ک': 'ك',  # Farsi Kaf to Arabic Kaf
-            'گ': 'ك',  # Farsi Gaf to Arabic Kaf
-            'ی': 'ي',  # Farsi Ya to Arabic Ya
-        }
+        # Enhanced Arabic character mappings for better text comparison (see arabic_normalizer.py)
+        self.arabic_normalizations = dict(ARABIC_NORMALIZATIONS)
+        # Compiled once: a single str.translate table plus a per-token cache
+        self.normalizer = ArabicNormalizer(self.arabic_normalizations)
     
     def get_surah_list(self):
-        """Get list of all surahs"""
-        try:
-            url = "https://api.alquran.cloud/v1/surah"
-            response = requests.get(url)
-            if response.status_code == 200:
-                return response.json()['data']
-        except Exception as e:
-            print(f"Error fetching surah list: {e}")
-        return []
+        """Get list of all surahs from the preloaded corpus"""
+        if self.corpus is None:
+            return []
+        return self.corpus.get_surah_list()
     
+    @stage('corpus')
     def get_surah_text(self, surah_number):
-        """Get text of specific surah"""
-        try:
-            url = f"https://api.alquran.cloud/v1/surah/{surah_number}"
-            response = requests.get(url)
-            if response.status_code == 200:
-                return response.json()['data']
-        except Exception as e:
-            print(f"Error fetching surah {surah_number}: {e}")
-        return None
+        """Get text of specific surah from the preloaded corpus"""
+        if self.corpus is None:
+            return None
+        return self.corpus.get_surah(surah_number)
 
+    @stage('normalize')
     def normalize_arabic_text(self, text):
         """
         Enhanced Arabic text normalization for Quranic text comparison
+
+        Removes diacritics and tatweel, unifies hamza/ya/ta marbuta variants
+        and strips verse numbers, in one table-driven pass.
         """
-        if not text:
-            return ""
-        
-        # Step 1: Basic Unicode normalization
-        text = unicodedata.normalize('NFKD', text)
-        
-        # Step 2: Remove all diacritical marks (tashkeel)
-        # Keep only the base Arabic characters
-        no_diacritics = ''.join(char for char in text if not unicodedata.combining(char))
-        
-        # Step 3: Apply character-level normalizations
-        normalized_chars = []
-        for char in no_diacritics:
-            # Apply our custom Arabic normalizations
-            normalized_char = self.arabic_normalizations.get(char, char)
-            normalized_chars.append(normalized_char)
-        
-        normalized_text = ''.join(normalized_chars)
-        
-        # Step 4: Remove tatweel (kashida) characters
-        normalized_text = normalized_text.replace("ـ", "")
-        
-        # Step 5: Remove verse numbers in parentheses (1), (2), etc.
-        normalized_text = re.sub(r'\(\s*\d+\s*\)', '', normalized_text)
-        
-        # Step 6: Remove standalone digits
-        normalized_text = re.sub(r'\d+', '', normalized_text)
-        
-        # Step 7: Clean up extra whitespace
-        normalized_text = ' '.join(normalized_text.split())
-        
-        # Step 8: Final Unicode normalization
-        return unicodedata.normalize('NFKC', normalized_text.strip())
+        return self.normalizer.normalize(text)
 
-    def advanced_word_comparison(self, word1, word2):
+    @stage('normalize')
+    def normalize_words(self, text):
+        """Normalize a transcript into words, using the per-token cache"""
+        return self.normalizer.normalize_words(text)
+
+    def advanced_word_comparison(self, word1, word2, normalized=False):
         """
         Advanced word comparison that handles common Arabic spelling variations
+
+        Pass normalized=True when both words already went through the normalizer.
         """
-        # Normalize both words
-        norm_word1 = self.normalize_arabic_text(word1)
-        norm_word2 = self.normalize_arabic_text(word2)
-        
-        # Direct match after normalization
-        if norm_word1 == norm_word2:
-            return True, 1.0
-        
-        # Calculate similarity ratio
-        similarity = difflib.SequenceMatcher(None, norm_word1, norm_word2).ratio()
+        if normalized:
+            norm_word1, norm_word2 = word1, word2
+        else:
+            norm_word1 = self.normalizer.normalize_word(word1)
+            norm_word2 = self.normalizer.normalize_word(word2)
         
         # Consider words similar if they're very close (accounting for minor differences)
-        similarity_threshold = 0.8
-        is_similar = similarity >= similarity_threshold
-        
-        return is_similar, similarity
+        # Pairs of corpus words are answered from the precomputed confusion index (see confusions.py).
+        similarity_threshold = fast_similarity.SIMILARITY_THRESHOLD
+        return confusions.compare_words(norm_word1, norm_word2, similarity_threshold)
+
+    def compare_normalized_words(self, word1, word2):
+        """Comparator for words that are already normalized"""
+        return self.advanced_word_comparison(word1, word2, normalized=True)
+
+    def create_aligner(self, surah_index, position=0, state=None, following=None):
+        """
+        Streaming aligner over a surah index, optionally resumed from a saved state
+
+        With a following surah index, the text runs on into that surah
+        (positions past the end of the first belong to it).
+        """
+        words, original_words, ids = surah_index.words, surah_index.original_words, surah_index.ids
+        if following is not None:
+            words = JoinedWords(words, following.words)
+            original_words = JoinedWords(original_words, following.original_words)
+            ids = JoinedWords(ids, following.ids) if ids is not None and following.ids is not None else None
+        # Corpus words are matched by vocabulary id; it answers the same as compare_normalized_words
+        word_vocabulary = vocabulary.get_vocabulary() if ids is not None else None
+        if state is not None:
+            return StreamingAligner.from_state(words, self.compare_normalized_words, state, original_words,
+                                               ids=ids, vocabulary=word_vocabulary)
+        return StreamingAligner(words, self.compare_normalized_words, original_words, position,
+                                ids=ids, vocabulary=word_vocabulary)
+
+    def check_current_words(self, spoken, surah_index, position, aligner=None):
+        """
+        Enhanced word checking that tolerates skipped, repeated and extra words
 
-    def check_current_words(self, spoken, full_text, position):
-        """Enhanced word checking with better Arabic comparison"""
-        if not spoken or not full_text:
+        Spoken words are aligned against a window of the precompiled surah
+        index around position. When an aligner is passed it is advanced in
+        place, so callers can keep its state between requests.
+        """
+        if not spoken or surah_index is None:
             return []
             
-        spoken_normalized = self.normalize_arabic_text(spoken)
-        spoken_words = [w for w in spoken_normalized.split() if w.strip()]
+        spoken_words = self.normalize_words(spoken)
         
-        # Get expected words from current position
-        full_normalized = self.normalize_arabic_text(full_text)
-        all_words = [w for w in full_normalized.split() if w.strip()]
+        if aligner is None:
+            if position >= surah_index.total_words:
+                return []
+            aligner = self.create_aligner(surah_index, position)
         
-        if position >= len(all_words):
-            return []
-        
-        errors = []
-        
-        # Check each spoken word against expected words
-        for i, spoken_word in enumerate(spoken_words):
-            expected_position = position + i
-            
-            if expected_position < len(all_words):
-                expected_word = all_words[expected_position]
-                
-                # Use advanced comparison
-                is_similar, similarity = self.advanced_word_comparison(spoken_word, expected_word)
-                
-                if not is_similar:
-                    errors.append({
-                        'position': expected_position,
-                        'spoken': spoken_word,
-                        'expected': expected_word,
-                        'type': 'incorrect',
-                        'similarity': round(similarity * 100, 1),
-                        'original_spoken': spoken_word,  # Keep original for display
-                        'original_expected': expected_word
-                    })
-            else:
-                # Extra words beyond the expected text
-                errors.append({
-                    'position': expected_position,
-                    'spoken': spoken_word,
-                    'expected': '',
-                    'type': 'extra',
-                    'similarity': 0,
-                    'original_spoken': spoken_word
-                })
-        
-        return errors
+        with stage('align'):
+            return aligner.feed(spoken_words)
 
-    def compare_texts(self, spoken, original):
+    def compare_texts(self, spoken, original, original_normalized=None):
         """Enhanced text comparison with better Arabic handling"""
         spoken_normalized = self.normalize_arabic_text(spoken)
-        original_normalized = self.normalize_arabic_text(original)
-        
-        # Calculate overall similarity
-        similarity = difflib.SequenceMatcher(None, spoken_normalized, original_normalized).ratio()
-        
-        # Word-level comparison with advanced matching
-        spoken_words = spoken_normalized.split()
-        original_words = original_normalized.split()
+        if original_normalized is None:
+            original_normalized = self.normalize_arabic_text(original)
         
-        # Use difflib to find the best alignment
-        matcher = difflib.SequenceMatcher(None, spoken_words, original_words)
-        differences = []
+        # Word-level comparison with advanced matching, on a linear-memory global alignment
+        with stage('compare'):
+            differences, char_lcs = compare_word_lists(spoken_normalized.split(), original_normalized.split(),
+                                                       compare=self.compare_normalized_words)
         
-        for tag, i1, i2, j1, j2 in matcher.get_opcodes():
-            if tag == 'replace':
-                # Check each replacement individually for better accuracy
-                spoken_part = spoken_words[i1:i2]
-                correct_part = original_words[j1:j2]
-
-                # Try to match words individually within the replacement
-                for k, (s_word, c_word) in enumerate(zip(spoken_part, correct_part)):
-                    is_similar, word_similarity = self.advanced_word_comparison(s_word, c_word)
-                    if not is_similar:
-                        differences.append({
-                            'type': 'incorrect',
-                            'spoken': s_word,
-                            'correct': c_word,
-                            'similarity': round(word_similarity * 100, 1)
-                        })
-                
-                # Handle length differences
-                if len(spoken_part) > len(correct_part):
-                    for extra_word in spoken_part[len(correct_part):]:
-                        differences.append({
-                            'type': 'extra',
-                            'extra': extra_word
-                        })
-                elif len(correct_part) > len(spoken_part):
-                    for missing_word in correct_part[len(spoken_part):]:
-                        differences.append({
-                            'type': 'missing',
-                            'missing': missing_word
-                        })
-                        
-            elif tag == 'delete':
-                missing_words = original_words[j1:j2]
-                for missing_word in missing_words:
-                    if missing_word.strip():
-                        differences.append({
-                            'type': 'missing',
-                            'missing': missing_word
-                        })
-                        
-            elif tag == 'insert':
-                extra_words = spoken_words[i1:i2]
-                for extra_word in extra_words:
-                    if extra_word.strip():
-                        differences.append({
-                            'type': 'extra',
-                            'extra': extra_word
-                        })
+        # Calculate overall similarity (character-level LCS ratio)
+        total_chars = len(spoken_normalized) + len(original_normalized)
+        similarity = 2.0 * char_lcs / total_chars if total_chars else 1.0
         
         return differences, similarity
 
-# Create a global instance of the checker for convenience.
+    def compare_with_surah(self, spoken, surah_index):
+        """
+        Compare a full transcript with a surah ayah by ayah
+
+        Returns (differences, similarity, ayah_accuracy); large surahs are
+        aligned on a process pool.
+        """
+        spoken_words = self.normalize_words(spoken)
+        with stage('compare'):
+            return chunked_compare(spoken_words, surah_index)
+
+# The recite page decodes compact realtime results with these (see realtime_protocol.py)
+app.jinja_env.globals.update(error_kinds=ERROR_KINDS, confusion_labels=confusions.LABELS)
+
+@app.template_filter('timestamp')
+def format_timestamp(ts):
+    return datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M")
+
+# Create a global instance of the checker for convenience, then load the corpus
+# once at startup and build every surah's word index with its normalizer.
 qtc = QuranTextChecker()
+corpus = QuranCorpus.from_config(app.config['QURAN_CORPUS_PATH'],
+                                 app.config['QURAN_API_FALLBACK'],
+                                 normalize=qtc.normalizer.normalize_word,
+                                 api_url=app.config['QURAN_API_URL'],
+                                 api_cache_dir=app.config['QURAN_API_CACHE_DIR'])
+qtc.corpus = corpus
+progress = ProgressStore(app.config['PROGRESS_DB_PATH'])
+realtime_admission = RealtimeAdmission(app.config['REALTIME_SHED_DEPTH'], app.config['REALTIME_MAX_DEPTH'],
+                                       app.config['REALTIME_MAX_WAIT'], coalesce=coalesce)
+# Rendered surah list and recite pages (see page_cache.py)
+pages = PageCache(os.path.join(app.root_path, app.template_folder), lambda: warmup.corpus_version(app, corpus))
+
+# Gauges read when /metrics is scraped
+instrumentation.registry.register(CallbackMetric(
+    'lefqih_session_store_entries', 'Sessions held by the server-side store',
+    lambda: len(app.session_interface.store)))
+instrumentation.registry.register(CallbackMetric(
+    'lefqih_corpus_surahs_loaded', 'Surahs held in memory by the corpus',
+    lambda: len(corpus.surahs)))
+instrumentation.registry.register(CallbackMetric(
+    'lefqih_corpus_image_bytes', 'Size of the shared, memory-mapped corpus image',
+    lambda: corpus.image.nbytes if corpus.image is not None else 0))
+instrumentation.registry.register(CallbackMetric(
+    'lefqih_progress_queue_depth', 'Recitations waiting for the progress writer',
+    lambda: progress.pending))
+instrumentation.registry.register(CallbackMetric(
+    'lefqih_progress_recitations_total', 'Recitations written to or dropped by the progress store',
+    lambda: [({'outcome': 'written'}, progress.written), ({'outcome': 'dropped'}, progress.dropped)],
+    'counter'))
+instrumentation.registry.register(CallbackMetric(
+    'lefqih_page_cache_bytes', 'Size of the rendered pages cache, compressed variants included',
+    lambda: pages.nbytes))
+instrumentation.registry.register(CallbackMetric(
+    'lefqih_realtime_requests_total', 'Realtime checks admitted, coalesced into a newer interim or shed',
+    lambda: [({'outcome': outcome}, count) for outcome, count in realtime_admission.counts().items()],
+    'counter'))
+instrumentation.registry.register(CallbackMetric(
+    'lefqih_realtime_queue_depth', 'Realtime checks running or waiting for their session',
+    lambda: realtime_admission.depth))
+instrumentation.track_cache('normalizer', qtc.normalizer.cache_info)
+instrumentation.track_cache('pages', pages.cache_info)
+if corpus.fallback is not None:
+    api_client = corpus.fallback.client
+    instrumentation.track_cache('quran_api', api_client.cache.cache_info)
+    instrumentation.registry.register(CallbackMetric(
+        'lefqih_api_circuit_open', 'Whether the Quran API circuit breaker is open',
+        lambda: int(api_client.breaker.state == 'open')))
 
-def get_next_expected_words(full_text, position, num_words=5):
+# The reloader's watcher process never serves requests; only warm up where it matters
+if __name__ != "__main__" or is_running_from_reloader():
+    warm_state = warmup.warm_up(app, qtc, corpus)
+    if warm_state is not None and not warm_state.surahs:
+        print(f"⚠️ Warm-up: no surahs indexed ({warm_state.source}) in {warm_state.seconds:.3f}s")
+    elif warm_state is not None:
+        print(f"🔥 Warm-up: {warm_state.surahs} surahs ({warm_state.source}) in {warm_state.seconds:.3f}s")
+        if warm_state.index_page is not None:
+            pages.put('index.html', None, warm_state.index_page)
+
+# Bumped by the routes that start or reset a recitation
+REALTIME_EPOCH_KEY = 'realtime_epoch'
+
+def progress_user():
+    """Who the progress history belongs to: the student name given at /start, or this browser session"""
+    student = session.get('student')
+    if student:
+        return student
+    return 'anonymous-' + hashlib.sha1(session.sid.encode()).hexdigest()[:12]
+
+def is_teacher():
+    """Whether this request carries the teacher token, which unlocks every student's progress history"""
+    token = app.config['PROGRESS_TEACHER_TOKEN']
+    given = request.headers.get('X-Teacher-Token', '')
+    return bool(token) and hmac.compare_digest(given.encode(), token.encode())
+
+@stage('corpus')
+def current_surah_index(state=None):
+    """Return the SurahIndex of the surah selected in this session, if any"""
+    state = session if state is None else state
+    surah_number = state.get('surah_number')
+    if surah_number is None:
+        return None
+    return corpus.get_index(surah_number)
+
+def restart_realtime():
+    """Start a new recitation in this session; open WebSocket channels (see asgi.py) drop the old one's state"""
+    session[REALTIME_EPOCH_KEY] = session.get(REALTIME_EPOCH_KEY, 0) + 1
+
+def append_session_errors(key, errors, state=None):
+    """Append errors to a server-side session list, keeping only the most recent ones"""
+    state = session if state is None else state
+    stored = state.get(key, []) + errors
+    state[key] = stored[-app.config['MAX_SESSION_ERRORS']:]
+
+def get_next_expected_words(surah_index, position, num_words=5):
     """Get the next expected words from the given position"""
-    if not full_text:
+    if surah_index is None:
         return ""
-    
-    normalized_text = qtc.normalize_arabic_text(full_text)
-    words = [w for w in normalized_text.split() if w.strip()]
-    
-    if position >= len(words):
-        return "End of Surah"
-    
-    end_pos = min(position + num_words, len(words))
-    return ' '.join(words[position:end_pos])
+    return surah_index.expected_words(position, num_words)
+
+# One suggestion per kind of confusion found among the incorrect words (see confusions.py)
+CONFUSION_SUGGESTIONS = {
+    'hamza': "🔤 Hamza (ء) was dropped or misplaced in {count} word(s) - pronounce it clearly, including on alif, waw and ya",
+    'ta_marbuta': "🔤 Ta marbuta (ة) was read as ta (ت) in {count} word(s) - stop on it with a ha sound",
+    'alif_maqsura': "🔤 Alif maqsura (ى) was confused with alif in {count} word(s)",
+    'long_vowel': "⏳ A long vowel (madd) was dropped or added in {count} word(s) - hold madd letters for their full length",
+    'definite_article': "🔤 The definite article (ال) was dropped or added in {count} word(s)",
+    'conjunction': "🔗 A prefixed wa (و) or fa (ف) was dropped or added in {count} word(s)",
+    'similar_letter': "👄 Similar-sounding letters were swapped in {count} word(s) (e.g. س/ص, ت/ط, د/ض, ذ/ظ) - review their makharij",
+    'letter_order': "🔀 Letters were recited out of order in {count} word(s)",
+    'missing_letter': "🔤 A letter was dropped in {count} word(s)",
+    'extra_letter': "🔤 An extra letter was added in {count} word(s)",
+}
 
 def generate_improvement_suggestions(differences):
     """Generate personalized improvement suggestions with Arabic-specific advice"""
@@ -266,12 +338,16 @@ def generate_improvement_suggestions(differences):
     missing_count = len([d for d in differences if d.get('type') == 'missing'])
     extra_count = len([d for d in differences if d.get('type') == 'extra'])
     
-    # Analyze common Arabic mistakes
-    hamza_errors = sum(1 for d in differences if d.get('type') == 'incorrect' and 
-                      ('ا' in d.get('spoken', '') or 'ٱ' in d.get('correct', '')))
-    
-    if hamza_errors > 0:
-        suggestions.append("🔤 Focus on Hamzat Al-Wasl (ٱ) vs regular Alif (ا) - this is common in Quranic Arabic")
+    # Analyze common Arabic mistakes by the kind of confusion behind each wrong word
+    confusion_counts = {}
+    for d in differences:
+        if d.get('type') == 'incorrect':
+            label = d.get('confusion') or confusions.classify(d.get('spoken', ''),
+                                                              d.get('correct') or d.get('expected', ''))
+            if label in CONFUSION_SUGGESTIONS:
+                confusion_counts[label] = confusion_counts.get(label, 0) + 1
+    for label, count in sorted(confusion_counts.items(), key=lambda item: -item[1]):
+        suggestions.append(CONFUSION_SUGGESTIONS[label].format(count=count))
     
     if incorrect_count > missing_count and incorrect_count > extra_count:
         suggestions.append("🎯 Focus on pronunciation accuracy - review the correct pronunciation of words")
@@ -294,41 +370,40 @@ def generate_improvement_suggestions(differences):
 
 @app.route('/')
 def index():
-    surahs = qtc.get_surah_list()
-    return render_template('index.html', surahs=surahs)
+    page = pages.get('index.html', None, lambda: render_template('index.html', surahs=qtc.get_surah_list()))
+    return pages.respond(page, request)
 
 @app.route('/start', methods=['POST'])
 def start():
     surah_number = request.form.get('surah_number')
-    try:
-        surah_number = int(surah_number)
-    except (ValueError, TypeError):
-        return redirect(url_for('index'))
-    
-    surah_data = qtc.get_surah_text(surah_number)
-    if not surah_data:
-        return "❌ Could not load surah data. Please check your internet connection."
-    
-    # Build the full text by concatenating all ayahs with their verse numbers.
-    ayahs = surah_data.get('ayahs', [])
-    full_text = ""
-    
-    if surah_data['number'] == 1 and len(ayahs) > 0:
-        # For Al-Fatiha, handle Bismillah separately
-        full_text += ayahs[0]['text'] + "\n"
-        for idx, ayah in enumerate(ayahs[1:], start=1):
-            full_text += ayah['text'] + f" ({idx}) "
+    # "locate" leaves the surah open until the recitation itself says where it is
+    locate = surah_number == 'locate'
+    if locate:
+        surah_number = None
     else:
-        for idx, ayah in enumerate(ayahs, start=1):
-            full_text += ayah['text'] + f" ({idx}) "
+        try:
+            surah_number = int(surah_number)
+        except (ValueError, TypeError):
+            return redirect(url_for('index'))
+        
+        surah_data = qtc.get_surah_text(surah_number)
+        surah_index = corpus.get_index(surah_number)
+        if not surah_data or surah_index is None:
+            return "❌ Could not load surah data. Import the local corpus with `python quran_corpus.py import`."
     
-    # Initialize session variables.
-    session['surah'] = surah_data
-    session['full_text'] = full_text.strip()
+    # Initialize session variables; the surah itself stays in the corpus.
+    session['surah_number'] = surah_number
+    session['locate'] = locate
+    session['continuous'] = request.form.get('continuous') == '1'
+    session.pop('locate_words', None)
+    student = (request.form.get('student') or '').strip()[:64]
+    if student:
+        session['student'] = student
     session['errors'] = []
     session['total_similarity'] = 0.0
     session['verses_attempted'] = 0
     session['current_position'] = 0
+    restart_realtime()
     
     return redirect(url_for('recite'))
 
@@ -338,129 +413,403 @@ def start_realtime_session():
     session['current_position'] = 0
     session['realtime_errors'] = []
     session['start_time'] = datetime.now().isoformat()
+    session.pop('aligner_state', None)
+    session.pop('realtime_stream', None)
+    session.pop('locate_words', None)
+    session['spoken_words'] = 0
+    session['surah_word_offset'] = 0
+    restart_realtime()
+    if session.get('locate'):
+        # Every new recitation is located afresh
+        session['surah_number'] = None
     
-    if 'full_text' in session:
-        # Count total words for progress tracking
-        normalized_text = qtc.normalize_arabic_text(session['full_text'])
-        session['total_words'] = len([w for w in normalized_text.split() if w.strip()])
-    else:
-        session['total_words'] = 0
+    surah_index = current_surah_index()
+    # Count total words for progress tracking
+    session['total_words'] = surah_index.total_words if surah_index else 0
     
-    return jsonify({
+    result = {
         'status': 'initialized',
         'total_words': session.get('total_words', 0),
         'message': 'Enhanced Arabic text processing enabled'
-    })
+    }
+    # Locate mode and continuous hifz need the whole corpus; everything else can be checked in the browser
+    if app.config['REALTIME_OFFLOAD'] and surah_index is not None and not session.get('continuous'):
+        result['word_pack'] = url_for('surah_word_pack', surah_number=surah_index.number)
+    return jsonify(result)
+
+@app.route('/start/word_pack/<int:surah_number>')
+def surah_word_pack(surah_number):
+    """Normalized words and normalization table of a surah, for client-side realtime checking"""
+    surah_index = corpus.get_index(surah_number)
+    if surah_index is None:
+        return jsonify({'error': 'Surah not found'}), 404
+    # Not a template: the format version stands in for the template version of the cache key
+    page = pages.get(f'word_pack.v{word_pack.WORD_PACK_FORMAT}', surah_number,
+                     lambda: word_pack.render_word_pack(surah_index, qtc.normalizer))
+    return pages.respond(page, request, mimetype='application/json')
+
+# Locate mode (see locator.py): words heard before trusting a location, and after which the best one is taken
+LOCATE_MIN_WORDS = 4
+LOCATE_MAX_WORDS = 30
+LOCATE_MIN_COVERAGE = 0.5  # share of the words' shingles that must match
+LOCATE_MARGIN = 1.5        # the best score must beat the runner-up by this factor
+LOCATE_CANDIDATES = 5
+
+def process_realtime_text(state, spoken_text, aligner=None, debug=False):
+    """
+    Align newly spoken text for one recitation and update its state
+
+    state is the session (or a WebSocket connection's copy of it). Pass the
+    aligner kept from a previous call to skip rebuilding it from the saved
+    state; debug adds debug_info to the result. Returns (result, aligner).
+    """
+    current_position = state.get('current_position', 0)
+    surah_index = current_surah_index(state)
+    if surah_index is None:
+        if state.get('locate'):
+            return locate_realtime_text(state, spoken_text, debug)
+        return {'errors': [], 'current_position': current_position, 'error': 'No surah selected'}, None
+    
+    # Continuous hifz: the text runs on into the next surah
+    following = None
+    if state.get('continuous'):
+        next_surah = next_surah_number(surah_index.number)
+        following = corpus.get_index(next_surah) if next_surah is not None else None
+    
+    # Resume the session's aligner and align the new words against the surah
+    if aligner is None:
+        aligner = qtc.create_aligner(surah_index, current_position, state.get('aligner_state'), following)
+    errors = qtc.check_current_words(spoken_text, surah_index, current_position, aligner)
+    
+    # The aligner decides where the reciter is now (skips and repeats included)
+    spoken_words = qtc.normalize_words(spoken_text)
+    spoken_words_count = len(spoken_words)
+    state['spoken_words'] = state.get('spoken_words', 0) + spoken_words_count
+    new_position = aligner.position
+    state['current_position'] = new_position
+    state['aligner_state'] = aligner.state()
+    
+    if following is not None:
+        # Positions past the end of the surah are words of the next one
+        total = surah_index.total_words
+        for error in errors:
+            if error['position'] > total or (error['position'] == total and error['type'] != 'extra'):
+                error['surah'] = following.number
+                error['position'] -= total
+            else:
+                error['surah'] = surah_index.number
+    errors = [RecitationError.from_error(error, surah_index.number) for error in errors]
+    
+    # Store errors for later analysis (capped, server-side)
+    if errors:
+        append_session_errors('realtime_errors', errors, state)
+    
+    if following is not None and new_position > surah_index.total_words:
+        # The reciter has started the next surah: continue from there
+        aligner.rebase(surah_index.total_words)
+        seed_surah(state, following.number, aligner.position)
+        state['aligner_state'] = aligner.state()
+        # Roughly the words recited of the new surah so far came after the boundary
+        state['surah_word_offset'] = max(state['spoken_words'] - aligner.position, 0)
+        result = realtime_result(state, following, aligner.position, errors, spoken_words, debug)
+        result['surah_changed'] = surah_payload(following.number, aligner.position)
+        # The next call builds an aligner that runs on into the surah after this one
+        return result, None
+    
+    result = realtime_result(state, surah_index, new_position, errors, spoken_words, debug)
+    if following is not None and new_position == surah_index.total_words:
+        result['suggestion'] = get_next_expected_words(following, 0, 3)
+    return result, aligner
+
+def realtime_result(state, surah_index, new_position, errors, spoken_words, debug=False):
+    """The /check_realtime result for words aligned up to new_position (see encode_realtime_result)"""
+    # Get next expected words for suggestion
+    suggestion = get_next_expected_words(surah_index, new_position, 3)
+    total_words = state.get('total_words', 1)
+    progress_percentage = min((new_position / total_words) * 100, 100) if total_words > 0 else 0
+    
+    result = {
+        'errors': errors,
+        'current_position': new_position,
+        'suggestion': suggestion,
+        'progress_percentage': round(progress_percentage, 1),
+        'total_words': total_words,
+    }
+    if debug:
+        result['debug_info'] = {
+            'spoken_normalized': ' '.join(spoken_words),
+            'words_processed': len(spoken_words),
+            'timings_ms': current_timings()
+        }
+    return result
+
+def surah_info(surah_number):
+    """Surah list entry (name, englishName, ...) of a surah"""
+    for surah in qtc.get_surah_list():
+        if surah['number'] == surah_number:
+            return surah
+    return {'number': surah_number}
+
+def next_surah_number(surah_number):
+    """The surah recited after surah_number in continuous hifz, or None after the last one"""
+    following = [number for number in corpus.surah_numbers if number > surah_number]
+    return min(following) if following else None
+
+def seed_surah(state, surah_number, position=0):
+    """Point a realtime session at a position of a surah, with a fresh aligner"""
+    surah_index = corpus.get_index(surah_number)
+    state['surah_number'] = surah_number
+    state['current_position'] = position
+    state['total_words'] = surah_index.total_words
+    state.pop('aligner_state', None)
+    # Where this surah's words start in the full transcript, for /final_analysis
+    state['surah_word_offset'] = state.get('spoken_words', 0)
+    return surah_index
+
+def surah_payload(surah_number, position=0):
+    """What the recite page needs to switch to a surah"""
+    surah_index = corpus.get_index(surah_number)
+    info = surah_info(surah_number)
+    return {
+        'surah': surah_number,
+        'name': info.get('name', ''),
+        'englishName': info.get('englishName', ''),
+        'ayah': surah_index.ayah_at(position),
+        'position': position,
+        'total_words': surah_index.total_words,
+        'full_text': surah_index.full_text,
+        'words': list(surah_index.words),
+    }
+
+def candidate_payload(candidate):
+    surah_index = corpus.get_index(candidate.surah)
+    return {
+        'surah': candidate.surah,
+        'name': surah_info(candidate.surah).get('name', ''),
+        'ayah': surah_index.ayah_at(candidate.position) if surah_index is not None else None,
+        'position': candidate.position,
+        'score': round(candidate.score, 2),
+        'coverage': round(candidate.coverage, 2),
+    }
+
+def confident_location(candidates, heard_words):
+    """The candidate to start from, or None to keep listening"""
+    if not candidates:
+        return None
+    best = candidates[0]
+    if heard_words >= LOCATE_MAX_WORDS:
+        return best
+    if heard_words < LOCATE_MIN_WORDS or best.coverage < LOCATE_MIN_COVERAGE:
+        return None
+    # Repeated passages match in several places; wait for words that tell them apart
+    if len(candidates) > 1 and best.score < LOCATE_MARGIN * candidates[1].score:
+        return None
+    return best
+
+def locate_realtime_text(state, spoken_text, debug=False):
+    """
+    Locate mode: collect words until the corpus locate index is sure where
+    they start, then seed the session there and align them. Returns (result, aligner).
+    """
+    heard = (state.get('locate_words', []) + qtc.normalize_words(spoken_text))[-LOCATE_MAX_WORDS:]
+    with stage('locate'):
+        candidates = corpus.get_locator().locate(heard, LOCATE_CANDIDATES) if len(heard) >= LOCATE_MIN_WORDS else []
+    best = confident_location(candidates, len(heard))
+    if best is None:
+        state['locate_words'] = heard
+        return {
+            'errors': [],
+            'current_position': 0,
+            'locating': True,
+            'heard_words': len(heard),
+            'candidates': [candidate_payload(candidate) for candidate in candidates],
+        }, None
+    
+    state.pop('locate_words', None)
+    seed_surah(state, best.surah, best.position)
+    result, aligner = process_realtime_text(state, ' '.join(heard), debug=debug)
+    result['located'] = dict(surah_payload(best.surah, best.position), **candidate_payload(best))
+    return result, aligner
+
+def process_realtime_message(state, message, aligner=None):
+    """
+    Apply one delta-protocol message (see realtime_protocol.py)
+
+    Finalized segments are committed through process_realtime_text; interim
+    segments are evaluated on a copy of the state on top of the committed
+    prefix and never stored. Returns (result, aligner).
+    """
+    stream = RealtimeStream.from_state(state.get('realtime_stream'))
+    action, words = stream.receive(message)
+    debug = bool(message.get('debug'))
+    
+    if action == DUPLICATE:
+        result = dict(stream.last_result or {'errors': [], 'current_position': state.get('current_position', 0)})
+        result['duplicate'] = True
+    elif action == RESYNC:
+        result = {'errors': [], 'current_position': state.get('current_position', 0), 'resync': True}
+    elif not words:
+        result = {'errors': [], 'current_position': state.get('current_position', 0)}
+    elif action == FINAL:
+        result, aligner = process_realtime_text(state, ' '.join(words), aligner, debug)
+        stream.last_result = result
+    else:
+        result, _ = process_realtime_text(dict(state), ' '.join(words), debug=debug)
+        result['provisional'] = True
+        stream.last_result = result
+    
+    result.update({'v': PROTOCOL_VERSION, 'seq': message.get('seq'), 'segment': message.get('segment')})
+    state['realtime_stream'] = stream.state()
+    return result, aligner
+
+def check_realtime_message(data):
+    """Evaluate one admitted /check_realtime message against the session"""
+    if data.get('v') == PROTOCOL_VERSION:
+        result, _ = process_realtime_message(session, data)
+        return result
+    
+    # Version 1: the whole text is treated as newly finalized words
+    spoken_text = data.get('text', '').strip()
+    
+    if not spoken_text:
+        return {'errors': [], 'current_position': session.get('current_position', 0)}
+    
+    result, _ = process_realtime_text(session, spoken_text, debug=bool(data.get('debug')))
+    return result
+
+def encode_realtime_result(result, message, state=None):
+    """A realtime result in the schema the message asked for (see realtime_protocol.py)"""
+    state = session if state is None else state
+    return encode_result(result, message.get('schema'), state.get('surah_number'), corpus.get_index)
+
+def realtime_response(result, message, status=200):
+    """The /check_realtime response: compact results as MessagePack if the client prefers it"""
+    encoded = encode_realtime_result(result, message)
+    if encoded.get('schema') == COMPACT_SCHEMA and wants_msgpack(request.accept_mimetypes):
+        response = Response(pack(encoded), status, mimetype=MSGPACK_MIMETYPE)
+    else:
+        response = jsonify(encoded)
+        response.status_code = status
+    response.vary.add('Accept')
+    return response
 
 @app.route('/check_realtime', methods=['POST'])
 def check_realtime():
     """Check spoken text in real-time against expected text with enhanced Arabic processing"""
     try:
         data = request.get_json()
-        spoken_text = data.get('text', '').strip()
-        
-        if not spoken_text:
-            return jsonify({'errors': [], 'current_position': session.get('current_position', 0)})
-        
-        current_position = session.get('current_position', 0)
-        full_text = session.get('full_text', '')
         
-        # Check if spoken text matches expected position in surah
-        errors = qtc.check_current_words(spoken_text, full_text, current_position)
+        # One request per session at a time; bursts of interims collapse into the newest
+        final = data.get('v') != PROTOCOL_VERSION or bool(data.get('final'))
+        outcome, data = realtime_admission.acquire(session.sid, data, final)
+        if outcome == SHED:
+            result = {'errors': [], 'current_position': session.get('current_position', 0), 'shed': True,
+                      'retry_after': realtime_admission.retry_after}
+            if data.get('v') == PROTOCOL_VERSION:
+                result.update({'v': PROTOCOL_VERSION, 'seq': data.get('seq'), 'segment': data.get('segment')})
+            response = realtime_response(result, data, 503)
+            response.headers['Retry-After'] = str(realtime_admission.retry_after)
+            return response
+        if outcome == COALESCED:
+            # A newer interim of the same segment carries these words
+            return realtime_response({'errors': [], 'current_position': session.get('current_position', 0),
+                                      'coalesced': True, 'v': PROTOCOL_VERSION, 'seq': data.get('seq'),
+                                      'segment': data.get('segment')}, data)
         
-        # Update position based on spoken words (use normalized count)
-        spoken_normalized = qtc.normalize_arabic_text(spoken_text)
-        spoken_words_count = len([w for w in spoken_normalized.split() if w.strip()])
-        new_position = current_position + spoken_words_count
-        session['current_position'] = new_position
-        
-        # Store errors for later analysis
-        if 'realtime_errors' not in session:
-            session['realtime_errors'] = []
-        
-        if errors:
-            session['realtime_errors'].extend(errors)
-        
-        # Get next expected words for suggestion
-        suggestion = get_next_expected_words(full_text, new_position, 3)
-        total_words = session.get('total_words', 1)
-        progress_percentage = min((new_position / total_words) * 100, 100) if total_words > 0 else 0
-        
-        return jsonify({
-            'errors': errors,
-            'current_position': new_position,
-            'suggestion': suggestion,
-            'progress_percentage': round(progress_percentage, 1),
-            'total_words': total_words,
-            'debug_info': {
-                'spoken_normalized': qtc.normalize_arabic_text(spoken_text),
-                'words_processed': spoken_words_count
-            }
-        })
+        try:
+            # The request that ran before this one saved after we opened the session
+            stored = app.session_interface.store.get(session.sid)
+            if stored is not None:
+                session.clear()
+                session.update(stored)
+            result = check_realtime_message(data)
+            # Saved before the next request of the session is let in, not after the response
+            app.session_interface.store.set(session.sid, dict(session))
+            session.modified = False
+        finally:
+            realtime_admission.release(session.sid)
+        return realtime_response(result, data)
         
     except Exception as e:
         print(f"Error in check_realtime: {e}")
         return jsonify({'errors': [], 'current_position': session.get('current_position', 0), 'error': str(e)})
 
+def build_final_analysis(full_transcript, surah_index, session_duration="Unknown"):
+    """Grade a complete transcript against a surah; shared by /final_analysis and batch grading"""
+    # Comprehensive analysis with enhanced Arabic processing, one ayah segment at a time
+    differences, similarity, ayah_accuracy = qtc.compare_with_surah(full_transcript, surah_index)
+    
+    # Calculate detailed metrics
+    total_words = surah_index.total_words
+    spoken_words = len(qtc.normalize_words(full_transcript))
+    
+    # Categorize errors
+    errors_by_type = {
+        'incorrect': [d for d in differences if d.get('type') == 'incorrect'],
+        'missing': [d for d in differences if d.get('type') == 'missing'],
+        'extra': [d for d in differences if d.get('type') == 'extra']
+    }
+    
+    # Calculate accuracy metrics
+    total_errors = len(differences)
+    accuracy_percentage = similarity * 100
+    completion_percentage = min((spoken_words / total_words) * 100, 100) if total_words > 0 else 0
+    
+    # Generate enhanced suggestions
+    suggestions = generate_improvement_suggestions(differences)
+    
+    # Detailed analysis object
+    return {
+        'overall_accuracy': round(accuracy_percentage, 1),
+        'completion_percentage': round(completion_percentage, 1),
+        'total_words': total_words,
+        'spoken_words': spoken_words,
+        'total_errors': total_errors,
+        'errors_by_type': errors_by_type,
+        'error_counts': {
+            'incorrect': len(errors_by_type['incorrect']),
+            'missing': len(errors_by_type['missing']),
+            'extra': len(errors_by_type['extra'])
+        },
+        'ayah_accuracy': ayah_accuracy,
+        'suggestions': suggestions,
+        'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        'session_duration': session_duration,
+        'processing_info': {
+            'enhanced_arabic_processing': True,
+            'normalization_applied': True,
+            'hamza_aware': True
+        }
+    }
+
+def grade_transcript(surah_number, transcript):
+    """build_final_analysis() for a surah number, or None if the corpus has no such surah (see batch_grading.py)"""
+    surah_index = corpus.get_index(surah_number)
+    if surah_index is None:
+        return None
+    return build_final_analysis(transcript, surah_index)
+
 @app.route('/final_analysis', methods=['POST'])
 def final_analysis():
     """Provide comprehensive analysis when user stops recording"""
     try:
         data = request.get_json()
         full_transcript = data.get('transcript', '').strip()
-        surah_text = session.get('full_text', '')
+        surah_index = current_surah_index()
         
-        if not full_transcript or not surah_text:
+        if not full_transcript or surah_index is None:
             return jsonify({'error': 'No transcript or surah text available'})
         
-        # Comprehensive analysis with enhanced Arabic processing
-        differences, similarity = qtc.compare_texts(full_transcript, surah_text)
-        
-        # Calculate detailed metrics
-        total_words = len([w for w in qtc.normalize_arabic_text(surah_text).split() if w.strip()])
-        spoken_words = len([w for w in qtc.normalize_arabic_text(full_transcript).split() if w.strip()])
+        if session.get('surah_word_offset'):
+            # Continuous hifz: grade what was recited of the current surah
+            full_transcript = ' '.join(qtc.normalize_words(full_transcript)[session['surah_word_offset']:])
         
-        # Categorize errors
-        errors_by_type = {
-            'incorrect': [d for d in differences if d.get('type') == 'incorrect'],
-            'missing': [d for d in differences if d.get('type') == 'missing'],
-            'extra': [d for d in differences if d.get('type') == 'extra']
-        }
-        
-        # Calculate accuracy metrics
-        total_errors = len(differences)
-        accuracy_percentage = similarity * 100
-        completion_percentage = min((spoken_words / total_words) * 100, 100) if total_words > 0 else 0
-        
-        # Generate enhanced suggestions
-        suggestions = generate_improvement_suggestions(differences)
-        
-        # Detailed analysis object
-        analysis = {
-            'overall_accuracy': round(accuracy_percentage, 1),
-            'completion_percentage': round(completion_percentage, 1),
-            'total_words': total_words,
-            'spoken_words': spoken_words,
-            'total_errors': total_errors,
-            'errors_by_type': errors_by_type,
-            'error_counts': {
-                'incorrect': len(errors_by_type['incorrect']),
-                'missing': len(errors_by_type['missing']),
-                'extra': len(errors_by_type['extra'])
-            },
-            'suggestions': suggestions,
-            'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            'session_duration': calculate_session_duration(),
-            'processing_info': {
-                'enhanced_arabic_processing': True,
-                'normalization_applied': True,
-                'hamza_aware': True
-            }
-        }
+        analysis = build_final_analysis(full_transcript, surah_index, calculate_session_duration())
         
         # Store analysis in session for potential report generation
         session['final_analysis'] = analysis
         session['final_transcript'] = full_transcript
+        progress.record(progress_user(), surah_index.number, analysis)
         
         return jsonify(analysis)
         
@@ -468,6 +817,26 @@ def final_analysis():
         print(f"Error in final_analysis: {e}")
         return jsonify({'error': f'Analysis failed: {str(e)}'})
 
+@app.route('/locate', methods=['GET', 'POST'])
+def locate():
+    """Ranked places in the whole corpus where a few recited words (?text= or JSON {text}) start"""
+    data = request.get_json(silent=True) or {}
+    text = data.get('text') or request.values.get('text', '')
+    words = qtc.normalize_words(text)
+    limit = min(request.args.get('limit', LOCATE_CANDIDATES, type=int), 50)
+    with stage('locate'):
+        candidates = corpus.get_locator().locate(words, limit)
+    return jsonify({'words': len(words), 'candidates': [candidate_payload(candidate) for candidate in candidates]})
+
+@app.route('/batch_analysis', methods=['POST'])
+def batch_analysis():
+    """Grade a JSONL upload of {student, surah, transcript} records, streaming JSONL results"""
+    lines = batch_grading.iter_lines(request.stream)
+    results = batch_grading.grade_lines(lines, grade_transcript)
+    results = batch_grading.record_progress(results, progress)
+    return Response(stream_with_context(batch_grading.dump_lines(results)),
+                    content_type=batch_grading.CONTENT_TYPE)
+
 def calculate_session_duration():
     """Calculate how long the session lasted"""
     start_time_str = session.get('start_time')
@@ -482,51 +851,78 @@ def calculate_session_duration():
 
 @app.route('/recite', methods=['GET', 'POST'])
 def recite():
-    if 'surah' not in session:
+    surah_index = current_surah_index()
+    if surah_index is None and session.get('locate') and request.method == 'GET':
+        # The surah is found from the first words recited
+        page = pages.get('recite.html', None, lambda: render_template(
+            'recite.html', surah=None, full_text='', surah_number=None, words=[]))
+        return pages.respond(page, request, vary=('Cookie',))
+    if surah_index is None and session.get('locate'):
+        candidates = corpus.get_locator().locate(qtc.normalize_words(request.form.get('user_input', '')), 1)
+        if candidates:
+            surah_index = seed_surah(session, candidates[0].surah, candidates[0].position)
+    if surah_index is None:
         return redirect(url_for('index'))
     
-    surah = session['surah']
-    full_text = session.get('full_text', '')
-    
-    if request.method == 'POST':
-        # Handle traditional form submission (fallback)
-        user_input = request.form.get('user_input', '').strip()
-        if user_input:
-            differences, similarity = qtc.compare_texts(user_input, full_text)
-            
-            # Consolidate error details in a single object
-            error_info = {
-                'input_text': user_input,
-                'correct_text': full_text,
-                'differences': differences,
-                'similarity': similarity,
-                'timestamp': datetime.now().strftime("%H:%M:%S")
-            }
-            session['errors'] = [error_info]
-            session['total_similarity'] = similarity
-            session['verses_attempted'] = 1
-            return redirect(url_for('report'))
-        else:
-            error_message = "⚠️ Empty input, please provide your recitation."
-            return render_template('recite.html', 
-                                 surah=surah, 
-                                 full_text=full_text, 
-                                 error_message=error_message)
+    if request.method != 'POST':
+        # The same page for everyone reciting this surah; the session only picks which one
+        page = pages.get('recite.html', surah_index.number, lambda: render_template(
+            'recite.html', surah=qtc.get_surah_text(surah_index.number), full_text=surah_index.full_text,
+            surah_number=surah_index.number, words=list(surah_index.words)))
+        return pages.respond(page, request, vary=('Cookie',))
+
+    surah = qtc.get_surah_text(surah_index.number)
+    full_text = surah_index.full_text
     
-    return render_template('recite.html', surah=surah, full_text=full_text)
+    # Handle traditional form submission (fallback)
+    user_input = request.form.get('user_input', '').strip()
+    if user_input:
+        differences, similarity = qtc.compare_texts(user_input, full_text,
+                                                    surah_index.normalized_text)
+        
+        # Consolidate error details in a single object
+        error_info = {
+            'input_text': user_input,
+            'correct_text': full_text,
+            'differences': differences,
+            'similarity': similarity,
+            'timestamp': datetime.now().strftime("%H:%M:%S")
+        }
+        session['errors'] = [error_info]
+        session['total_similarity'] = similarity
+        session['verses_attempted'] = 1
+        return redirect(url_for('report'))
+    else:
+        error_message = "⚠️ Empty input, please provide your recitation."
+        return render_template('recite.html', 
+                             surah=surah, 
+                             full_text=full_text, 
+                             surah_number=surah_index.number,
+                             words=list(surah_index.words),
+                             error_message=error_message)
 
 @app.route('/report')
 def report():
-    if 'surah' not in session:
+    surah_index = current_surah_index()
+    if surah_index is None:
         return redirect(url_for('index'))
+    surah = qtc.get_surah_text(surah_index.number)
         
+    generated_on = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    
     # Check if we have a final analysis from real-time session
     final_analysis = session.get('final_analysis')
     if final_analysis:
-        return render_template('report.html', 
-                             analysis=final_analysis,
-                             surah=session['surah'],
-                             transcript=session.get('final_transcript', ''))
+        user = progress_user()
+        # Streamed: the header and summary go out before the error groups are rendered
+        return Response(buffered(stream_template('report.html', 
+                                                 analysis=final_analysis,
+                                                 surah=surah,
+                                                 generated_on=generated_on,
+                                                 error_page=report_pages.error_page(final_analysis, surah_index),
+                                                 transcript=session.get('final_transcript', ''),
+                                                 history=progress.accuracy_over_time(user, surah_index.number, limit=20),
+                                                 most_missed=most_missed_words(surah_index, user))))
     
     # Fallback to traditional error reporting
     errors = session.get('errors', [])
@@ -536,24 +932,88 @@ def report():
     error_rate = (len(errors) / verses_attempted * 100) if verses_attempted > 0 else 0
     
     return render_template('report.html',
+                           generated_on=generated_on,
                            errors=errors,
                            verses_attempted=verses_attempted,
                            total_errors=len(errors),
                            avg_similarity=round(avg_similarity, 1),
                            error_rate=round(error_rate, 1))
 
+@app.route('/report/errors')
+def report_errors():
+    """A page of the report's error groups (see report_pages.py), for loading more as the reader scrolls"""
+    surah_index = current_surah_index()
+    final_analysis = session.get('final_analysis')
+    if surah_index is None or not final_analysis:
+        return jsonify({'error': 'No analysis available'}), 404
+    page = request.args.get('page', 1, type=int)
+    return jsonify(report_pages.error_page(final_analysis, surah_index, page))
+
+# Template streams yield many small pieces; send them in chunks of about this size
+STREAM_CHUNK_BYTES = 8192
+
+def buffered(pieces, size=STREAM_CHUNK_BYTES):
+    """Join the pieces of a streamed template into chunks of at least size bytes"""
+    chunk = []
+    length = 0
+    for piece in pieces:
+        chunk.append(piece)
+        length += len(piece)
+        if length >= size:
+            yield ''.join(chunk)
+            chunk = []
+            length = 0
+    if chunk:
+        yield ''.join(chunk)
+
+def most_missed_words(surah_index, user=None, limit=10):
+    """Most missed positions of a surah, with the word as written in the mushaf"""
+    missed = progress.most_missed_positions(surah_index.number, user, limit)
+    for entry in missed:
+        if entry['position'] < surah_index.total_words:
+            entry['word'] = surah_index.original_words[entry['position']]
+            entry['ayah'] = surah_index.ayah_at(entry['position'])
+    return missed
+
+@app.route('/progress/accuracy')
+def progress_accuracy():
+    """A student's accuracy over time (?surah=, ?user= for teachers, ?limit=); defaults to the current user"""
+    user = request.args.get('user') or progress_user()
+    if user != progress_user() and not is_teacher():
+        return jsonify({'error': "Only teachers can read other students' history"}), 403
+    history = progress.accuracy_over_time(user, request.args.get('surah', type=int),
+                                          request.args.get('since', type=float),
+                                          min(request.args.get('limit', 500, type=int), 5000))
+    return jsonify({'user': user, 'recitations': history})
+
+@app.route('/progress/missed/<int:surah_number>')
+def progress_missed(surah_number):
+    """Most missed word positions of a surah, for the current user or (teachers only) ?user= or everyone with ?all=1"""
+    surah_index = corpus.get_index(surah_number)
+    if surah_index is None:
+        return jsonify({'error': f'Unknown surah {surah_number}'}), 404
+    user = None if request.args.get('all') else request.args.get('user') or progress_user()
+    if user != progress_user() and not is_teacher():
+        return jsonify({'error': "Only teachers can read other students' history"}), 403
+    limit = min(request.args.get('limit', 10, type=int), 500)
+    return jsonify({'user': user, 'surah': surah_number, 'positions': most_missed_words(surah_index, user, limit)})
+
 @app.route('/reset_session', methods=['POST'])
 def reset_session():
     """Reset the current session for a new recitation"""
-    keys_to_keep = ['surah', 'full_text']
-    keys_to_reset = ['current_position', 'realtime_errors', 'errors', 'final_analysis', 'final_transcript']
+    keys_to_keep = ['surah_number']
+    keys_to_reset = ['current_position', 'aligner_state', 'realtime_stream', 'realtime_errors', 'errors', 'final_analysis', 'final_transcript',
+                     'locate_words', 'spoken_words', 'surah_word_offset']
     
     for key in keys_to_reset:
         session.pop(key, None)
+    if session.get('locate'):
+        session['surah_number'] = None
     
     session['current_position'] = 0
     session['total_similarity'] = 0.0
     session['verses_attempted'] = 0
+    restart_realtime()
     
     return jsonify({'status': 'reset_complete', 'message': 'Enhanced Arabic processing ready'})
 
@@ -610,8 +1070,16 @@ def not_found_error(error):
 def internal_error(error):
     return "Internal server error", 500
 
+def start_worker_pool():
+    """Fork the analysis and batch grading workers; call once per server process, before it serves requests"""
+    return worker_pool.start(app.config['POOL_WORKERS'])
+
 if __name__ == "__main__":
     print("🕌 Quran Recitation Checker with Enhanced Arabic Processing")
     print("🔤 Hamzat Al-Wasl (ٱ) normalization enabled")
+    print(f"📚 Corpus source: {corpus.source or 'unavailable'}")
     print("🚀 Starting server...")
+    # The reloader's watcher process never serves requests
+    if is_running_from_reloader():
+        start_worker_pool()
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -0,0 +1,119 @@
+"""
+Compiled Arabic text normalizer.
+
+Produces exactly the same output as the original step-by-step pipeline
+(NFKD, drop combining marks, character mappings, drop tatweel, drop verse
+numbers and digits, collapse whitespace, NFKC) but does the per-character
+work in a single `str.translate` call.
+
+Dropping every combining mark after NFKD makes canonical reordering
+irrelevant, so NFKD + strip + mapping can be precomputed per code point:
+the translation table maps each character straight to its final form.
+"""
+import re
+import unicodedata
+from functools import lru_cache
+
+TATWEEL = 'ـ'
+
+# Blocks that cover the Quran text and typical speech transcripts; every
+# other code point is resolved lazily on first sight.
+PRECOMPUTED_RANGES = (
+    (0x0000, 0x0080),  # ASCII
+    (0x0600, 0x0700),  # Arabic
+    (0x0750, 0x0780),  # Arabic Supplement
+    (0x08A0, 0x0900),  # Arabic Extended-A
+    (0xFB50, 0xFE00),  # Arabic Presentation Forms-A
+    (0xFE70, 0xFF00),  # Arabic Presentation Forms-B
+)
+
+VERSE_NUMBER_OR_DIGITS = re.compile(r'\(\s*\d+\s*\)|\d+')
+
+DEFAULT_CACHE_SIZE = 65536
+
+# Enhanced Arabic character mappings for better text comparison; QuranTextChecker
+# (app.py) normalizes with these, and so does the recite page (see word_pack.py)
+ARABIC_NORMALIZATIONS = {
+    # Hamza variations
+    'ء': 'ء',  # Hamza
+    'أ': 'ا',  # Alif with Hamza above
+    'إ': 'ا',  # Alif with Hamza below
+    'آ': 'ا',  # Alif with Madda
+    'ٱ': 'ا',  # Alif Wasla (this is the key fix!)
+
+    # Ya variations
+    'ي': 'ي',  # Ya
+    'ى': 'ي',  # Alif Maksura
+    'ئ': 'ي',  # Ya with Hamza
+
+    # Ta Marbuta variations
+    'ة': 'ه',  # Ta Marbuta
+    'ت': 'ت',  # Ta
+
+    # Ha variations
+    'ه': 'ه',  # Ha
+    'ح': 'ح',  # Ha with dot
+
+    # Other common variations
+    'ک': 'ك',  # Farsi Kaf to Arabic Kaf
+    'گ': 'ك',  # Farsi Gaf to Arabic Kaf
+    'ی': 'ي',  # Farsi Ya to Arabic Ya
+}
+
+
+class _TranslationTable(dict):
+    """str.translate table that fills itself in for unseen code points"""
+
+    def __init__(self, mappings):
+        super().__init__()
+        self.mappings = mappings
+
+    def __missing__(self, codepoint):
+        decomposed = unicodedata.normalize('NFKD', chr(codepoint))
+        value = ''.join(self.mappings.get(char, char) for char in decomposed
+                        if not unicodedata.combining(char))
+        value = value.replace(TATWEEL, '')
+        self[codepoint] = value
+        return value
+
+
+class ArabicNormalizer:
+    """Table-driven normalizer with a bounded per-token cache"""
+
+    def __init__(self, normalizations, cache_size=DEFAULT_CACHE_SIZE):
+        self.normalizations = dict(normalizations)
+        self.table = _TranslationTable(self.normalizations)
+        for start, stop in PRECOMPUTED_RANGES:
+            for codepoint in range(start, stop):
+                self.table[codepoint]
+        self.normalize_word = lru_cache(maxsize=cache_size)(self._normalize)
+
+    def _normalize(self, text):
+        if not text:
+            return ""
+        text = text.translate(self.table)
+        text = VERSE_NUMBER_OR_DIGITS.sub('', text)
+        text = ' '.join(text.split())
+        return unicodedata.normalize('NFKC', text)
+
+    def normalize(self, text):
+        """Normalize arbitrary text (a whole surah or a transcript)"""
+        return self._normalize(text)
+
+    def normalize_words(self, text):
+        """
+        Normalize a transcript into a word list, one cached lookup per raw token.
+
+        Tokens are normalized on their own, so verse numbers written with
+        inner spaces, e.g. "( 3 )", leave their brackets behind; speech
+        transcripts never contain those.
+        """
+        words = []
+        for token in text.split():
+            normalized = self.normalize_word(token)
+            if normalized:
+                words.extend(normalized.split())
+        return words
+
+    def cache_info(self):
+        return self.normalize_word.cache_info()
@@ -0,0 +1,203 @@
+"""
+Async serving mode with a WebSocket channel for live recitation.
+
+    pip install a2wsgi uvicorn
+    uvicorn asgi:application --host 0.0.0.0 --port 5000
+
+Plain HTTP requests are handed to the Flask app through a2wsgi's WSGI
+adapter, so every existing route (including /check_realtime) keeps working.
+WebSocket connections to /ws/recite get one long-lived channel per
+recitation: the aligner stays in memory, and each transcript message is
+answered with the errors, suggestion and progress for just the new words.
+The session is read from the server-side session store for every message,
+so HTTP routes that restart or reset the recitation (which bump its
+realtime epoch) make the channel drop its aligner, and a result computed
+for the old recitation is not written back over the new one.
+
+Client messages are JSON objects:
+
+    {"type": "transcript", "v": 2, "seq": ..., "segment": ..., "final": ..., "offset": ..., "text": ...}
+    {"type": "transcript", "text": "<newly finalized words>"}   (version 1)
+    {"type": "ping"}
+
+and the server answers with {"type": "result", ...} carrying the same fields
+as /check_realtime (in the compact schema for messages with "schema": 1,
+see realtime_protocol.py; always as JSON), {"type": "pong"} or
+{"type": "error", "error": "..."}.
+"""
+import asyncio
+import json
+import time
+from http.cookies import SimpleCookie
+
+import instrumentation
+from app import (REALTIME_EPOCH_KEY, app, encode_realtime_result, process_realtime_message, process_realtime_text,
+                 start_worker_pool)
+from realtime_protocol import PROTOCOL_VERSION
+
+RECITE_WS_PATH = '/ws/recite'
+
+# Session keys owned by the realtime channel; everything else is left to HTTP routes
+REALTIME_KEYS = ('current_position', 'aligner_state', 'realtime_stream', 'realtime_errors',
+                 # Locate and continuous hifz modes move the session to another surah
+                 'surah_number', 'total_words', 'locate_words', 'spoken_words', 'surah_word_offset')
+
+# WebSocket close codes (4000-4999 are application defined)
+CLOSE_NO_SESSION = 4401
+CLOSE_NOT_FOUND = 4404
+
+
+class RecitationChannel:
+    """State of one live recitation over a WebSocket"""
+
+    def __init__(self, store, sid, state):
+        self.store = store
+        self.sid = sid
+        self.state = state
+        self.epoch = state.get(REALTIME_EPOCH_KEY)
+        self.aligner = None
+
+    def handle(self, message):
+        """Handle one decoded client message and return the reply"""
+        token = instrumentation.start_timings()
+        try:
+            return self._handle(message)
+        finally:
+            instrumentation.stop_timings(token)
+
+    def _handle(self, message):
+        message_type = message.get('type')
+        if message_type == 'ping':
+            return {'type': 'pong'}
+        if message_type != 'transcript':
+            return {'type': 'error', 'error': f"Unknown message type: {message_type}"}
+        if not self.reload():
+            return {'type': 'error', 'error': "Session expired"}
+
+        if message.get('v') == PROTOCOL_VERSION:
+            result, self.aligner = process_realtime_message(self.state, message, self.aligner)
+            self.save()
+            return dict(encode_realtime_result(result, message, self.state), type='result')
+
+        spoken_text = str(message.get('text', '')).strip()
+        if not spoken_text:
+            return {'type': 'result', 'errors': [], 'current_position': self.state.get('current_position', 0)}
+
+        result, self.aligner = process_realtime_text(self.state, spoken_text, self.aligner,
+                                                     bool(message.get('debug')))
+        self.save()
+        return dict(encode_realtime_result(result, message, self.state), type='result')
+
+    def reload(self):
+        """Read the session again, dropping the aligner if an HTTP route restarted the recitation"""
+        stored = self.store.get(self.sid)
+        if stored is None:
+            return False
+        self.state = dict(stored)
+        if stored.get(REALTIME_EPOCH_KEY) != self.epoch:
+            self.epoch = stored.get(REALTIME_EPOCH_KEY)
+            self.aligner = None
+        return True
+
+    def save(self):
+        """Write the realtime keys back without clobbering what HTTP routes changed meanwhile"""
+        stored = self.store.get(self.sid)
+        if stored is None:
+            return
+        if stored.get(REALTIME_EPOCH_KEY) != self.epoch:
+            # Restarted while this message was being handled; its result belongs to the old recitation
+            self.aligner = None
+            return
+        stored = dict(stored)
+        for key in REALTIME_KEYS:
+            if key in self.state:
+                stored[key] = self.state[key]
+        self.store.set(self.sid, stored)
+
+
+class RecitationASGI:
+    """ASGI application: WebSocket recitation channel plus the Flask app for HTTP"""
+
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self.store = flask_app.session_interface.store
+        self.cookie_name = flask_app.config['SESSION_COOKIE_NAME']
+        try:
+            from a2wsgi import WSGIMiddleware
+        except ImportError:
+            raise RuntimeError("The async serving mode needs a2wsgi: pip install a2wsgi uvicorn")
+        self.http_app = WSGIMiddleware(flask_app)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'websocket':
+            if scope['path'] == RECITE_WS_PATH:
+                await self.recite_socket(scope, receive, send)
+            else:
+                await receive()
+                await send({'type': 'websocket.close', 'code': CLOSE_NOT_FOUND})
+        elif scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+        else:
+            await self.http_app(scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                # Before a2wsgi starts its request threads (see worker_pool.py)
+                start_worker_pool()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def session_id(self, scope):
+        cookie = SimpleCookie()
+        for name, value in scope.get('headers', []):
+            if name == b'cookie':
+                cookie.load(value.decode('latin-1'))
+        morsel = cookie.get(self.cookie_name)
+        return morsel.value if morsel else None
+
+    async def recite_socket(self, scope, receive, send):
+        message = await receive()
+        if message['type'] != 'websocket.connect':
+            return
+
+        sid = self.session_id(scope)
+        state = self.store.get(sid) if sid else None
+        if not state or 'surah_number' not in state:
+            await send({'type': 'websocket.close', 'code': CLOSE_NO_SESSION})
+            return
+
+        channel = RecitationChannel(self.store, sid, dict(state))
+        await send({'type': 'websocket.accept'})
+
+        while True:
+            message = await receive()
+            if message['type'] == 'websocket.disconnect':
+                return
+            if message['type'] != 'websocket.receive':
+                continue
+
+            start = time.perf_counter()
+            raw = message.get('text') or message.get('bytes') or '{}'
+            try:
+                payload = json.loads(raw)
+                # Alignment is CPU-bound; keep the event loop free for other sockets
+                reply = await asyncio.to_thread(channel.handle, payload)
+            except Exception as e:
+                print(f"Error in recite socket: {e}")
+                reply = {'type': 'error', 'error': str(e)}
+            text = json.dumps(reply, ensure_ascii=False)
+            await send({'type': 'websocket.send', 'text': text})
+
+            # Socket messages are reported like requests to the socket's path
+            instrumentation.REQUEST_SECONDS.observe(time.perf_counter() - start, route=RECITE_WS_PATH,
+                                                    method='WS', status=reply.get('type'))
+            instrumentation.REQUEST_BYTES.observe(len(raw.encode('utf-8') if isinstance(raw, str) else raw),
+                                                  route=RECITE_WS_PATH)
+            instrumentation.RESPONSE_BYTES.observe(len(text.encode('utf-8')), route=RECITE_WS_PATH)
+
+
+application = RecitationASGI(app)
@@ -0,0 +1,180 @@
+"""
+Batch grading of recorded transcripts.
+
+Teachers can grade a whole class at once instead of pushing each transcript
+through a browser session. Input is JSONL, one record per line:
+
+    {"student": "Amina", "surah": 67, "transcript": "تبارك الذي بيده الملك ..."}
+
+and every line produces one JSONL result, in input order:
+
+    {"line": 1, "student": "Amina", "surah": 67, "analysis": {...}}
+    {"line": 2, "student": "Yusuf", "surah": 999, "error": "Unknown surah 999"}
+
+where "analysis" has the same shape as the /final_analysis response.
+Results with a student name are also added to the progress history (see
+progress_store.py).
+Records are graded in small batches on a process pool. Only a bounded number
+of batches is in flight at a time, so memory stays flat however large the
+input is, and results are written as soon as they are ready.
+
+This module does not import the app. Grading goes through a `grade`
+callable, (surah number, transcript) -> analysis or None for an unknown
+surah, which the app (or the CLI, after loading it) passes in. Batches run
+on the shared worker pool (see worker_pool.py) when one is running, and in
+the calling process otherwise. `grade` is sent with every batch, so it has
+to be a module-level function; the workers were forked from the process
+that loaded it and resolve it without importing or loading anything.
+
+    python batch_grading.py transcripts.jsonl -o results.jsonl --workers 8
+    curl --data-binary @transcripts.jsonl http://localhost:5000/batch_analysis
+"""
+import argparse
+import contextlib
+import json
+import os
+import sys
+from collections import deque
+
+import worker_pool
+
+CONTENT_TYPE = 'application/x-ndjson; charset=utf-8'
+RECORDS_PER_TASK = 4   # records sent to a worker at a time
+TASKS_PER_WORKER = 2   # batches in flight per worker; bounds memory
+
+
+def iter_lines(stream):
+    """Non-blank lines of a binary or text stream, numbered from 1"""
+    for number, line in enumerate(stream, start=1):
+        if isinstance(line, bytes):
+            line = line.decode('utf-8', errors='replace')
+        line = line.strip()
+        if line:
+            yield number, line
+
+
+def _parse_record(line):
+    try:
+        record = json.loads(line)
+    except ValueError as e:
+        raise ValueError(f"Invalid JSON: {e}")
+    if not isinstance(record, dict):
+        raise ValueError("Each line must be a JSON object")
+    transcript = record.get('transcript')
+    if not isinstance(transcript, str) or not transcript.strip():
+        raise ValueError("Missing transcript")
+    try:
+        surah = int(record.get('surah'))
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid surah {record.get('surah')!r}")
+    return record.get('student'), surah, transcript.strip()
+
+
+def grade_line(number, line, grade):
+    """Grade one input line; errors are reported in the result rather than raised"""
+    result = {'line': number, 'student': None, 'surah': None}
+    try:
+        result['student'], result['surah'], transcript = _parse_record(line)
+        analysis = grade(result['surah'], transcript)
+        if analysis is None:
+            result['error'] = f"Unknown surah {result['surah']}"
+        else:
+            result['analysis'] = analysis
+    except ValueError as e:
+        result['error'] = str(e)
+    except Exception as e:
+        print(f"Error grading line {number}: {e}")
+        result['error'] = f"Analysis failed: {e}"
+    return result
+
+
+def _grade_batch(grade, batch):
+    """Process-pool worker: grade a batch of (line number, line) pairs"""
+    return [grade_line(number, line, grade) for number, line in batch]
+
+
+def _batches(lines, size):
+    batch = []
+    for item in lines:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def grade_lines(lines, grade, parallel=True):
+    """Grade (line number, line) pairs with grade, yielding results in input order"""
+    batches = _batches(lines, RECORDS_PER_TASK)
+    executor = worker_pool.get_pool() if parallel else None
+    if executor is None:
+        for batch in batches:
+            for number, line in batch:
+                yield grade_line(number, line, grade)
+        return
+
+    workers = worker_pool.size()
+    pending = deque()
+    try:
+        for batch in batches:
+            pending.append(executor.submit(_grade_batch, grade, batch))
+            if len(pending) >= workers * TASKS_PER_WORKER:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+    finally:
+        # The consumer went away (e.g. the client disconnected); drop queued work
+        for future in pending:
+            future.cancel()
+
+
+def record_progress(results, store):
+    """Pass results through, adding each graded one with a student name to the progress history"""
+    for result in results:
+        if 'analysis' in result and result['student']:
+            store.record(result['student'], result['surah'], result['analysis'], source='batch')
+        yield result
+
+
+def dump_lines(results):
+    for result in results:
+        yield json.dumps(result, ensure_ascii=False) + '\n'
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Grade a JSONL file of {student, surah, transcript} records")
+    parser.add_argument('input', help="JSONL input file, or - for stdin")
+    parser.add_argument('-o', '--out', default='-', help="JSONL output file (default: stdout)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help="grading processes (default: one per CPU)")
+    parser.add_argument('--no-history', action='store_true', help="don't add results to the progress database")
+    args = parser.parse_args(argv)
+
+    # Load the app (corpus, warm-up) up front so forked workers inherit it, logging to stderr
+    with contextlib.redirect_stdout(sys.stderr):
+        import app as lefqih
+    worker_pool.start(args.workers)
+
+    source = sys.stdin.buffer if args.input == '-' else open(args.input, 'rb')
+    target = sys.stdout if args.out == '-' else open(args.out, 'w', encoding='utf-8')
+    graded = failed = 0
+    try:
+        results = grade_lines(iter_lines(source), lefqih.grade_transcript)
+        if not args.no_history:
+            results = record_progress(results, lefqih.progress)
+        for result in results:
+            target.write(json.dumps(result, ensure_ascii=False) + '\n')
+            graded += 1
+            failed += 'error' in result
+    finally:
+        if source is not sys.stdin.buffer:
+            source.close()
+        if target is not sys.stdout:
+            target.close()
+        lefqih.progress.flush()
+    print(f"✅ Graded {graded} transcripts ({failed} failed)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1 @@
+"""Benchmarks for the recitation checker; run modules with `python -m bench.<name>`."""
@@ -0,0 +1,175 @@
+"""
+Run the whole benchmark suite and compare it with a JSON baseline.
+
+    python -m bench                 # run and compare with bench/baselines/<corpus>.json
+    python -m bench --save          # run and record a new baseline
+    python -m bench --tolerance 0.5 --runs 5
+
+Baselines are kept per corpus source ("local" or "synthetic"), since the
+numbers are only comparable on the same text. A metric regresses when it is
+worse than its baseline by more than the tolerance; the exit status is 1 if
+any metric regressed. The suite runs several times and every guarded
+metric keeps its best value over the runs (background load only ever makes
+a timing worse), the others their median, so one noisy sub-microsecond
+timing neither fails the comparison nor ends up in a baseline. A
+regression is only reported if it is still there after CONFIRM_ROUNDS more
+rounds of runs. Timings
+depend on the machine, so record the baseline on the machine that runs the
+comparison.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+
+from bench import load, micro, normalizer
+from bench.common import ensure_corpus
+
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines')
+DEFAULT_TOLERANCE = 0.5
+DEFAULT_RUNS = 3
+# Extra rounds of runs before a regression is reported, since a noisy stretch can span a whole round
+CONFIRM_ROUNDS = 2
+
+# Metric name suffixes; anything else (counts, sizes) is informational only
+HIGHER_IS_BETTER = ('_mb_s', '_per_s', 'speedup')
+LOWER_IS_BETTER = ('_ms', '_us', '_us_per_word')
+# Reference implementations are measured for comparison, not guarded
+REFERENCE_METRICS = ('micro.difflib_ratio_us',)
+# Samples a route needs before its percentile is worth guarding
+MIN_SAMPLES = {'p50_ms': 20, 'p95_ms': 100, 'p99_ms': 500}
+
+# Small enough to finish in seconds, large enough for stable percentiles
+LOAD_SETTINGS = {'sessions': 4, 'recitations_per_session': 2, 'max_words': 200}
+
+
+def flatten(prefix, results):
+    flat = {}
+    for name, value in results.items():
+        key = f"{prefix}.{name}"
+        if isinstance(value, dict):
+            flat.update(flatten(key, value))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[key] = value
+    return flat
+
+
+def direction(metric):
+    if metric in REFERENCE_METRICS:
+        return 0
+    if metric.endswith(HIGHER_IS_BETTER):
+        return 1
+    if metric.endswith('.mean_ms'):
+        # Means of concurrent latencies swing with thread scheduling; percentiles are guarded
+        return 0
+    if metric.endswith(LOWER_IS_BETTER):
+        return -1
+    return 0
+
+
+def enough_samples(metric, metrics):
+    prefix, _, stat = metric.rpartition('.')
+    if stat not in MIN_SAMPLES:
+        return True
+    return metrics.get(f"{prefix}.count", 0) >= MIN_SAMPLES[stat]
+
+
+def compare(metrics, baseline, tolerance):
+    """Return [(metric, baseline value, current value, change)] for every regression"""
+    regressions = []
+    for metric, value in metrics.items():
+        sign = direction(metric)
+        previous = baseline.get(metric)
+        if not sign or not previous or not enough_samples(metric, metrics):
+            continue
+        change = (value - previous) / previous
+        if sign * change < -tolerance:
+            regressions.append((metric, previous, value, change))
+    return regressions
+
+
+def run_suite():
+    normalizer_results = normalizer.run()
+    micro_results = micro.run()
+    load_results = load.run(**LOAD_SETTINGS)
+    metrics = {}
+    metrics.update(flatten('normalizer', normalizer_results))
+    metrics.update(flatten('micro', micro_results))
+    metrics.update(flatten('load', load_results))
+    return metrics
+
+
+def combine_runs(runs):
+    """Metrics of several suite runs: the best value of guarded metrics, the median of the others"""
+    values = {}
+    for metrics in runs:
+        for name, value in metrics.items():
+            values.setdefault(name, []).append(value)
+    combined = {}
+    for name, samples in values.items():
+        sign = direction(name)
+        if sign > 0:
+            combined[name] = max(samples)
+        elif sign < 0:
+            combined[name] = min(samples)
+        else:
+            combined[name] = statistics.median(samples)
+    return combined
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run all benchmarks and check them against a baseline")
+    parser.add_argument('--save', action='store_true', help="record the results as the new baseline")
+    parser.add_argument('--baseline', help="baseline file (default: bench/baselines/<corpus>.json)")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help="allowed relative slowdown before a metric counts as a regression")
+    parser.add_argument('--runs', type=int, default=DEFAULT_RUNS,
+                        help="suite runs to take each metric's best (or median) value over")
+    args = parser.parse_args(argv)
+
+    # Before anything imports the app, so every module sees the same corpus
+    _, source = ensure_corpus()
+    path = args.baseline or os.path.join(BASELINE_DIR, f"{source}.json")
+    baseline = None
+    if not args.save and os.path.exists(path):
+        with open(path, encoding='utf-8') as f:
+            baseline = json.load(f)['metrics']
+
+    runs = []
+    for round_number in range(CONFIRM_ROUNDS + 1):
+        runs.extend(run_suite() for _ in range(max(args.runs, 1)))
+        metrics = combine_runs(runs)
+        regressions = compare(metrics, baseline, args.tolerance) if baseline is not None else []
+        if not regressions or round_number == CONFIRM_ROUNDS:
+            break
+        print(f"⚠️ {len(regressions)} possible regression(s); running the suite again to confirm")
+
+    for metric, value in metrics.items():
+        print(f"{metric:<48} {value}")
+
+    if args.save:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'python': platform.python_version(), 'machine': platform.machine(),
+                       'metrics': metrics}, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"💾 Baseline saved to {path}")
+        return 0
+
+    if baseline is None:
+        print(f"⚠️ No baseline at {path}; record one with `python -m bench --save`")
+        return 0
+
+    if not regressions:
+        print(f"✅ No regressions against {path} (tolerance {args.tolerance:.0%})")
+        return 0
+    print(f"❌ {len(regressions)} regression(s) against {path}:")
+    for metric, previous, value, change in regressions:
+        print(f"   {metric}: {previous} -> {value} ({change:+.0%})")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,118 @@
+"""
+Local stand-in for api.alquran.cloud, for exercising the API client offline.
+
+    python -m bench.api_stub --port 8765 --delay 0.05 --fail-rate 0.2
+    QURAN_CORPUS_PATH=/nonexistent QURAN_API_URL=http://127.0.0.1:8765/v1 python app.py
+
+Serves /v1/surah and /v1/surah/<n> from the local corpus dump (or the
+synthetic surahs) with strong ETags and If-None-Match support. --delay adds
+latency to every response, --fail-rate answers that fraction of requests
+with a 503, and --down makes every request fail, to watch the client's
+retries, circuit breaker and stale-while-revalidate cache at work.
+"""
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from bench.common import load_surahs
+from quran_corpus import SURAH_FIELDS
+
+
+class ApiStub:
+    """Pre-rendered API responses plus the fault injection settings"""
+
+    def __init__(self, surahs, delay=0.0, fail_rate=0.0, seed=0):
+        self.delay = delay
+        self.fail_rate = fail_rate
+        self.down = False
+        self.requests = 0
+        self.not_modified = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.responses = {'/v1/surah': self._render([{field: surah.get(field) for field in SURAH_FIELDS}
+                                                    for surah in surahs])}
+        for surah in surahs:
+            self.responses[f"/v1/surah/{surah['number']}"] = self._render(surah)
+
+    @staticmethod
+    def _render(data):
+        body = json.dumps({'code': 200, 'status': 'OK', 'data': data}, ensure_ascii=False).encode('utf-8')
+        return body, '"' + hashlib.sha1(body).hexdigest() + '"'
+
+    def should_fail(self):
+        with self._lock:
+            self.requests += 1
+            return self.down or self._rng.random() < self.fail_rate
+
+    def make_handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if stub.delay:
+                    time.sleep(stub.delay)
+                if stub.should_fail():
+                    self.send_response(503)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                response = stub.responses.get(self.path.rstrip('/'))
+                if response is None:
+                    self.send_response(404)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                body, etag = response
+                if self.headers.get('If-None-Match') == etag:
+                    with stub._lock:
+                        stub.not_modified += 1
+                    self.send_response(304)
+                    self.send_header('ETag', etag)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.send_header('ETag', etag)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def serve(stub, host='127.0.0.1', port=0):
+    """Start the stub on a background thread; returns (server, base_url)"""
+    server = ThreadingHTTPServer((host, port), stub.make_handler())
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/v1"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve a local stub of the Quran API")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--delay', type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument('--fail-rate', type=float, default=0.0, help="fraction of requests answered with 503")
+    parser.add_argument('--down', action='store_true', help="answer every request with 503")
+    args = parser.parse_args(argv)
+
+    surahs, source = load_surahs()
+    stub = ApiStub(surahs, args.delay, args.fail_rate)
+    stub.down = args.down
+    server = ThreadingHTTPServer((args.host, args.port), stub.make_handler())
+    print(f"🧪 Quran API stub ({source} corpus) on http://{args.host}:{args.port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""Shared helpers for the benchmark scripts"""
+import math
+import os
+import tempfile
+import time
+
+from quran_corpus import DEFAULT_CORPUS_PATH, SQLiteCorpusBackend, write_corpus
+from surah_index import build_full_text
+
+# Used when no local corpus dump is available, so the benchmarks still run
+# (with less realistic numbers) on a fresh checkout.
+SAMPLE_AYAHS = [
+    "بِسْمِ ٱللَّهِ ٱلرَّحْمَٰنِ ٱلرَّحِيمِ",
+    "ٱلْحَمْدُ لِلَّهِ رَبِّ ٱلْعَٰلَمِينَ",
+    "ٱلرَّحْمَٰنِ ٱلرَّحِيمِ",
+    "مَٰلِكِ يَوْمِ ٱلدِّينِ",
+    "إِيَّاكَ نَعْبُدُ وَإِيَّاكَ نَسْتَعِينُ",
+    "ٱهْدِنَا ٱلصِّرَٰطَ ٱلْمُسْتَقِيمَ",
+    "صِرَٰطَ ٱلَّذِينَ أَنْعَمْتَ عَلَيْهِمْ غَيْرِ ٱلْمَغْضُوبِ عَلَيْهِمْ وَلَا ٱلضَّآلِّينَ",
+    "ذَٰلِكَ ٱلْكِتَٰبُ لَا رَيْبَ ۛ فِيهِ ۛ هُدًى لِّلْمُتَّقِينَ",
+    "ٱلَّذِينَ يُؤْمِنُونَ بِٱلْغَيْبِ وَيُقِيمُونَ ٱلصَّلَوٰةَ وَمِمَّا رَزَقْنَٰهُمْ يُنفِقُونَ",
+    "قُلْ هُوَ ٱللَّهُ أَحَدٌ",
+    "ٱللَّهُ ٱلصَّمَدُ",
+    "لَمْ يَلِدْ وَلَمْ يُولَدْ",
+    "وَلَمْ يَكُن لَّهُۥ كُفُوًا أَحَدٌۢ",
+]
+
+# Shortest single timing run when best_of picks the call count itself
+MIN_RUN_SECONDS = 0.05
+
+# Ayahs of each surah of the mushaf, so synthetic surahs have the real spread of lengths
+AYAH_COUNTS = (
+    7, 286, 200, 176, 120, 165, 206, 75, 129, 109, 123, 111, 43, 52, 99, 128, 111, 110, 98, 135,
+    112, 78, 118, 64, 77, 227, 93, 88, 69, 60, 34, 30, 73, 54, 45, 83, 182, 88, 75, 85,
+    54, 53, 89, 59, 37, 35, 38, 29, 18, 45, 60, 49, 62, 55, 78, 96, 29, 22, 24, 13,
+    14, 11, 11, 18, 12, 12, 30, 52, 52, 44, 28, 28, 20, 56, 40, 31, 50, 40, 46, 42,
+    29, 19, 36, 25, 22, 17, 19, 26, 30, 20, 15, 21, 11, 8, 8, 19, 5, 8, 8, 11,
+    11, 8, 3, 9, 5, 4, 7, 3, 6, 3, 5, 4, 5, 6,
+)
+# Sample ayahs joined into each synthetic ayah: about the real corpus' 12 words per ayah
+SAMPLES_PER_AYAH = 3
+# Part of the temporary dump's name; bump it when synthetic_surahs() changes
+SYNTHETIC_VERSION = 2
+
+
+def synthetic_surahs():
+    """API-shaped surahs built from SAMPLE_AYAHS, sized roughly like the real corpus"""
+    surahs = []
+    ayah_number = 0
+    for surah_number, count in enumerate(AYAH_COUNTS, start=1):
+        ayahs = []
+        for number_in_surah in range(1, count + 1):
+            ayah_number += 1
+            first = ayah_number * SAMPLES_PER_AYAH
+            ayahs.append({
+                'number': ayah_number,
+                'text': ' '.join(SAMPLE_AYAHS[(first + i) % len(SAMPLE_AYAHS)] for i in range(SAMPLES_PER_AYAH)),
+                'numberInSurah': number_in_surah,
+            })
+        surahs.append({
+            'number': surah_number,
+            'name': f"سورة {surah_number}",
+            'englishName': f"Synthetic {surah_number}",
+            'englishNameTranslation': '',
+            'revelationType': 'Meccan',
+            'numberOfAyahs': count,
+            'ayahs': ayahs,
+        })
+    return surahs
+
+
+def load_surahs(path=None):
+    """Return (surahs, source) from the local corpus dump, or synthetic data if there is none"""
+    path = path or os.environ.get('QURAN_CORPUS_PATH') or DEFAULT_CORPUS_PATH
+    backend = SQLiteCorpusBackend(path)
+    if backend.available():
+        surah_list, surahs = backend.load_all()
+        return [surahs[surah['number']] for surah in surah_list], 'local'
+    return synthetic_surahs(), 'synthetic'
+
+
+def ensure_corpus(path=None):
+    """
+    Point QURAN_CORPUS_PATH at a corpus dump before the app is imported.
+
+    Uses the local dump when there is one, otherwise writes the synthetic
+    surahs to a temporary dump. Returns (path, source).
+    """
+    path = path or os.environ.get('QURAN_CORPUS_PATH') or DEFAULT_CORPUS_PATH
+    if not SQLiteCorpusBackend(path).available():
+        path = os.path.join(tempfile.gettempdir(), f'lefqih-bench-corpus-v{SYNTHETIC_VERSION}.sqlite')
+        if not os.path.exists(path):
+            write_corpus(path, synthetic_surahs())
+        source = 'synthetic'
+    else:
+        source = 'local'
+    os.environ['QURAN_CORPUS_PATH'] = path
+    os.environ.setdefault('QURAN_API_FALLBACK', '0')
+    return path, source
+
+
+def load_corpus_text(path=None):
+    """Full-text concatenation of every surah, as built by /start"""
+    surahs, source = load_surahs(path)
+    return '\n'.join(build_full_text(surah) for surah in surahs), source
+
+
+def best_of(func, repeat=5, number=1):
+    """
+    Best wall-clock time in seconds of `number` calls, over `repeat` runs.
+
+    With number=None, enough calls are batched per run to take at least
+    MIN_RUN_SECONDS, which keeps sub-millisecond timings stable.
+    """
+    if number is None:
+        number = 1
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        if elapsed < MIN_RUN_SECONDS:
+            number = max(1, int(MIN_RUN_SECONDS / max(elapsed, 1e-9)))
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        best = min(best, time.perf_counter() - start)
+    return best / number
+
+
+def percentiles(samples):
+    """p50/p95/p99 and mean of a list of latencies in seconds, reported in milliseconds"""
+    if not samples:
+        return {'count': 0, 'mean_ms': 0.0, 'p50_ms': 0.0, 'p95_ms': 0.0, 'p99_ms': 0.0}
+    ordered = sorted(samples)
+
+    def rank(fraction):
+        # Nearest-rank percentile
+        index = max(0, math.ceil(fraction * len(ordered)) - 1)
+        return round(ordered[index] * 1000, 3)
+
+    return {
+        'count': len(ordered),
+        'mean_ms': round(sum(ordered) / len(ordered) * 1000, 3),
+        'p50_ms': rank(0.50),
+        'p95_ms': rank(0.95),
+        'p99_ms': rank(0.99),
+    }
@@ -0,0 +1,150 @@
+"""
+Offline load generator for the recitation endpoints.
+
+    python -m bench.load --sessions 8 --recitations 2
+    python -m bench.load --url http://127.0.0.1:5000   # against a running server
+
+Each simulated user picks a surah, starts a realtime session, streams a
+synthetic recitation to /check_realtime the way recite.html does (an interim
+delta, then the final, for every recognizer segment) and finishes with
+/final_analysis. Users run concurrently on threads, each with its own Flask
+test client (or requests.Session with --url), and every request's latency is
+recorded per route.
+"""
+import argparse
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from bench.common import ensure_corpus, percentiles
+from bench.transcripts import recitations
+
+DEFAULT_SESSIONS = 8
+DEFAULT_RECITATIONS = 2
+DEFAULT_MAX_WORDS = 300
+
+
+class TestClientDriver:
+    """Drives the app in-process through Flask's test client"""
+
+    def __init__(self, flask_app):
+        self.client = flask_app.test_client()
+
+    def post(self, path, json_body=None, form=None):
+        response = self.client.post(path, json=json_body, data=form)
+        return response.status_code, len(response.data)
+
+
+class HttpDriver:
+    """Drives a running server over HTTP"""
+
+    def __init__(self, base_url):
+        import requests
+        self.base_url = base_url.rstrip('/')
+        self.http = requests.Session()
+
+    def post(self, path, json_body=None, form=None):
+        response = self.http.post(self.base_url + path, json=json_body, data=form, allow_redirects=False)
+        return response.status_code, len(response.content)
+
+
+class LoadRecorder:
+    """Thread-safe per-route latency samples"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = {}
+        self.failures = 0
+
+    def timed(self, driver, route, **kwargs):
+        start = time.perf_counter()
+        status, _ = driver.post(route, **kwargs)
+        elapsed = time.perf_counter() - start
+        with self.lock:
+            self.samples.setdefault(route, []).append(elapsed)
+            if status >= 400:
+                self.failures += 1
+
+
+def simulate_user(driver, recorder, recitation):
+    """One recitation, sent the way the browser sends it"""
+    recorder.timed(driver, '/start', form={'surah_number': str(recitation['surah'])})
+    recorder.timed(driver, '/start_realtime_session')
+    seq = 0
+    for segment, text in enumerate(recitation['chunks']):
+        words = text.split()
+        half = len(words) // 2
+        if half:
+            seq += 1
+            recorder.timed(driver, '/check_realtime', json_body={
+                'v': 2, 'schema': 1, 'seq': seq, 'segment': segment, 'final': False,
+                'offset': 0, 'text': ' '.join(words[:half])})
+        seq += 1
+        recorder.timed(driver, '/check_realtime', json_body={
+            'v': 2, 'schema': 1, 'seq': seq, 'segment': segment, 'final': True, 'offset': 0, 'text': text})
+    recorder.timed(driver, '/final_analysis', json_body={'transcript': recitation['transcript']})
+
+
+def run(sessions=DEFAULT_SESSIONS, recitations_per_session=DEFAULT_RECITATIONS,
+        max_words=DEFAULT_MAX_WORDS, url=None, seed=0):
+    # Transcripts come from the local corpus; a remote server should use the same dump
+    _, source = ensure_corpus()
+    from app import app, corpus
+    corpus.build_indexes()
+    if url:
+        make_driver = lambda: HttpDriver(url)
+    else:
+        make_driver = lambda: TestClientDriver(app)
+
+    workload = list(recitations(corpus.indexes, sessions * recitations_per_session, seed, max_words))
+    recorder = LoadRecorder()
+
+    def user(worker):
+        driver = make_driver()
+        for recitation in workload[worker::sessions]:
+            simulate_user(driver, recorder, recitation)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=sessions) as pool:
+        list(pool.map(user, range(sessions)))
+    elapsed = time.perf_counter() - start
+
+    total = sum(len(samples) for samples in recorder.samples.values())
+    return {
+        'corpus': source,
+        'sessions': sessions,
+        'recitations': len(workload),
+        'requests': total,
+        'failures': recorder.failures,
+        'elapsed_s': round(elapsed, 3),
+        'requests_per_s': round(total / elapsed, 1) if elapsed else 0.0,
+        'routes': {route: percentiles(samples) for route, samples in sorted(recorder.samples.items())},
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Concurrent load test of the recitation endpoints")
+    parser.add_argument('--sessions', type=int, default=DEFAULT_SESSIONS, help="concurrent users")
+    parser.add_argument('--recitations', type=int, default=DEFAULT_RECITATIONS, help="recitations per user")
+    parser.add_argument('--max-words', type=int, default=DEFAULT_MAX_WORDS, help="words recited per surah")
+    parser.add_argument('--url', help="base URL of a running server (default: in-process test client)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', action='store_true', help="print the raw results as JSON")
+    args = parser.parse_args(argv)
+
+    results = run(args.sessions, args.recitations, args.max_words, args.url, args.seed)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"📚 {results['corpus']}: {results['sessions']} users, {results['recitations']} recitations")
+    print(f"⚡ {results['requests']} requests in {results['elapsed_s']}s "
+          f"({results['requests_per_s']} req/s, {results['failures']} failures)")
+    print(f"{'route':<26}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for route, stats in results['routes'].items():
+        print(f"{route:<26}{stats['count']:>7}{stats['p50_ms']:>10}{stats['p95_ms']:>10}{stats['p99_ms']:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Micro-benchmarks for the normalizer, the word comparators and the aligners.
+
+    python -m bench.micro
+
+Every measurement runs on synthetic recitations of the loaded corpus (see
+bench.transcripts), so the numbers include realistic mistake rates. Whole
+surah comparisons are measured on a short, a medium and the longest surah
+to show how they grow with surah length.
+"""
+import random
+from difflib import SequenceMatcher
+
+from bench.common import best_of, ensure_corpus
+from bench.transcripts import recitation
+
+# Surah sizes (in words) for the length-scaling measurements
+SIZE_TARGETS = {'short': 100, 'medium': 1000, 'long': None}
+TRANSCRIPT_WORDS = 1000
+
+
+def pick_surahs(indexes):
+    """Surah index closest to each size target (None means the longest)"""
+    by_size = sorted(indexes.values(), key=lambda index: index.total_words)
+    picked = {}
+    for label, target in SIZE_TARGETS.items():
+        if target is None:
+            picked[label] = by_size[-1]
+        else:
+            picked[label] = min(by_size, key=lambda index: abs(index.total_words - target))
+    return picked
+
+
+def run(repeat=5, seed=0):
+    _, source = ensure_corpus()
+    import app
+    from analysis import chunked_compare, compare_word_lists
+    from similarity import batch_similarity, word_similarity
+
+    # Independent of WARMUP_SURAHS: every surah needs its index here
+    app.corpus.build_indexes()
+    qtc, indexes = app.qtc, app.corpus.indexes
+    rng = random.Random(seed)
+    surahs = pick_surahs(indexes)
+    results = {'corpus': source}
+
+    def timed(func):
+        return best_of(func, repeat, number=None)
+
+    # Normalizer
+    sample = recitation(surahs['long'], rng, max_words=TRANSCRIPT_WORDS)
+    transcript = sample['transcript']
+    results['normalize_text_ms'] = round(timed(lambda: qtc.normalize_arabic_text(transcript)) * 1e3, 3)
+    qtc.normalize_words(transcript)
+    results['normalize_words_cached_ms'] = round(timed(lambda: qtc.normalize_words(transcript)) * 1e3, 3)
+
+    # Comparators, on the spoken words paired with the reference
+    spoken_words = qtc.normalize_words(transcript)
+    reference = surahs['long'].words[:len(spoken_words)]
+    pairs = list(zip(spoken_words, reference))
+    results['word_similarity_us'] = round(
+        timed(lambda: [word_similarity(a, b) for a, b in pairs]) / len(pairs) * 1e6, 3)
+    results['difflib_ratio_us'] = round(
+        timed(lambda: [SequenceMatcher(None, a, b).ratio() for a, b in pairs]) / len(pairs) * 1e6, 3)
+    window = list(reference[:80])
+    probes = spoken_words[:50]
+    results['batch_similarity_us'] = round(
+        timed(lambda: [batch_similarity(word, window) for word in probes])
+        / (len(probes) * len(window)) * 1e6, 3)
+
+    # Streaming aligner, fed one recognizer chunk at a time
+    chunks = sample['chunks']
+    word_count = sum(len(qtc.normalize_words(text)) for text in chunks)
+
+    def stream():
+        aligner = qtc.create_aligner(surahs['long'])
+        for text in chunks:
+            aligner.feed(qtc.normalize_words(text))
+
+    results['aligner_feed_us_per_word'] = round(timed(stream) / word_count * 1e6, 2)
+
+    # Whole-surah comparison as the surah grows
+    for label, index in surahs.items():
+        spoken = qtc.normalize_words(recitation(index, rng)['transcript'])
+        results[f'{label}_surah_words'] = index.total_words
+        results[f'{label}_global_compare_ms'] = round(
+            timed(lambda: compare_word_lists(spoken, index.words)) * 1e3, 3)
+        results[f'{label}_chunked_compare_ms'] = round(
+            timed(lambda: chunked_compare(spoken, index, parallel=False)) * 1e3, 3)
+
+    return results
+
+
+def main():
+    results = run()
+    width = max(len(name) for name in results)
+    for name, value in results.items():
+        print(f"{name:<{width}}  {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Normalizer throughput on the full Quran text.
+
+    python -m bench.normalizer
+
+Compares the original step-by-step normalize_arabic_text pipeline with the
+compiled ArabicNormalizer, checks that both produce identical output and
+reports throughput in MB/s of UTF-8 input.
+"""
+import re
+import unicodedata
+
+from arabic_normalizer import ArabicNormalizer
+from bench.common import best_of, load_corpus_text
+
+
+def legacy_normalize(text, normalizations):
+    """The pre-compiled pipeline, kept here as the reference implementation"""
+    if not text:
+        return ""
+    text = unicodedata.normalize('NFKD', text)
+    no_diacritics = ''.join(char for char in text if not unicodedata.combining(char))
+    normalized_text = ''.join(normalizations.get(char, char) for char in no_diacritics)
+    normalized_text = normalized_text.replace("ـ", "")
+    normalized_text = re.sub(r'\(\s*\d+\s*\)', '', normalized_text)
+    normalized_text = re.sub(r'\d+', '', normalized_text)
+    normalized_text = ' '.join(normalized_text.split())
+    return unicodedata.normalize('NFKC', normalized_text.strip())
+
+
+def run(repeat=5):
+    from app import QuranTextChecker
+
+    normalizations = QuranTextChecker().arabic_normalizations
+    normalizer = ArabicNormalizer(normalizations)
+    text, source = load_corpus_text()
+    size_mb = len(text.encode('utf-8')) / 1e6
+    tokens = text.split()
+
+    expected = legacy_normalize(text, normalizations)
+    if normalizer.normalize(text) != expected:
+        raise AssertionError("compiled normalizer output differs from the legacy pipeline")
+    expected_words = [w for t in tokens for w in legacy_normalize(t, normalizations).split()]
+    if normalizer.normalize_words(text) != expected_words:
+        raise AssertionError("cached word normalizer output differs from the legacy pipeline")
+
+    legacy = best_of(lambda: legacy_normalize(text, normalizations), repeat)
+    compiled = best_of(lambda: normalizer.normalize(text), repeat)
+    normalizer.normalize_words(text)  # warm the token cache
+    cached = best_of(lambda: normalizer.normalize_words(text), repeat)
+
+    results = {
+        'corpus': source,
+        'input_mb': round(size_mb, 3),
+        'legacy_mb_s': round(size_mb / legacy, 2),
+        'compiled_mb_s': round(size_mb / compiled, 2),
+        'cached_words_mb_s': round(size_mb / cached, 2),
+        'speedup': round(legacy / compiled, 1),
+    }
+    return results
+
+
+def main():
+    results = run()
+    print(f"📚 Corpus: {results['corpus']} ({results['input_mb']} MB UTF-8)")
+    print(f"🐢 Legacy pipeline:        {results['legacy_mb_s']:>8} MB/s")
+    print(f"🚀 Compiled translate:     {results['compiled_mb_s']:>8} MB/s ({results['speedup']}x)")
+    print(f"🧠 Cached word normalizer: {results['cached_words_mb_s']:>8} MB/s")
+
+
+if __name__ == "__main__":
+    main()
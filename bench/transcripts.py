@@ -0,0 +1,79 @@
+"""
+Synthetic recitation transcripts.
+
+A transcript is a surah's original-script words with recitation mistakes
+injected at fixed rates: substituted words (one letter changed, or another
+word of the surah), skipped words and extra words. The injected counts are
+returned with the transcript so benchmarks can check the checker still
+finds roughly that many errors.
+"""
+import random
+
+ARABIC_LETTERS = 'ابتثجحخدذرزسشصضطظعغفقكلمنهوي'
+
+DEFAULT_SUBSTITUTION_RATE = 0.05
+DEFAULT_SKIP_RATE = 0.03
+DEFAULT_EXTRA_RATE = 0.03
+
+
+def misread(word, rng):
+    """Change one letter of a word, the way a mistaken recitation is transcribed"""
+    letters = [i for i, char in enumerate(word) if char in ARABIC_LETTERS]
+    if not letters:
+        return word + rng.choice(ARABIC_LETTERS)
+    i = rng.choice(letters)
+    replacement = rng.choice(ARABIC_LETTERS.replace(word[i], ''))
+    return word[:i] + replacement + word[i + 1:]
+
+
+def synthesize(words, rng, substitution_rate=DEFAULT_SUBSTITUTION_RATE,
+               skip_rate=DEFAULT_SKIP_RATE, extra_rate=DEFAULT_EXTRA_RATE):
+    """Return (spoken_words, injected) for a list of original words"""
+    spoken = []
+    injected = {'substitutions': 0, 'skips': 0, 'extras': 0}
+    for word in words:
+        roll = rng.random()
+        if roll < skip_rate:
+            injected['skips'] += 1
+            continue
+        if roll < skip_rate + substitution_rate:
+            injected['substitutions'] += 1
+            spoken.append(misread(word, rng) if rng.random() < 0.5 else rng.choice(words))
+        else:
+            spoken.append(word)
+        if rng.random() < extra_rate:
+            injected['extras'] += 1
+            spoken.append(rng.choice(words))
+    return spoken, injected
+
+
+def chunk(words, rng, min_size=2, max_size=6):
+    """Split spoken words into the short final results a speech recognizer emits"""
+    chunks = []
+    i = 0
+    while i < len(words):
+        size = rng.randint(min_size, max_size)
+        chunks.append(' '.join(words[i:i + size]))
+        i += size
+    return chunks
+
+
+def recitation(surah_index, rng, max_words=None, **rates):
+    """One synthetic recitation of a surah from its first word"""
+    words = list(surah_index.original_words[:max_words] if max_words else surah_index.original_words)
+    spoken, injected = synthesize(words, rng, **rates)
+    return {
+        'surah': surah_index.number,
+        'reference_words': len(words),
+        'transcript': ' '.join(spoken),
+        'chunks': chunk(spoken, rng),
+        'injected': injected,
+    }
+
+
+def recitations(indexes, count, seed=0, max_words=None, **rates):
+    """Deterministic stream of synthetic recitations over random surahs"""
+    rng = random.Random(seed)
+    numbers = sorted(indexes)
+    for _ in range(count):
+        yield recitation(indexes[rng.choice(numbers)], rng, max_words, **rates)
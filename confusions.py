@@ -0,0 +1,401 @@
+"""
+Precomputed index of commonly confused words.
+
+Every normalized word of the corpus is mapped to its near neighbours in the
+corpus vocabulary: the words within edit distance 1 (short words) or 2,
+found with a SymSpell-style deletion index rather than comparing every pair.
+Each neighbour carries the kind of confusion that separates the two words,
+its similarity score and whether that score counts as the same word:
+
+    hamza             ء dropped, added or written on another seat (سماء / سما)
+    ta_marbuta        final ة read or written as ت (رحمه / رحمت)
+    alif_maqsura      final ى written as ا (موسي / موسا)
+    long_vowel        a madd letter (ا و ي) dropped or added
+    definite_article  ال dropped or added
+    conjunction       prefixed و / ف dropped or added
+    similar_letter    a letter swapped for a similar-sounding one (س/ص, ت/ط, د/ض, ...)
+    letter_order      two neighbouring letters swapped
+    missing_letter / extra_letter / substitution   any other single edit
+    multiple          several edits of different kinds
+
+Normalization already unifies hamza seats on alif, ة/ه and ى/ي, so these
+are the spellings that still differ after it. The label only says what
+kind of error a mismatch is (and which suggestion the report gives for
+it); whether two words are similar is decided by their score against the
+usual threshold, whatever the label.
+
+The index is built once per corpus into sections of the warm-up artifact
+(see warmup.py) and memory-mapped by every worker:
+
+    confusion.words.blob / .offsets   the vocabulary, sorted
+    confusion.offsets     V + 1 offsets into the entry arrays, one per word
+    confusion.neighbours  uint32 vocabulary id of each neighbour, sorted per word
+    confusion.labels      uint8 position of its label in LABELS
+    confusion.distances   uint8 edit distance
+    confusion.scores      uint16 similarity score, in 1/10000
+
+Looking up a (spoken, expected) pair of corpus words is two dict reads and a
+scan of the expected word's few neighbours. compare_words() and classify()
+give the same answers without an index, pairwise, so the index only changes
+how fast they are.
+"""
+import json
+from array import array
+from functools import lru_cache
+
+from corpus_image import StringTable
+
+import similarity as fast_similarity
+
+MAX_DISTANCE = 2
+# Shorter words only get distance-1 neighbours: two edits to a 3-letter word leave nothing of it
+MIN_LENGTH_FOR_TWO_EDITS = 5
+
+HAMZA = 'ء'
+HAMZA_SEATS = frozenset('اويء')
+LONG_VOWELS = frozenset('اوي')
+CONJUNCTIONS = frozenset('وف')
+DEFINITE_ARTICLE = 'ال'
+SIMILAR_LETTERS = frozenset(frozenset(pair) for pair in (
+    'سص', 'تط', 'دض', 'ذظ', 'ذز', 'زظ', 'ذد', 'ثس', 'كق', 'هح', 'حخ', 'عا', 'عء', 'غخ', 'ضظ',
+))
+
+# Stored by position in the index; only append to this list
+LABELS = ('hamza', 'ta_marbuta', 'alif_maqsura', 'long_vowel', 'definite_article', 'conjunction',
+          'similar_letter', 'letter_order', 'missing_letter', 'extra_letter', 'substitution', 'multiple')
+LABEL_IDS = {label: i for i, label in enumerate(LABELS)}
+INDEX_FORMAT = 1
+SCORE_SCALE = 10000
+
+
+class Confusion:
+    """How a spoken word differs from an expected one"""
+
+    __slots__ = ('label', 'distance', 'score', 'similar')
+
+    def __init__(self, label, distance, score, similar):
+        self.label = label
+        self.distance = distance
+        self.score = score
+        self.similar = similar
+
+    def __repr__(self):
+        return f"Confusion({self.label!r}, distance={self.distance}, score={self.score:.2f})"
+
+
+def max_distance(word):
+    return MAX_DISTANCE if len(word) >= MIN_LENGTH_FOR_TWO_EDITS else 1
+
+
+def deletes(word, distance):
+    """Every string obtained by deleting up to `distance` characters of word"""
+    found = {word}
+    frontier = {word}
+    for _ in range(distance):
+        frontier = {variant[:i] + variant[i + 1:] for variant in frontier for i in range(len(variant))}
+        found |= frontier
+    return found
+
+
+def edit_operations(spoken, expected):
+    """
+    Optimal string alignment edits turning expected into spoken.
+
+    Returns [(op, expected_char, spoken_char, position in expected)] with op
+    one of 'sub', 'del' (a letter of expected missing), 'ins' (an extra
+    letter) and 'swap'. The common prefix and suffix are stripped first, so
+    the table only covers the part that differs.
+    """
+    prefix = 0
+    limit = min(len(spoken), len(expected))
+    while prefix < limit and spoken[prefix] == expected[prefix]:
+        prefix += 1
+    suffix = 0
+    while suffix < limit - prefix and spoken[-1 - suffix] == expected[-1 - suffix]:
+        suffix += 1
+    spoken = spoken[prefix:len(spoken) - suffix]
+    expected = expected[prefix:len(expected) - suffix]
+
+    # Most neighbours differ by one letter; no table needed for those
+    if len(spoken) <= 1 and len(expected) <= 1:
+        if spoken and expected:
+            return [('sub', expected, spoken, prefix)]
+        if expected:
+            return [('del', expected, '', prefix)]
+        return [('ins', '', spoken, prefix)] if spoken else []
+    if len(spoken) == len(expected) == 2 and spoken == expected[::-1]:
+        return [('swap', expected, spoken, prefix)]
+
+    rows, cols = len(expected) + 1, len(spoken) + 1
+    cost = [[0] * cols for _ in range(rows)]
+    for i in range(rows):
+        cost[i][0] = i
+    for j in range(cols):
+        cost[0][j] = j
+    for i in range(1, rows):
+        for j in range(1, cols):
+            best = min(cost[i - 1][j] + 1, cost[i][j - 1] + 1,
+                       cost[i - 1][j - 1] + (expected[i - 1] != spoken[j - 1]))
+            if (i > 1 and j > 1 and expected[i - 1] == spoken[j - 2]
+                    and expected[i - 2] == spoken[j - 1]):
+                best = min(best, cost[i - 2][j - 2] + 1)
+            cost[i][j] = best
+
+    operations = []
+    i, j = rows - 1, cols - 1
+    while i > 0 or j > 0:
+        if i > 0 and j > 0 and expected[i - 1] == spoken[j - 1] and cost[i][j] == cost[i - 1][j - 1]:
+            i, j = i - 1, j - 1
+        elif i > 0 and j > 0 and cost[i][j] == cost[i - 1][j - 1] + 1:
+            operations.append(('sub', expected[i - 1], spoken[j - 1], prefix + i - 1))
+            i, j = i - 1, j - 1
+        elif (i > 1 and j > 1 and expected[i - 1] == spoken[j - 2] and expected[i - 2] == spoken[j - 1]
+              and cost[i][j] == cost[i - 2][j - 2] + 1):
+            operations.append(('swap', expected[i - 2:i], spoken[j - 2:j], prefix + i - 2))
+            i, j = i - 2, j - 2
+        elif i > 0 and cost[i][j] == cost[i - 1][j] + 1:
+            operations.append(('del', expected[i - 1], '', prefix + i - 1))
+            i -= 1
+        else:
+            operations.append(('ins', '', spoken[j - 1], prefix + i))
+            j -= 1
+    operations.reverse()
+    return operations
+
+
+def _operation_label(operation, expected):
+    op, expected_char, spoken_char, position = operation
+    final = position == len(expected) - 1
+    if op == 'swap':
+        return 'letter_order'
+    if op == 'sub':
+        pair = {expected_char, spoken_char}
+        if final and pair == {'ه', 'ت'}:
+            return 'ta_marbuta'
+        if final and pair == {'ي', 'ا'}:
+            return 'alif_maqsura'
+        if HAMZA in pair and pair <= HAMZA_SEATS:
+            return 'hamza'
+        if frozenset(pair) in SIMILAR_LETTERS:
+            return 'similar_letter'
+        return 'substitution'
+    letter = expected_char or spoken_char
+    if letter == HAMZA:
+        return 'hamza'
+    if letter in LONG_VOWELS and position > 0:
+        return 'long_vowel'
+    return 'missing_letter' if op == 'del' else 'extra_letter'
+
+
+@lru_cache(maxsize=65536)
+def confusion_label(spoken, expected):
+    """Kind of confusion between two different normalized words"""
+    for short, long in ((spoken, expected), (expected, spoken)):
+        if long == DEFINITE_ARTICLE + short or (long[:1] in CONJUNCTIONS and long[1:] == DEFINITE_ARTICLE + short):
+            return 'definite_article'
+        if len(short) > 1 and long[:1] in CONJUNCTIONS and long[1:] == short:
+            return 'conjunction'
+    labels = {_operation_label(operation, expected) for operation in edit_operations(spoken, expected)}
+    if len(labels) == 1:
+        return labels.pop()
+    return 'multiple' if labels else None
+
+
+def make_confusion(spoken, expected, distance, cutoff=fast_similarity.SIMILARITY_THRESHOLD):
+    label = confusion_label(spoken, expected)
+    score = fast_similarity.ratio(spoken, expected)
+    return Confusion(label, distance, score, score >= cutoff)
+
+
+def confusion_between(spoken, expected, cutoff=fast_similarity.SIMILARITY_THRESHOLD):
+    """Confusion for two different words, or None when they are too far apart to be neighbours"""
+    limit = min(max_distance(spoken), max_distance(expected))
+    if abs(len(spoken) - len(expected)) > limit:
+        return None
+    distance = fast_similarity.levenshtein(spoken, expected)
+    if distance > limit:
+        return None
+    return make_confusion(spoken, expected, distance, cutoff)
+
+
+def neighbour_pairs(vocabulary):
+    """(first id, second id, distance) for every pair of neighbours in a sorted vocabulary"""
+    # SymSpell: words within distance d share a variant with up to d deletions on each side
+    buckets = {}
+    variants = []
+    for word_id, word in enumerate(vocabulary):
+        word_variants = deletes(word, max_distance(word))
+        variants.append(word_variants)
+        for variant in word_variants:
+            buckets.setdefault(variant, []).append(word_id)
+
+    for first, word in enumerate(vocabulary):
+        # Query one word at a time so the candidate set stays small
+        candidates = set()
+        for variant in variants[first]:
+            candidates.update(buckets[variant])
+        for second in candidates:
+            if second <= first:
+                continue
+            other = vocabulary[second]
+            limit = min(max_distance(word), max_distance(other))
+            if abs(len(word) - len(other)) > limit:
+                continue
+            distance = fast_similarity.levenshtein(word, other)
+            if distance <= limit:
+                yield first, second, distance
+
+
+def build_sections(words):
+    """Artifact sections of the confusion index of a word collection"""
+    vocabulary = sorted(set(words))
+    entries = [[] for _ in vocabulary]
+    for first, second, distance in neighbour_pairs(vocabulary):
+        a, b = vocabulary[first], vocabulary[second]
+        score = fast_similarity.ratio(a, b)
+        # Labels depend on direction (which word was expected), so store both
+        entries[second].append((first, LABEL_IDS[confusion_label(a, b)], distance, score))
+        entries[first].append((second, LABEL_IDS[confusion_label(b, a)], distance, score))
+
+    words_blob = bytearray()
+    word_offsets = array('I', [0])
+    offsets = array('I', [0])
+    neighbours = array('I')
+    labels = array('B')
+    distances = array('B')
+    scores = array('H')
+    for word, word_entries in zip(vocabulary, entries):
+        words_blob += word.encode('utf-8')
+        word_offsets.append(len(words_blob))
+        for neighbour, label, distance, score in sorted(word_entries):
+            neighbours.append(neighbour)
+            labels.append(label)
+            distances.append(distance)
+            scores.append(round(score * SCORE_SCALE))
+        offsets.append(len(neighbours))
+
+    return {
+        'confusion.meta': json.dumps({'format': INDEX_FORMAT, 'labels': LABELS}).encode('utf-8'),
+        'confusion.words.blob': bytes(words_blob),
+        'confusion.words.offsets': word_offsets.tobytes(),
+        'confusion.offsets': offsets.tobytes(),
+        'confusion.neighbours': neighbours.tobytes(),
+        'confusion.labels': labels.tobytes(),
+        'confusion.distances': distances.tobytes(),
+        'confusion.scores': scores.tobytes(),
+    }
+
+
+SECTION_NAMES = tuple(build_sections([]))
+
+
+class ConfusionIndex:
+    """Near neighbours of every corpus word, labelled with the kind of confusion"""
+
+    def __init__(self, sections, cutoff=fast_similarity.SIMILARITY_THRESHOLD):
+        meta = json.loads(bytes(sections['confusion.meta']))
+        if meta.get('format') != INDEX_FORMAT or tuple(meta.get('labels', ())) != LABELS:
+            raise ValueError(f"Unsupported confusion index format {meta.get('format')}")
+        self.cutoff = cutoff
+        words = StringTable(memoryview(sections['confusion.words.blob']),
+                            memoryview(sections['confusion.words.offsets']).cast('I'))
+        # The only per-process copy: word -> vocabulary id
+        self.ids = {word: i for i, word in enumerate(words)}
+        self.words = words
+        self.offsets = memoryview(sections['confusion.offsets']).cast('I')
+        self.neighbours = memoryview(sections['confusion.neighbours']).cast('I')
+        self.labels = memoryview(sections['confusion.labels']).cast('B')
+        self.distances = memoryview(sections['confusion.distances']).cast('B')
+        self.scores = memoryview(sections['confusion.scores']).cast('H')
+
+    @classmethod
+    def build(cls, words, cutoff=fast_similarity.SIMILARITY_THRESHOLD):
+        """In-memory index, for corpora without an artifact"""
+        return cls(build_sections(words), cutoff)
+
+    @classmethod
+    def from_artifact(cls, artifact, cutoff=fast_similarity.SIMILARITY_THRESHOLD):
+        return cls({name: artifact.section(name) for name in SECTION_NAMES}, cutoff)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, word):
+        return word in self.ids
+
+    @property
+    def nbytes(self):
+        return sum(view.nbytes for view in (self.offsets, self.neighbours, self.labels, self.distances, self.scores))
+
+    def _confusion(self, k):
+        label = LABELS[self.labels[k]]
+        score = self.scores[k] / SCORE_SCALE
+        return Confusion(label, self.distances[k], score, score >= self.cutoff)
+
+    def lookup(self, spoken, expected):
+        """The Confusion for a pair of corpus neighbours, or None"""
+        expected_id = self.ids.get(expected)
+        if expected_id is None:
+            return None
+        spoken_id = self.ids.get(spoken)
+        if spoken_id is None:
+            return None
+        neighbours = self.neighbours
+        for k in range(self.offsets[expected_id], self.offsets[expected_id + 1]):
+            if neighbours[k] == spoken_id:
+                return self._confusion(k)
+        return None
+
+    def confusions_of(self, expected):
+        """Corpus words commonly confused with expected: {word: Confusion}"""
+        expected_id = self.ids.get(expected)
+        if expected_id is None:
+            return {}
+        return {self.words[self.neighbours[k]]: self._confusion(k)
+                for k in range(self.offsets[expected_id], self.offsets[expected_id + 1])}
+
+    def knows(self, spoken, expected):
+        """Whether both words are in the vocabulary, so a missing entry means they are not neighbours"""
+        return spoken in self.ids and expected in self.ids
+
+
+# Index used by compare_words() and classify(); set once the corpus is warmed up.
+# Worker processes forked after that inherit it.
+_index = None
+
+
+def set_index(index):
+    global _index
+    _index = index
+
+
+def get_index():
+    return _index
+
+
+def compare_words(spoken, expected, cutoff=fast_similarity.SIMILARITY_THRESHOLD):
+    """
+    Return (is_similar, score) for two normalized words.
+
+    The same answer as similarity.word_similarity; for corpus neighbours
+    the score comes precomputed from the index.
+    """
+    if spoken == expected:
+        return True, 1.0
+    index = _index
+    if index is not None and cutoff == index.cutoff:
+        confusion = index.lookup(spoken, expected)
+        if confusion is not None:
+            return confusion.similar, confusion.score
+    return fast_similarity.word_similarity(spoken, expected, cutoff)
+
+
+def classify(spoken, expected):
+    """Label of a mismatched pair of normalized words, or None if they match or one is empty"""
+    if spoken == expected or not spoken or not expected:
+        return None
+    if _index is not None:
+        confusion = _index.lookup(spoken, expected)
+        if confusion is not None:
+            return confusion.label
+    return confusion_label(spoken, expected)
@@ -0,0 +1,247 @@
+"""
+Compact read-only corpus image shared by worker processes.
+
+The whole local corpus and its normalized word index are packed into
+sections of a warm-up artifact (see warmup.py) and memory-mapped by every
+worker, so the text lives once in the page cache instead of once per
+process as Python strings, lists and dicts.
+
+Sections (all integers are native uint32/uint16 arrays unless noted):
+
+    meta            JSON: format version and the surah list (metadata only)
+    norm.blob       normalized words, each followed by a space
+    norm.offsets    W + 1 byte offsets into norm.blob, one per word
+    norm.ids        int32 vocabulary id of every word (see vocabulary.py)
+    orig.blob       original-script token of every word, each followed by a space
+    orig.offsets    W + 1 byte offsets into orig.blob
+    word.ayahs      uint16 ayah number (numberInSurah) of every word
+    surah.words     S + 1 global word offsets, one per surah
+    ayah.offsets    per surah, its ayah_offsets (relative to the surah), concatenated
+    surah.ayah_offsets  S + 1 positions into ayah.offsets
+    ayah.text.blob / ayah.text.offsets   text of every ayah
+    ayah.meta       (number, juz, page) per ayah, 0 for unknown
+    surah.ayahs     S + 1 global ayah offsets, one per surah
+    full.blob / full.offsets   the recite page text of every surah
+
+Lookups return memoryview slices of the mapping; words are only decoded to
+str when read, and a run of words is decoded with a single call.
+"""
+import json
+from array import array
+
+from surah_index import SurahIndex, WordIndexMixin
+
+IMAGE_FORMAT = 1
+
+WORD_SEPARATOR = b' '
+
+# Fixed-width integers keep the layout identical across builds
+assert array('I').itemsize == 4 and array('H').itemsize == 2
+
+
+class StringTable:
+    """Sequence of str backed by a UTF-8 blob and an offset array"""
+
+    __slots__ = ('blob', 'offsets', 'start', 'stop', 'separator')
+
+    def __init__(self, blob, offsets, start=0, stop=None, separator=0):
+        self.blob = blob
+        self.offsets = offsets
+        self.start = start
+        self.stop = len(offsets) - 1 if stop is None else stop
+        self.separator = separator  # bytes after each entry (1 for word tables)
+
+    def __len__(self):
+        return self.stop - self.start
+
+    def _decode(self, i):
+        offsets = self.offsets
+        return str(self.blob[offsets[i]:offsets[i + 1] - self.separator], 'utf-8')
+
+    def raw(self, start, stop):
+        """Zero-copy bytes of entries [start, stop), separators included"""
+        start, stop, _ = slice(start, stop).indices(len(self))
+        offsets = self.offsets
+        return self.blob[offsets[self.start + start]:offsets[self.start + max(start, stop)]]
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(len(self))
+            if step == 1 and self.separator:
+                # A run of words is one contiguous span: decode once, split on the separator
+                if stop <= start:
+                    return []
+                return str(self.raw(start, stop)[:-1], 'utf-8').split(' ')
+            return [self._decode(self.start + i) for i in range(start, stop, step)]
+        if key < 0:
+            key += len(self)
+        if not 0 <= key < len(self):
+            raise IndexError('string table index out of range')
+        return self._decode(self.start + key)
+
+    def __iter__(self):
+        for i in range(self.start, self.stop):
+            yield self._decode(i)
+
+    def __bool__(self):
+        return self.stop > self.start
+
+
+class MappedSurahIndex(WordIndexMixin):
+    """SurahIndex over a mapped corpus image; see surah_index.SurahIndex for the interface"""
+
+    __slots__ = ('number', 'words', 'original_words', 'word_ayahs', 'ayah_offsets',
+                 'total_words', 'ids', '_image', '_position')
+
+    def __init__(self, image, position):
+        view = image.view
+        first, last = image.surah_words[position], image.surah_words[position + 1]
+        ayah_first, ayah_last = image.surah_ayah_offsets[position], image.surah_ayah_offsets[position + 1]
+        self._image = image
+        self._position = position
+        self.number = image.surah_list[position]['number']
+        self.words = StringTable(view['norm.blob'], image.norm_offsets, first, last, separator=1)
+        self.original_words = StringTable(view['orig.blob'], image.orig_offsets, first, last, separator=1)
+        self.word_ayahs = image.word_ayahs[first:last]
+        self.ids = image.norm_ids[first:last]
+        self.ayah_offsets = image.ayah_offsets[ayah_first:ayah_last]
+        self.total_words = last - first
+
+    @property
+    def normalized_text(self):
+        if not self.words:
+            return ''
+        return str(self.words.raw(0, self.total_words)[:-1], 'utf-8')
+
+    @property
+    def full_text(self):
+        return self._image.full_texts[self._position]
+
+
+class CorpusImage:
+    """Read-side view of the corpus sections of a mapped artifact"""
+
+    def __init__(self, artifact):
+        self.artifact = artifact
+        names = ('norm.blob', 'norm.offsets', 'norm.ids', 'orig.blob', 'orig.offsets', 'word.ayahs', 'surah.words',
+                 'ayah.offsets', 'surah.ayah_offsets', 'ayah.text.blob', 'ayah.text.offsets', 'ayah.meta',
+                 'surah.ayahs', 'full.blob', 'full.offsets')
+        self.view = {name: artifact.section(name) for name in names}
+        meta = json.loads(bytes(artifact.section('meta')))
+        if meta.get('format') != IMAGE_FORMAT:
+            raise ValueError(f"Unsupported corpus image format {meta.get('format')}")
+        self.surah_list = meta['surahs']
+        self.positions = {surah['number']: i for i, surah in enumerate(self.surah_list)}
+
+        view = self.view
+        self.norm_offsets = view['norm.offsets'].cast('I')
+        self.norm_ids = view['norm.ids'].cast('i')
+        self.orig_offsets = view['orig.offsets'].cast('I')
+        self.word_ayahs = view['word.ayahs'].cast('H')
+        self.surah_words = view['surah.words'].cast('I')
+        self.ayah_offsets = view['ayah.offsets'].cast('I')
+        self.surah_ayah_offsets = view['surah.ayah_offsets'].cast('I')
+        self.ayah_meta = view['ayah.meta'].cast('I')
+        self.surah_ayahs = view['surah.ayahs'].cast('I')
+        self.ayah_texts = StringTable(view['ayah.text.blob'], view['ayah.text.offsets'].cast('I'))
+        self.full_texts = StringTable(view['full.blob'], view['full.offsets'].cast('I'))
+        self._indexes = {}
+
+    @property
+    def nbytes(self):
+        return sum(section.nbytes for section in self.view.values())
+
+    def __contains__(self, surah_number):
+        return surah_number in self.positions
+
+    def get_index(self, surah_number):
+        index = self._indexes.get(surah_number)
+        if index is None:
+            position = self.positions.get(surah_number)
+            if position is None:
+                return None
+            # Small wrapper object; the data stays in the mapping
+            index = self._indexes[surah_number] = MappedSurahIndex(self, position)
+        return index
+
+    def get_surah(self, surah_number):
+        """API-shaped surah dict, decoded from the image for this call"""
+        position = self.positions.get(surah_number)
+        if position is None:
+            return None
+        ayahs = []
+        meta = self.ayah_meta
+        for i in range(self.surah_ayahs[position], self.surah_ayahs[position + 1]):
+            number, juz, page = meta[3 * i], meta[3 * i + 1], meta[3 * i + 2]
+            ayahs.append({
+                'number': number,
+                'text': self.ayah_texts[i],
+                'numberInSurah': i - self.surah_ayahs[position] + 1,
+                'juz': juz or None,
+                'page': page or None,
+            })
+        return dict(self.surah_list[position], ayahs=ayahs)
+
+
+class _TableBuilder:
+    def __init__(self, separator=b''):
+        self.blob = bytearray()
+        self.offsets = array('I', [0])
+        self.separator = separator
+
+    def add(self, text):
+        self.blob += text.encode('utf-8') + self.separator
+        self.offsets.append(len(self.blob))
+
+
+def build_sections(surah_list, surahs, normalize, surah_fields):
+    """Pack API-shaped surahs (ordered like surah_list) into artifact sections"""
+    norm = _TableBuilder(WORD_SEPARATOR)
+    orig = _TableBuilder(WORD_SEPARATOR)
+    ayah_texts = _TableBuilder()
+    full_texts = _TableBuilder()
+    word_ayahs = array('H')
+    surah_words = array('I', [0])
+    ayah_offsets = array('I')
+    surah_ayah_offsets = array('I', [0])
+    ayah_meta = array('I')
+    surah_ayahs = array('I', [0])
+    listed = []
+
+    for entry in surah_list:
+        surah = surahs.get(entry['number'])
+        if surah is None:
+            continue
+        listed.append({field: entry.get(field) for field in surah_fields})
+        index = SurahIndex.build(surah, normalize)
+        for word, original, ayah in zip(index.words, index.original_words, index.word_ayahs):
+            norm.add(word)
+            orig.add(original)
+            word_ayahs.append(ayah)
+        surah_words.append(len(norm.offsets) - 1)
+        ayah_offsets.extend(index.ayah_offsets)
+        surah_ayah_offsets.append(len(ayah_offsets))
+        for ayah in surah.get('ayahs', []):
+            ayah_texts.add(ayah['text'])
+            ayah_meta.extend((ayah.get('number') or 0, ayah.get('juz') or 0, ayah.get('page') or 0))
+        surah_ayahs.append(len(ayah_texts.offsets) - 1)
+        full_texts.add(index.full_text)
+
+    meta = json.dumps({'format': IMAGE_FORMAT, 'surahs': listed}, ensure_ascii=False).encode('utf-8')
+    return {
+        'meta': meta,
+        'norm.blob': bytes(norm.blob),
+        'norm.offsets': norm.offsets.tobytes(),
+        'orig.blob': bytes(orig.blob),
+        'orig.offsets': orig.offsets.tobytes(),
+        'word.ayahs': word_ayahs.tobytes(),
+        'surah.words': surah_words.tobytes(),
+        'ayah.offsets': ayah_offsets.tobytes(),
+        'surah.ayah_offsets': surah_ayah_offsets.tobytes(),
+        'ayah.text.blob': bytes(ayah_texts.blob),
+        'ayah.text.offsets': ayah_texts.offsets.tobytes(),
+        'ayah.meta': ayah_meta.tobytes(),
+        'surah.ayahs': surah_ayahs.tobytes(),
+        'full.blob': bytes(full_texts.blob),
+        'full.offsets': full_texts.offsets.tobytes(),
+    }
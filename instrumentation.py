@@ -0,0 +1,331 @@
+"""
+Request and hot-path instrumentation, exposed in Prometheus text format.
+
+A small in-process registry (no client library needed) keeps:
+
+- lefqih_stage_seconds{stage}: time spent in the normalize, compare, align
+  and corpus stages, recorded with `stage(name)` as a context manager or
+  decorator
+- lefqih_request_seconds{route, method, status}: latency per Flask route
+- lefqih_request_bytes / lefqih_response_bytes{route}: body sizes
+- callback gauges and counters (session store size, cache hits) read at
+  scrape time
+
+init_app() wires the request hooks and the /metrics route into a Flask app.
+With PROFILING enabled, a request carrying an "X-Profile: cprofile" (or
+"pyinstrument", when installed) header is profiled and the result written
+to PROFILE_DIR; the file name comes back in the X-Profile-File header.
+
+Metrics are per process: with several workers, scrape each of them.
+"""
+import cProfile
+import contextvars
+import os
+import threading
+import time
+from contextlib import ContextDecorator
+from datetime import datetime
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+PROFILE_HEADER = 'X-Profile'
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (64, 256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+# Stage durations of the request being handled, for debug output
+_request_timings = contextvars.ContextVar('request_timings', default=None)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """Cumulative-bucket histogram with a fixed label set"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def samples(self):
+        with self._lock:
+            series = {key: list(values) for key, values in self._series.items()}
+        for key, values in sorted(series.items()):
+            labels = list(zip(self.labelnames, key))
+            for bound, count in zip(self.buckets, values):
+                yield f'{self.name}_bucket', labels + [('le', _format_value(float(bound)))], count
+            yield f'{self.name}_bucket', labels + [('le', '+Inf')], values[-1]
+            yield f'{self.name}_sum', labels, values[-2]
+            yield f'{self.name}_count', labels, values[-1]
+
+
+class Counter:
+    """Monotonic counter with a fixed label set"""
+
+    kind = 'counter'
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            yield self.name, list(zip(self.labelnames, key)), value
+
+
+class CallbackMetric:
+    """
+    Gauge or counter whose value is read from a callback at scrape time.
+
+    The callback returns a number, or a list of ({label: value}, number).
+    """
+
+    def __init__(self, name, help_text, callback, kind='gauge'):
+        self.name = name
+        self.help = help_text
+        self.callback = callback
+        self.kind = kind
+
+    def samples(self):
+        try:
+            value = self.callback()
+        except Exception as e:
+            print(f"Metric callback {self.name} failed: {e}")
+            return
+        if isinstance(value, list):
+            for labels, number in value:
+                yield self.name, sorted(labels.items()), number
+        else:
+            yield self.name, [], value
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            # Re-registering a name (e.g. a second app instance) replaces the old metric
+            self._metrics[metric.name] = metric
+        return metric
+
+    def render(self):
+        """Prometheus text exposition of every registered metric"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for name, labels, value in metric.samples():
+                lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+STAGE_SECONDS = registry.register(Histogram(
+    'lefqih_stage_seconds', 'Time spent in each processing stage', ('stage',)))
+REQUEST_SECONDS = registry.register(Histogram(
+    'lefqih_request_seconds', 'Request latency per route', ('route', 'method', 'status')))
+REQUEST_BYTES = registry.register(Histogram(
+    'lefqih_request_bytes', 'Request body size per route', ('route',), SIZE_BUCKETS))
+RESPONSE_BYTES = registry.register(Histogram(
+    'lefqih_response_bytes', 'Response body size per route', ('route',), SIZE_BUCKETS))
+PROFILED_REQUESTS = registry.register(Counter(
+    'lefqih_profiled_requests_total', 'Requests run under the profiler', ('profiler',)))
+
+
+# name -> cache_info() callable returning an object with hits and misses
+_caches = {}
+
+
+def track_cache(name, cache_info):
+    """Export hits, misses and hit ratio of a cache with an lru_cache-style cache_info()"""
+    _caches[name] = cache_info
+
+
+def _cache_samples(field):
+    samples = []
+    for name, cache_info in list(_caches.items()):
+        info = cache_info()
+        lookups = info.hits + info.misses
+        value = {'hits': info.hits, 'misses': info.misses,
+                 'ratio': info.hits / lookups if lookups else 0.0}[field]
+        samples.append(({'cache': name}, value))
+    return samples
+
+
+registry.register(CallbackMetric(
+    'lefqih_cache_hits_total', 'Cache hits', lambda: _cache_samples('hits'), 'counter'))
+registry.register(CallbackMetric(
+    'lefqih_cache_misses_total', 'Cache misses', lambda: _cache_samples('misses'), 'counter'))
+registry.register(CallbackMetric(
+    'lefqih_cache_hit_ratio', 'Cache hit ratio since startup', lambda: _cache_samples('ratio')))
+
+
+class stage(ContextDecorator):
+    """Time a block or function as one of the processing stages"""
+
+    def __init__(self, name):
+        self.name = name
+
+    def _recreate_cm(self):
+        # A fresh timer per call, so decorated functions are thread-safe
+        return type(self)(self.name)
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self._start
+        STAGE_SECONDS.observe(elapsed, stage=self.name)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings[self.name] = timings.get(self.name, 0.0) + elapsed
+        return False
+
+
+def start_timings():
+    """Start collecting stage durations for the current request or message"""
+    return _request_timings.set({})
+
+
+def stop_timings(token):
+    _request_timings.reset(token)
+
+
+def current_timings():
+    """Stage durations so far in the current request, in milliseconds"""
+    timings = _request_timings.get() or {}
+    return {name: round(seconds * 1000, 3) for name, seconds in timings.items()}
+
+
+def _start_profiler(kind):
+    if kind == 'pyinstrument':
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            return None
+        profiler = Profiler()
+        start = profiler.start
+    else:
+        profiler = cProfile.Profile()
+        start = profiler.enable
+    try:
+        start()
+    except (RuntimeError, ValueError) as e:
+        # Only one profiler may be active at a time
+        print(f"Profiler unavailable: {e}")
+        return None
+    return kind, profiler
+
+
+def _stop_profiler(profile, directory, route):
+    kind, profiler = profile
+    os.makedirs(directory, exist_ok=True)
+    stamp = datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+    slug = route.strip('/').replace('/', '_').replace('<', '').replace('>', '') or 'index'
+    if kind == 'pyinstrument':
+        profiler.stop()
+        filename = f'{stamp}-{slug}.html'
+        with open(os.path.join(directory, filename), 'w', encoding='utf-8') as f:
+            f.write(profiler.output_html())
+    else:
+        profiler.disable()
+        filename = f'{stamp}-{slug}.prof'
+        profiler.dump_stats(os.path.join(directory, filename))
+    PROFILED_REQUESTS.inc(profiler=kind)
+    return filename
+
+
+def init_app(app):
+    """Install the timing hooks, the optional profiler hook and /metrics"""
+    from flask import Response, g, request
+
+    app.config.setdefault('PROFILING', False)
+    app.config.setdefault('PROFILE_DIR', os.path.join(app.instance_path, 'profiles'))
+
+    @app.before_request
+    def _start_request():
+        g.metrics_start = time.perf_counter()
+        g.metrics_timings = start_timings()
+        g.profile = None
+        requested = request.headers.get(PROFILE_HEADER)
+        if requested and app.config['PROFILING']:
+            g.profile = _start_profiler('pyinstrument' if requested.lower() == 'pyinstrument' else 'cprofile')
+
+    @app.after_request
+    def _finish_request(response):
+        start = g.pop('metrics_start', None)
+        if start is None:
+            return response
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        profile = g.pop('profile', None)
+        if profile is not None:
+            response.headers['X-Profile-File'] = _stop_profiler(profile, app.config['PROFILE_DIR'], route)
+
+        REQUEST_SECONDS.observe(time.perf_counter() - start, route=route,
+                                method=request.method, status=response.status_code)
+        REQUEST_BYTES.observe(request.content_length or 0, route=route)
+        if not response.is_streamed:
+            RESPONSE_BYTES.observe(response.calculate_content_length() or 0, route=route)
+        return response
+
+    @app.teardown_request
+    def _reset_timings(exc):
+        profile = g.pop('profile', None)
+        if profile is not None:
+            # The request failed before after_request; keep the profile anyway
+            _stop_profiler(profile, app.config['PROFILE_DIR'], request.path)
+        token = g.pop('metrics_timings', None)
+        if token is not None:
+            stop_timings(token)
+
+    @app.route('/metrics')
+    def metrics():
+        return Response(registry.render(), content_type=CONTENT_TYPE)
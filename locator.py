@@ -0,0 +1,201 @@
+"""
+Full-corpus locate: find where someone is reciting from a few words.
+
+Every run of SHINGLE_WORDS consecutive normalized words (a shingle) of the
+corpus is hashed into an inverted index of the corpus positions it occurs
+at. A query votes with each of its shingles for the position the query
+would have started at; votes for nearby starts are pooled, so a dropped or
+misheard word only costs the shingles it is part of. Shingles never span two
+surahs, and very common ones (more than MAX_POSTINGS occurrences) carry no
+vote.
+
+The index is built once per corpus into sections of the warm-up artifact
+(see warmup.py) and memory-mapped by every worker:
+
+    locate.meta        JSON: format version and shingle length
+    locate.keys        sorted uint64 shingle hashes
+    locate.offsets     K + 1 offsets into locate.positions, one per key
+    locate.positions   uint32 corpus-wide word positions, grouped by key
+    locate.surahs      uint16 surah number of each indexed surah
+    locate.surah_words S + 1 corpus-wide word offsets, one per surah
+
+A query costs one binary search per shingle, a few milliseconds at most.
+"""
+import hashlib
+import json
+import math
+from array import array
+from bisect import bisect_left, bisect_right
+
+INDEX_FORMAT = 1
+SHINGLE_WORDS = 2
+MAX_POSTINGS = 64
+# Starts this many words apart are taken as the same place read with a skip or an extra word
+DRIFT = 3
+
+assert array('Q').itemsize == 8 and array('I').itemsize == 4 and array('H').itemsize == 2
+
+
+def shingle_key(words):
+    """Stable 64-bit hash of a run of normalized words"""
+    digest = hashlib.blake2b(' '.join(words).encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'little')
+
+
+class Candidate:
+    """A place in the corpus a query may have started at"""
+
+    __slots__ = ('surah', 'position', 'score', 'matched', 'shingles')
+
+    def __init__(self, surah, position, score, matched, shingles):
+        self.surah = surah          # surah number
+        self.position = position    # word offset of the start within the surah
+        self.score = score          # sum of the matching shingles' weights
+        self.matched = matched      # query shingles that matched here
+        self.shingles = shingles    # query shingles looked up
+
+    @property
+    def coverage(self):
+        return self.matched / self.shingles if self.shingles else 0.0
+
+    def __repr__(self):
+        return (f"Candidate(surah={self.surah}, position={self.position}, score={self.score:.2f}, "
+                f"matched={self.matched}/{self.shingles})")
+
+
+def build_sections(surahs, shingle_words=SHINGLE_WORDS):
+    """Artifact sections of the locate index of (surah number, normalized words) pairs"""
+    numbers = array('H')
+    surah_words = array('I', [0])
+    entries = []
+    position = 0
+    for number, words in surahs:
+        words = list(words)
+        for i in range(len(words) - shingle_words + 1):
+            entries.append((shingle_key(words[i:i + shingle_words]), position + i))
+        position += len(words)
+        numbers.append(number)
+        surah_words.append(position)
+    entries.sort()
+
+    keys = array('Q')
+    offsets = array('I')
+    positions = array('I')
+    for key, word_position in entries:
+        if not keys or keys[-1] != key:
+            keys.append(key)
+            offsets.append(len(positions))
+        positions.append(word_position)
+    offsets.append(len(positions))
+
+    return {
+        'locate.meta': json.dumps({'format': INDEX_FORMAT, 'shingle_words': shingle_words}).encode('utf-8'),
+        'locate.keys': keys.tobytes(),
+        'locate.offsets': offsets.tobytes(),
+        'locate.positions': positions.tobytes(),
+        'locate.surahs': numbers.tobytes(),
+        'locate.surah_words': surah_words.tobytes(),
+    }
+
+
+SECTION_NAMES = tuple(build_sections([]))
+
+
+class ShingleIndex:
+    """Inverted index from word shingles to corpus positions"""
+
+    def __init__(self, sections):
+        meta = json.loads(bytes(sections['locate.meta']))
+        if meta.get('format') != INDEX_FORMAT:
+            raise ValueError(f"Unsupported locate index format {meta.get('format')}")
+        self.shingle_words = meta['shingle_words']
+        self.keys = memoryview(sections['locate.keys']).cast('Q')
+        self.offsets = memoryview(sections['locate.offsets']).cast('I')
+        self.positions = memoryview(sections['locate.positions']).cast('I')
+        self.surahs = memoryview(sections['locate.surahs']).cast('H')
+        self.surah_words = memoryview(sections['locate.surah_words']).cast('I')
+        # Rarer shingles say more about where we are: weights are log(1 + total / postings)
+        self._total = max(len(self.positions), 1)
+
+    @classmethod
+    def build(cls, surahs, shingle_words=SHINGLE_WORDS):
+        """In-memory index, for corpora without an artifact"""
+        return cls(build_sections(surahs, shingle_words))
+
+    @classmethod
+    def from_artifact(cls, artifact):
+        return cls({name: artifact.section(name) for name in SECTION_NAMES})
+
+    def __len__(self):
+        return len(self.surahs)
+
+    @property
+    def nbytes(self):
+        return sum(view.nbytes for view in (self.keys, self.offsets, self.positions, self.surahs, self.surah_words))
+
+    def postings(self, shingle):
+        """Corpus-wide positions of a shingle (a memoryview slice)"""
+        key = shingle_key(shingle)
+        i = bisect_left(self.keys, key)
+        if i == len(self.keys) or self.keys[i] != key:
+            return self.positions[0:0]
+        return self.positions[self.offsets[i]:self.offsets[i + 1]]
+
+    def locate(self, words, limit=5):
+        """
+        Ranked Candidates for where a run of normalized words starts.
+
+        Candidates are at least 2 * DRIFT words apart; the best comes first.
+        """
+        n = self.shingle_words
+        shingles = len(words) - n + 1
+        if shingles <= 0 or not len(self.surahs):
+            return []
+
+        surah_words = self.surah_words
+        votes = {}  # (surah position, start) -> [score, matched]
+        for q in range(shingles):
+            postings = self.postings(words[q:q + n])
+            if not postings or len(postings) > MAX_POSTINGS:
+                continue
+            weight = math.log(1 + self._total / len(postings))
+            for p in postings:
+                surah = bisect_right(surah_words, p) - 1
+                # A query that begins with extra words would start before the surah does
+                start = max(p - q, surah_words[surah])
+                vote = votes.get((surah, start))
+                if vote is None:
+                    votes[(surah, start)] = [weight, 1]
+                else:
+                    vote[0] += weight
+                    vote[1] += 1
+        if not votes:
+            return []
+
+        # Pool each start's votes with its neighbours', then keep the best separated peaks
+        starts = sorted(votes)
+        pooled = []
+        lo = hi = 0
+        for surah, start in starts:
+            while starts[lo] < (surah, start - DRIFT):
+                lo += 1
+            while hi < len(starts) and starts[hi] <= (surah, start + DRIFT):
+                hi += 1
+            score = matched = 0
+            for key in starts[lo:hi]:
+                score += votes[key][0]
+                matched += votes[key][1]
+            # Ties go to the start with the most votes of its own
+            pooled.append((score, votes[(surah, start)][0], min(matched, shingles), surah, start))
+        pooled.sort(reverse=True)
+
+        candidates = []
+        for score, _, matched, surah, start in pooled:
+            if any(c_surah == surah and abs(c_start - start) < 2 * DRIFT for c_surah, c_start, _ in candidates):
+                continue
+            candidates.append((surah, start, Candidate(self.surahs[surah], start - surah_words[surah],
+                                                       score, matched, shingles)))
+            if len(candidates) == limit:
+                break
+        return [candidate for _, _, candidate in candidates]
+
@@ -0,0 +1,142 @@
+"""
+Rendered-page cache for pages that are the same for every visitor.
+
+index.html only depends on the surah list and recite.html on the surah
+being recited, yet both used to be rendered (the recite page with the whole
+surah text) and sent uncompressed on every visit. PageCache keeps each
+rendered page once per (template, surah, template version, corpus version)
+together with its gzip variant and, when the brotli package is installed,
+its brotli variant, all compressed once when the page is rendered.
+
+Every variant has a strong ETag derived from the page body, the same in
+every worker process, and a request whose If-None-Match holds it is
+answered with an empty 304. Pages are sent with Cache-Control: no-cache, so
+browsers keep them but revalidate each visit: /recite shows whichever
+surah the session is on, and only a matching ETag may skip the body.
+
+The template version is the template file's modification time and size,
+checked on each lookup, and the corpus version comes from the caller, so
+editing a template or switching corpus simply misses the cache; entries of
+older versions age out of the LRU.
+"""
+import gzip
+import hashlib
+import os
+import threading
+from collections import OrderedDict, namedtuple
+
+from flask import Response
+
+try:
+    import brotli
+except ImportError:  # Optional: brotli-compressed pages
+    brotli = None
+
+PAGE_ENTRIES = 256
+GZIP_LEVEL = 9
+BROTLI_QUALITY = 11
+# Smaller bodies are not worth compressing
+MIN_COMPRESS_SIZE = 512
+# Preferred first
+ENCODINGS = ('br', 'gzip')
+
+CacheInfo = namedtuple('CacheInfo', 'hits misses currsize')
+
+
+class RenderedPage:
+    """A rendered page and its compressed variants"""
+
+    __slots__ = ('digest', 'variants')
+
+    def __init__(self, body):
+        self.digest = hashlib.sha1(body).hexdigest()[:20]
+        self.variants = {'identity': body}
+        if len(body) >= MIN_COMPRESS_SIZE:
+            self.variants['gzip'] = gzip.compress(body, GZIP_LEVEL, mtime=0)
+            if brotli is not None:
+                self.variants['br'] = brotli.compress(body, quality=BROTLI_QUALITY)
+
+    def etag(self, encoding):
+        # Strong validators differ between content codings of the same page
+        return self.digest if encoding == 'identity' else f"{self.digest}-{encoding}"
+
+    def encoding_for(self, accept_encodings):
+        for encoding in ENCODINGS:
+            if encoding in self.variants and accept_encodings[encoding]:
+                return encoding
+        return 'identity'
+
+    @property
+    def nbytes(self):
+        return sum(len(body) for body in self.variants.values())
+
+
+class PageCache:
+    """LRU of rendered pages, keyed by template, surah and the versions of both"""
+
+    def __init__(self, template_dir, corpus_version, max_entries=PAGE_ENTRIES):
+        self.template_dir = template_dir
+        self.corpus_version = corpus_version  # callable; changes whenever the corpus does
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._pages = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _key(self, template, surah):
+        try:
+            stat = os.stat(os.path.join(self.template_dir, template))
+            template_version = (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            template_version = None
+        return template, surah, template_version, self.corpus_version()
+
+    def get(self, template, surah, render):
+        """The cached page, rendering it with render() (returning str or bytes) on a miss"""
+        key = self._key(template, surah)
+        with self._lock:
+            page = self._pages.get(key)
+            if page is not None:
+                self._pages.move_to_end(key)
+                self.hits += 1
+                return page
+            self.misses += 1
+        # Rendered outside the lock; concurrent misses render the same page twice at worst
+        body = render()
+        return self._remember(key, body.encode('utf-8') if isinstance(body, str) else body)
+
+    def put(self, template, surah, body):
+        """Store a page rendered elsewhere (the warm-up's pre-rendered surah list)"""
+        return self._remember(self._key(template, surah), body)
+
+    def _remember(self, key, body):
+        page = RenderedPage(body)
+        with self._lock:
+            self._pages[key] = page
+            self._pages.move_to_end(key)
+            while len(self._pages) > self.max_entries:
+                self._pages.popitem(last=False)
+        return page
+
+    def respond(self, page, request, vary=(), mimetype='text/html'):
+        """Response for a cached page: the best variant the client accepts, or 304 if it has it"""
+        encoding = page.encoding_for(request.accept_encodings)
+        etag = page.etag(encoding)
+        if request.if_none_match.contains_weak(etag):
+            response = Response(status=304)
+        else:
+            response = Response(page.variants[encoding], mimetype=mimetype)
+            if encoding != 'identity':
+                response.headers['Content-Encoding'] = encoding
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        response.vary.update(('Accept-Encoding',) + tuple(vary))
+        return response
+
+    def cache_info(self):
+        return CacheInfo(self.hits, self.misses, len(self._pages))
+
+    @property
+    def nbytes(self):
+        with self._lock:
+            return sum(page.nbytes for page in self._pages.values())
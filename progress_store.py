@@ -0,0 +1,244 @@
+"""
+Persistent recitation history.
+
+Sessions only hold the latest analysis, so trends need a store of their
+own. ProgressStore keeps an append-only SQLite log (WAL mode, so readers
+never wait for the writer and several worker processes can share the file):
+
+- recitations: one row per graded recitation (user, surah, timestamp,
+  accuracy, completion, word and error counts)
+- word_errors: one row per incorrect or missing word, with its position in
+  the surah
+- position_misses: running miss counts per (user, surah, position), kept
+  by the writer so "most missed words" never scans the whole log
+
+Log rows are never updated or deleted. record() only puts the analysis on a
+queue; a background thread writes queued recitations in batches, one
+transaction per batch, so requests never wait on the disk.
+"""
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+BATCH_SIZE = 200        # recitations per transaction
+FLUSH_INTERVAL = 0.5    # seconds a partial batch may wait
+QUEUE_SIZE = 10000      # recitations waiting to be written before new ones are dropped
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS recitations (
+    id INTEGER PRIMARY KEY,
+    user TEXT NOT NULL,
+    surah INTEGER NOT NULL,
+    ts REAL NOT NULL,
+    accuracy REAL NOT NULL,
+    completion REAL NOT NULL,
+    total_words INTEGER NOT NULL,
+    spoken_words INTEGER NOT NULL,
+    total_errors INTEGER NOT NULL,
+    source TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS recitations_user_surah_ts ON recitations(user, surah, ts);
+CREATE TABLE IF NOT EXISTS word_errors (
+    recitation_id INTEGER NOT NULL REFERENCES recitations(id),
+    user TEXT NOT NULL,
+    surah INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    type TEXT NOT NULL,
+    expected TEXT NOT NULL,
+    spoken TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS word_errors_surah_position ON word_errors(surah, position);
+CREATE TABLE IF NOT EXISTS position_misses (
+    user TEXT NOT NULL,
+    surah INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    incorrect INTEGER NOT NULL,
+    missing INTEGER NOT NULL,
+    expected TEXT NOT NULL,
+    PRIMARY KEY (user, surah, position)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS position_misses_surah_position ON position_misses(surah, position);
+"""
+
+# Error types that point at a word of the surah; extra words have no position of their own
+POSITIONED_ERRORS = ('incorrect', 'missing')
+
+
+def reached_words(analysis):
+    """
+    Words of the surah up to the end of the furthest ayah the reciter reached.
+
+    ayah_accuracy covers every ayah from the first up to that one, so its word
+    counts add up to the boundary. Missing words past it were never
+    attempted and are not kept as word errors.
+    """
+    ayahs = analysis.get('ayah_accuracy')
+    if not ayahs:
+        return analysis.get('total_words', 0)
+    return sum(ayah['words'] for ayah in ayahs)
+
+
+def recitation_rows(user, surah, ts, analysis, source):
+    """The recitations row and (position, type, expected, spoken) error rows of an analysis"""
+    errors_by_type = analysis.get('errors_by_type', {})
+    reached = reached_words(analysis)
+    errors = [
+        (error['position'], error['type'], error.get('correct') or error.get('missing') or '',
+         error.get('spoken', ''))
+        for error_type in POSITIONED_ERRORS
+        for error in errors_by_type.get(error_type, [])
+        if error.get('position') is not None and error['position'] < reached
+    ]
+    row = (user, surah, ts, analysis.get('overall_accuracy', 0.0), analysis.get('completion_percentage', 0.0),
+           analysis.get('total_words', 0), analysis.get('spoken_words', 0),
+           analysis.get('total_errors', len(errors)), source)
+    return row, errors
+
+
+class ProgressStore:
+    """Append-only recitation log with a background batch writer"""
+
+    def __init__(self, path, batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL, queue_size=QUEUE_SIZE):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self.written = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._local = threading.local()
+        self._writer = None
+        self._writer_pid = None
+        self._writer_lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        connection = self._connection()
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.executescript(SCHEMA)
+        connection.commit()
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5)
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    # Writing
+
+    def record(self, user, surah, analysis, ts=None, source='live'):
+        """Queue a graded recitation (a /final_analysis-shaped dict); returns False if it was dropped"""
+        self._ensure_writer()
+        try:
+            # Rows are built by the writer thread; the request only pays for the put
+            self._queue.put_nowait((str(user), int(surah), time.time() if ts is None else ts, analysis, source))
+        except queue.Full:
+            # History is best effort; never block a request on a backed-up disk
+            self.dropped += 1
+            return False
+        return True
+
+    def flush(self, timeout=None):
+        """Wait until everything queued so far is written; returns False on timeout"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.005)
+        return True
+
+    @property
+    def pending(self):
+        return self._queue.qsize()
+
+    def _ensure_writer(self):
+        # Threads do not survive fork: a worker process starts its own writer on first use
+        if self._writer is not None and self._writer_pid == os.getpid():
+            return
+        with self._writer_lock:
+            if self._writer is None or self._writer_pid != os.getpid():
+                self._writer_pid = os.getpid()
+                self._writer = threading.Thread(target=self._run_writer, name='progress-writer', daemon=True)
+                self._writer.start()
+
+    def _run_writer(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                self._write(batch)
+            except sqlite3.Error as e:
+                print(f"Could not write {len(batch)} recitations to {self.path}: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _write(self, batch):
+        connection = self._connection()
+        with connection:
+            for user, surah, ts, analysis, source in batch:
+                row, errors = recitation_rows(user, surah, ts, analysis, source)
+                cursor = connection.execute(
+                    "INSERT INTO recitations (user, surah, ts, accuracy, completion, total_words, "
+                    "spoken_words, total_errors, source) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", row)
+                recitation_id = cursor.lastrowid
+                connection.executemany(
+                    "INSERT INTO word_errors (recitation_id, user, surah, position, type, expected, spoken) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [(recitation_id, user, surah) + error for error in errors])
+                connection.executemany(
+                    "INSERT INTO position_misses (user, surah, position, incorrect, missing, expected) "
+                    "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (user, surah, position) DO UPDATE SET "
+                    "incorrect = incorrect + excluded.incorrect, missing = missing + excluded.missing",
+                    [(user, surah, position, int(error_type == 'incorrect'), int(error_type == 'missing'), expected)
+                     for position, error_type, expected, _ in errors])
+        self.written += len(batch)
+
+    # Queries
+
+    def accuracy_over_time(self, user, surah=None, since=None, limit=500):
+        """A user's recitations, oldest first: [{ts, surah, accuracy, completion, errors}]"""
+        sql = ("SELECT ts, surah, accuracy, completion, total_errors FROM recitations "
+               "WHERE user = ?")
+        params = [str(user)]
+        if surah is not None:
+            sql += " AND surah = ?"
+            params.append(int(surah))
+        if since is not None:
+            sql += " AND ts >= ?"
+            params.append(since)
+        # Newest `limit` rows through the (user, surah, ts) index, returned in time order
+        sql = f"SELECT * FROM ({sql} ORDER BY ts DESC LIMIT ?) ORDER BY ts"
+        params.append(limit)
+        return [
+            {'ts': ts, 'surah': surah, 'accuracy': accuracy, 'completion': completion, 'errors': errors}
+            for ts, surah, accuracy, completion, errors in self._connection().execute(sql, params)
+        ]
+
+    def most_missed_positions(self, surah, user=None, limit=10):
+        """Word positions of a surah with the most errors: [{position, misses, incorrect, missing, expected}]"""
+        if user is not None:
+            sql = ("SELECT position, incorrect + missing AS misses, incorrect, missing, expected "
+                   "FROM position_misses WHERE user = ? AND surah = ? ORDER BY misses DESC, position LIMIT ?")
+            params = (str(user), int(surah), limit)
+        else:
+            sql = ("SELECT position, SUM(incorrect + missing) AS misses, SUM(incorrect), SUM(missing), "
+                   "MAX(expected) FROM position_misses WHERE surah = ? "
+                   "GROUP BY position ORDER BY misses DESC, position LIMIT ?")
+            params = (int(surah), limit)
+        return [
+            {'position': position, 'misses': misses, 'incorrect': incorrect, 'missing': missing,
+             'expected': expected}
+            for position, misses, incorrect, missing, expected in self._connection().execute(sql, params)
+        ]
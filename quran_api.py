@@ -0,0 +1,308 @@
+"""
+Resilient client for the api.alquran.cloud HTTP API.
+
+Only deployments without a local corpus dump talk to the API, but when they
+do, one stalled upstream must not tie up a worker. QuranApiClient adds:
+
+- a pooled requests.Session with separate connect and read timeouts
+- retries with exponential backoff and jitter on connection errors,
+  timeouts, 429 and 5xx responses
+- a circuit breaker that fails fast after repeated failures and lets a
+  single probe through once the reset timeout has passed
+- a two-tier response cache: an in-memory LRU in front of an on-disk JSON
+  store that keeps each response's ETag. Fresh entries are served directly;
+  stale ones are served immediately while a background refresh revalidates
+  them with If-None-Match, and are also served when the API is down.
+
+Point base_url at a local stub (see bench/api_stub.py) to exercise it.
+"""
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from concurrent.futures import Future, ThreadPoolExecutor
+
+API_BASE_URL = "https://api.alquran.cloud/v1"
+CONNECT_TIMEOUT = 3.05  # seconds
+READ_TIMEOUT = 10
+MAX_RETRIES = 3
+BACKOFF_BASE = 0.25     # seconds, doubled per attempt
+BACKOFF_MAX = 4.0
+FAILURE_THRESHOLD = 5   # consecutive failures before the circuit opens
+RESET_TIMEOUT = 30.0    # seconds before a probe request is allowed
+CACHE_TTL = 24 * 60 * 60
+MEMORY_ENTRIES = 256
+POOL_SIZE = 10
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+CacheInfo = namedtuple('CacheInfo', 'hits misses stale currsize')
+
+
+class ApiError(Exception):
+    """The API could not be reached or returned an unusable response"""
+
+
+class CircuitOpenError(ApiError):
+    """Requests are short-circuited after repeated upstream failures"""
+
+
+class CircuitBreaker:
+    """Closed -> open after `failure_threshold` failures -> half-open after `reset_timeout`"""
+
+    def __init__(self, failure_threshold=FAILURE_THRESHOLD, reset_timeout=RESET_TIMEOUT, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if self.clock() - self.opened_at >= self.reset_timeout:
+            return 'half-open'
+        return 'open'
+
+    def allow(self):
+        """Whether a request may be sent now; in half-open state only one probe at a time"""
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half-open' and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._probing or self.failures >= self.failure_threshold:
+                self.opened_at = self.clock()
+            self._probing = False
+
+
+class CacheEntry:
+    __slots__ = ('data', 'etag', 'fetched_at')
+
+    def __init__(self, data, etag=None, fetched_at=None):
+        self.data = data
+        self.etag = etag
+        self.fetched_at = time.time() if fetched_at is None else fetched_at
+
+    def age(self):
+        return time.time() - self.fetched_at
+
+
+class ResponseCache:
+    """Memory LRU backed by an optional directory of JSON files"""
+
+    def __init__(self, directory=None, memory_entries=MEMORY_ENTRIES):
+        self.directory = directory
+        self.memory_entries = memory_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.stale = 0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode('utf-8')).hexdigest() + '.json')
+
+    def get(self, key):
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                return entry
+        if not self.directory:
+            return None
+        try:
+            with open(self._path(key), encoding='utf-8') as f:
+                stored = json.load(f)
+        except (OSError, ValueError):
+            return None
+        entry = CacheEntry(stored['data'], stored.get('etag'), stored['fetched_at'])
+        self._remember(key, entry)
+        return entry
+
+    def set(self, key, entry):
+        self._remember(key, entry)
+        if not self.directory:
+            return
+        path = self._path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'key': key, 'etag': entry.etag, 'fetched_at': entry.fetched_at,
+                           'data': entry.data}, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Could not write API cache entry for {key}: {e}")
+
+    def _remember(self, key, entry):
+        with self._lock:
+            self._memory[key] = entry
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_entries:
+                self._memory.popitem(last=False)
+
+    def count(self, outcome):
+        with self._lock:
+            setattr(self, outcome, getattr(self, outcome) + 1)
+
+    def cache_info(self):
+        # Stale entries are still served from the cache, so they count as hits too
+        return CacheInfo(self.hits, self.misses, self.stale, len(self._memory))
+
+
+class QuranApiClient:
+    """Pooled, retrying, circuit-broken and cached access to the Quran API"""
+
+    def __init__(self, base_url=API_BASE_URL, connect_timeout=CONNECT_TIMEOUT, read_timeout=READ_TIMEOUT,
+                 max_retries=MAX_RETRIES, backoff_base=BACKOFF_BASE, ttl=CACHE_TTL,
+                 cache_dir=None, breaker=None, session=None):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.ttl = ttl
+        self.cache = ResponseCache(cache_dir)
+        self.breaker = breaker or CircuitBreaker()
+        self._session = session
+        self._session_lock = threading.Lock()
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
+        self._refresher = ThreadPoolExecutor(max_workers=2, thread_name_prefix='quran-api-refresh')
+
+    @property
+    def session(self):
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    import requests
+                    from requests.adapters import HTTPAdapter
+
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+                    session.mount('https://', adapter)
+                    session.mount('http://', adapter)
+                    session.headers['Accept'] = 'application/json'
+                    self._session = session
+        return self._session
+
+    def get(self, path):
+        """Return the 'data' payload for an API path, from cache when possible"""
+        entry = self.cache.get(path)
+        if entry is not None:
+            if entry.age() < self.ttl:
+                self.cache.count('hits')
+                return entry.data
+            # Stale: answer now, revalidate in the background
+            self.cache.count('hits')
+            self.cache.count('stale')
+            self._refresh(path, entry)
+            return entry.data
+
+        self.cache.count('misses')
+        return self._refresh(path, None).result()
+
+    def get_surah_list(self):
+        return self.get("/surah")
+
+    def get_surah(self, surah_number):
+        return self.get(f"/surah/{surah_number}")
+
+    def close(self):
+        self._refresher.shutdown(wait=False)
+        if self._session is not None:
+            self._session.close()
+
+    def _refresh(self, path, entry):
+        """Fetch path once even if many callers ask at the same time"""
+        with self._inflight_lock:
+            future = self._inflight.get(path)
+            if future is not None:
+                return future
+            future = Future()
+            self._inflight[path] = future
+
+        def run():
+            try:
+                future.set_result(self._fetch(path, entry))
+            except BaseException as e:
+                if entry is not None:
+                    print(f"Background refresh of {path} failed, serving stale data: {e}")
+                future.set_exception(e)
+            finally:
+                with self._inflight_lock:
+                    self._inflight.pop(path, None)
+
+        if entry is None:
+            # The caller waits for the result anyway; fetch on its own thread
+            run()
+        else:
+            self._refresher.submit(run)
+        return future
+
+    def _fetch(self, path, entry):
+        headers = {'If-None-Match': entry.etag} if entry is not None and entry.etag else {}
+        response = self._request(path, headers)
+        if response.status_code == 304 and entry is not None:
+            fresh = CacheEntry(entry.data, entry.etag)
+        else:
+            try:
+                data = response.json()['data']
+            except (ValueError, KeyError, TypeError) as e:
+                raise ApiError(f"Unexpected response for {path}: {e}")
+            fresh = CacheEntry(data, response.headers.get('ETag'))
+        self.cache.set(path, fresh)
+        return fresh.data
+
+    def _request(self, path, headers):
+        import requests
+
+        url = f"{self.base_url}{path}"
+        last_error = None
+        retry_after = None
+        for attempt in range(self.max_retries + 1):
+            if not self.breaker.allow():
+                raise CircuitOpenError(f"Quran API circuit is open after {self.breaker.failures} failures")
+            try:
+                response = self.session.get(url, headers=headers, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                last_error = e
+            else:
+                if response.status_code not in RETRY_STATUSES:
+                    if response.status_code >= 400:
+                        # Client errors will not improve with retries, and the upstream is healthy
+                        self.breaker.record_success()
+                        raise ApiError(f"{url} returned HTTP {response.status_code}")
+                    self.breaker.record_success()
+                    return response
+                last_error = ApiError(f"{url} returned HTTP {response.status_code}")
+                retry_after = response.headers.get('Retry-After')
+            self.breaker.record_failure()
+            if attempt < self.max_retries:
+                time.sleep(self._backoff(attempt, retry_after))
+                retry_after = None
+        raise ApiError(f"{url} failed after {self.max_retries + 1} attempts: {last_error}")
+
+    def _backoff(self, attempt, retry_after=None):
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), BACKOFF_MAX)
+        delay = min(self.backoff_base * (2 ** attempt), BACKOFF_MAX)
+        return delay * random.uniform(0.5, 1.0)
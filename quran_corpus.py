@@ -0,0 +1,344 @@
+"""
+Local Quran corpus store.
+
+The corpus is imported once from api.alquran.cloud (or from a JSON dump of it)
+into a small SQLite file, so that `/` and `/start` never have to touch the
+network. The HTTP API is only used as an optional fallback when no local dump
+is available.
+
+At startup only the surah list is read; warm-up (see warmup.py) then maps a
+read-only corpus image (see corpus_image.py) that every worker shares. Without
+an image, surahs are read from the dump on first use.
+
+Import a corpus with:
+
+    python quran_corpus.py import                      # download all 114 surahs
+    python quran_corpus.py import --from-json dump.json  # offline, from /v1/quran/quran-uthmani
+"""
+import argparse
+import json
+import os
+import sqlite3
+import threading
+
+from locator import ShingleIndex
+from quran_api import API_BASE_URL, QuranApiClient
+from surah_index import SurahIndex
+
+TOTAL_SURAHS = 114
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CORPUS_PATH = os.path.join(BASE_DIR, 'data', 'quran.sqlite')
+
+# Surah-level fields kept in the same camelCase shape the API returns,
+# so templates and session code keep working unchanged.
+SURAH_FIELDS = ('number', 'name', 'englishName', 'englishNameTranslation',
+                'revelationType', 'numberOfAyahs')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS surahs (
+    number INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    english_name TEXT NOT NULL,
+    english_name_translation TEXT NOT NULL,
+    revelation_type TEXT NOT NULL,
+    number_of_ayahs INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS ayahs (
+    surah INTEGER NOT NULL REFERENCES surahs(number),
+    number_in_surah INTEGER NOT NULL,
+    number INTEGER NOT NULL,
+    juz INTEGER,
+    page INTEGER,
+    text TEXT NOT NULL,
+    PRIMARY KEY (surah, number_in_surah)
+) WITHOUT ROWID;
+"""
+
+
+class SQLiteCorpusBackend:
+    """Reads the corpus from a one-time SQLite dump"""
+
+    def __init__(self, path=DEFAULT_CORPUS_PATH):
+        self.path = path
+
+    def available(self):
+        return os.path.exists(self.path)
+
+    def _connect(self):
+        return sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+
+    def load_surah_list(self):
+        connection = self._connect()
+        try:
+            return [dict(zip(SURAH_FIELDS, row)) for row in connection.execute(
+                "SELECT number, name, english_name, english_name_translation, "
+                "revelation_type, number_of_ayahs FROM surahs ORDER BY number")]
+        finally:
+            connection.close()
+
+    def load_surah(self, surah_number):
+        """Return one surah with its ayahs, or None if it is not in the dump"""
+        connection = self._connect()
+        try:
+            row = connection.execute(
+                "SELECT number, name, english_name, english_name_translation, "
+                "revelation_type, number_of_ayahs FROM surahs WHERE number = ?", (surah_number,)).fetchone()
+            if row is None:
+                return None
+            surah = dict(zip(SURAH_FIELDS, row), ayahs=[])
+            for number_in_surah, number, juz, page, text in connection.execute(
+                    "SELECT number_in_surah, number, juz, page, text "
+                    "FROM ayahs WHERE surah = ? ORDER BY number_in_surah", (surah_number,)):
+                surah['ayahs'].append({
+                    'number': number,
+                    'text': text,
+                    'numberInSurah': number_in_surah,
+                    'juz': juz,
+                    'page': page,
+                })
+            return surah
+        finally:
+            connection.close()
+
+    def load_all(self):
+        """Return (surah_list, {number: surah_data}) for every surah in the dump"""
+        connection = self._connect()
+        try:
+            surah_list = []
+            surahs = {}
+            for row in connection.execute(
+                    "SELECT number, name, english_name, english_name_translation, "
+                    "revelation_type, number_of_ayahs FROM surahs ORDER BY number"):
+                info = dict(zip(SURAH_FIELDS, row))
+                surah_list.append(info)
+                surahs[info['number']] = dict(info, ayahs=[])
+
+            for surah, number_in_surah, number, juz, page, text in connection.execute(
+                    "SELECT surah, number_in_surah, number, juz, page, text "
+                    "FROM ayahs ORDER BY surah, number_in_surah"):
+                surahs[surah]['ayahs'].append({
+                    'number': number,
+                    'text': text,
+                    'numberInSurah': number_in_surah,
+                    'juz': juz,
+                    'page': page,
+                })
+            return surah_list, surahs
+        finally:
+            connection.close()
+
+
+class ApiCorpusBackend:
+    """Fetches surahs from api.alquran.cloud, used only as a fallback"""
+
+    def __init__(self, base_url=API_BASE_URL, cache_dir=None, client=None):
+        self.client = client or QuranApiClient(base_url, cache_dir=cache_dir)
+
+    def get_surah_list(self):
+        return self.client.get_surah_list()
+
+    def get_surah(self, surah_number):
+        return self.client.get_surah(surah_number)
+
+
+class QuranCorpus:
+    """
+    Corpus lookups for the lifetime of the process.
+
+    With a corpus image attached (attach_image), surahs and indexes are
+    served from the shared mapping. Otherwise surahs are read from the local
+    dump, or fetched from the fallback backend when the dump is missing, on
+    first use and kept in memory.
+
+    If a normalize function is given, a surah's SurahIndex is built the
+    first time it is asked for; build_indexes() builds them up front.
+    The full-corpus locate index (see locator.py) comes from the image too,
+    or is built from every surah's index on first use.
+    """
+
+    def __init__(self, backend=None, fallback=None, normalize=None):
+        self.backend = backend
+        self.fallback = fallback
+        self.normalize = normalize
+        self.surah_list = []
+        self.surahs = {}
+        self.indexes = {}
+        self.source = None
+        self.image = None
+        self.locator = None
+        self._index_lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, path=None, api_fallback=True, normalize=None, api_url=API_BASE_URL, api_cache_dir=None):
+        backend = SQLiteCorpusBackend(path or DEFAULT_CORPUS_PATH)
+        fallback = ApiCorpusBackend(api_url, api_cache_dir) if api_fallback else None
+        corpus = cls(backend, fallback, normalize)
+        corpus.load()
+        return corpus
+
+    def load(self):
+        if self.backend is not None and self.backend.available():
+            self.surah_list = self.backend.load_surah_list()
+            self.source = 'local'
+        elif self.fallback is not None:
+            self.source = 'api'
+        else:
+            print(f"⚠️ No Quran corpus found at {getattr(self.backend, 'path', None)} and API fallback is disabled")
+        return self
+
+    @property
+    def is_local(self):
+        return self.source == 'local'
+
+    def get_surah_list(self):
+        if not self.surah_list and self.fallback is not None:
+            try:
+                self.surah_list = self.fallback.get_surah_list()
+            except Exception as e:
+                print(f"Error fetching surah list: {e}")
+        return self.surah_list
+
+    @property
+    def surah_numbers(self):
+        if self.surah_list:
+            return [surah['number'] for surah in self.surah_list]
+        return sorted(self.surahs)
+
+    def attach_image(self, image, locator=None):
+        """Serve surahs and indexes (and the locate index, if given) from a mapped CorpusImage from now on"""
+        with self._index_lock:
+            self.image = image
+            self.locator = locator
+            # Heap copies are no longer needed; the mapping holds the same data
+            self.surahs = {}
+            self.indexes = {}
+
+    def get_surah(self, surah_number):
+        if self.image is not None and surah_number in self.image:
+            return self.image.get_surah(surah_number)
+        surah = self.surahs.get(surah_number)
+        if surah is None and self.is_local:
+            surah = self.backend.load_surah(surah_number)
+            if surah is not None:
+                self.surahs[surah_number] = surah
+        elif surah is None and self.fallback is not None:
+            try:
+                surah = self.fallback.get_surah(surah_number)
+                self.surahs[surah_number] = surah
+            except Exception as e:
+                print(f"Error fetching surah {surah_number}: {e}")
+        return surah
+
+    def get_index(self, surah_number):
+        """Return the precompiled SurahIndex for a surah, or None if it is unavailable"""
+        index = self.indexes.get(surah_number)
+        if index is None and self.image is not None:
+            index = self.image.get_index(surah_number)
+            if index is not None:
+                self.indexes[surah_number] = index
+                return index
+        if index is None and self.normalize is not None:
+            surah = self.get_surah(surah_number)
+            if surah is not None:
+                with self._index_lock:
+                    index = self.indexes.get(surah_number)
+                    if index is None:
+                        index = self.indexes[surah_number] = SurahIndex.build(surah, self.normalize)
+        return index
+
+    def get_locator(self):
+        """The ShingleIndex over every available surah, built on first use without an image"""
+        if self.locator is None:
+            self.build_indexes()
+            with self._index_lock:
+                if self.locator is None:
+                    self.locator = ShingleIndex.build(
+                        (number, self.indexes[number].words) for number in sorted(self.indexes))
+        return self.locator
+
+    def build_indexes(self, surah_numbers=None):
+        """Build the indexes of the given surahs (all listed ones by default); returns how many exist"""
+        if surah_numbers is None:
+            surah_numbers = self.surah_numbers
+        for surah_number in surah_numbers:
+            self.get_index(surah_number)
+        return len(self.indexes)
+
+
+def write_corpus(path, surahs):
+    """Write an iterable of API-shaped surah dicts (with ayahs) to a SQLite dump"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = path + '.tmp'
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    connection = sqlite3.connect(tmp_path)
+    try:
+        connection.executescript(SCHEMA)
+        count = 0
+        for surah in surahs:
+            ayahs = surah.get('ayahs', [])
+            connection.execute(
+                "INSERT INTO surahs VALUES (?, ?, ?, ?, ?, ?)",
+                (surah['number'], surah['name'], surah['englishName'],
+                 surah.get('englishNameTranslation', ''), surah.get('revelationType', ''),
+                 surah.get('numberOfAyahs', len(ayahs))))
+            connection.executemany(
+                "INSERT INTO ayahs VALUES (?, ?, ?, ?, ?, ?)",
+                [(surah['number'], ayah['numberInSurah'], ayah['number'],
+                  ayah.get('juz'), ayah.get('page'), ayah['text']) for ayah in ayahs])
+            count += 1
+        connection.execute("INSERT INTO meta VALUES ('surah_count', ?)", (str(count),))
+        connection.commit()
+        connection.execute("VACUUM")
+    finally:
+        connection.close()
+
+    os.replace(tmp_path, path)
+    return count
+
+
+def iter_api_surahs(api):
+    for surah_number in range(1, TOTAL_SURAHS + 1):
+        print(f"📥 Downloading surah {surah_number}/{TOTAL_SURAHS}")
+        yield api.get_surah(surah_number)
+
+
+def iter_json_dump(dump_path):
+    """Read surahs from a saved /v1/quran/<edition> response (or a plain list of surahs)"""
+    with open(dump_path, encoding='utf-8') as f:
+        payload = json.load(f)
+    if isinstance(payload, dict):
+        payload = payload.get('data', payload)
+        payload = payload.get('surahs', payload)
+    return iter(payload)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage the local Quran corpus")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    importer = commands.add_parser('import', help='Import all surahs into a local SQLite dump')
+    importer.add_argument('--out', default=DEFAULT_CORPUS_PATH, help='Output SQLite path')
+    importer.add_argument('--from-json', dest='from_json', help='Read a saved API dump instead of downloading')
+    importer.add_argument('--api-url', default=API_BASE_URL, help='Base URL of the Quran API')
+
+    args = parser.parse_args(argv)
+    if args.command == 'import':
+        if args.from_json:
+            surahs = iter_json_dump(args.from_json)
+        else:
+            surahs = iter_api_surahs(ApiCorpusBackend(args.api_url))
+        count = write_corpus(args.out, surahs)
+        print(f"✅ Imported {count} surahs into {args.out}")
+
+
+if __name__ == "__main__":
+    main()
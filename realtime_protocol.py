@@ -0,0 +1,259 @@
+"""
+Delta-based realtime protocol (version 2).
+
+The browser's speech recognizer produces numbered result segments that start
+out interim and are eventually finalized. Instead of re-sending whole
+fragments, the client sends for each event:
+
+    {"v": 2, "seq": 17, "segment": 4, "final": false, "offset": 6, "text": "..."}
+
+- seq      increases with every message the client sends
+- segment  id of the recognizer result the text belongs to
+- final    whether the segment is finalized
+- offset   number of words of the segment the server already has; text holds
+           only the words from there on (finals always send the whole
+           segment with offset 0, so they are self-contained)
+
+The server keeps the committed prefix (aligner state after every finalized
+segment) and only re-evaluates the provisional tail, i.e. the current interim
+segment, on top of it. Interim messages older than the newest one seen are
+dropped, and a segment is committed at most once, so duplicated or reordered
+packets are idempotent.
+
+Results come in two schemas. The original one repeats every error as a dict
+with spoken, expected and their original spellings, plus the next words and
+the progress. A client that sends "schema": 1 (COMPACT_SCHEMA) gets
+
+    {"v": 2, "schema": 1, "seq": 17, "segment": 4, "p": 123,
+     "e": [[kind, position, spoken, similarity, confusion(, surah)], ...]}
+
+where kind indexes ERROR_KINDS, confusion indexes confusions.LABELS (-1 for
+none) and surah is only given for errors of another surah than the one the
+session is on. The expected word, the next words and the progress follow
+from p and the surah's words, which the recite page already has; other keys
+(provisional, located, ...) are passed through as they are. Over HTTP a
+compact result is sent as MessagePack when the client's Accept prefers
+application/msgpack and the msgpack package is installed. debug_info
+(normalized text and stage timings) is only added when a message asks for
+it with "debug": true.
+"""
+
+import confusions
+
+try:
+    import msgpack
+except ImportError:  # Optional: MessagePack realtime results
+    msgpack = None
+
+PROTOCOL_VERSION = 2
+COMPACT_SCHEMA = 1
+MSGPACK_MIMETYPE = 'application/msgpack'
+
+DUPLICATE = 'duplicate'
+RESYNC = 'resync'
+INTERIM = 'interim'
+FINAL = 'final'
+
+
+class RealtimeStream:
+    """Sequencing state of one recitation's delta stream, kept in the session"""
+
+    def __init__(self, last_seq=-1, segment=None, words=None, committed=None, last_result=None):
+        self.last_seq = last_seq
+        self.segment = segment
+        self.words = words or []
+        self.committed = committed or []
+        self.last_result = last_result
+
+    @classmethod
+    def from_state(cls, state):
+        if not state:
+            return cls()
+        return cls(**state)
+
+    def state(self):
+        return {
+            'last_seq': self.last_seq,
+            'segment': self.segment,
+            'words': self.words,
+            'committed': self.committed,
+            'last_result': self.last_result,
+        }
+
+    def receive(self, message):
+        """
+        Apply one client message.
+
+        Returns (action, words): DUPLICATE when there is nothing new to
+        evaluate, RESYNC when the client must resend the whole segment,
+        otherwise INTERIM or FINAL with the segment's full word list.
+        """
+        seq = int(message.get('seq', 0))
+        segment = int(message.get('segment', 0))
+        offset = int(message.get('offset', 0))
+        words = str(message.get('text', '')).split()
+
+        if message.get('final'):
+            if segment in self.committed:
+                return DUPLICATE, None
+            # Remember recent commits only; segment ids only grow
+            self.committed = (self.committed + [segment])[-32:]
+            self.last_seq = max(self.last_seq, seq)
+            if self.segment == segment:
+                self.segment, self.words = None, []
+            return FINAL, words
+
+        if seq <= self.last_seq or segment in self.committed:
+            return DUPLICATE, None
+        self.last_seq = seq
+
+        if segment != self.segment:
+            if offset:
+                return RESYNC, None
+            self.segment, self.words = segment, words
+        else:
+            if offset > len(self.words):
+                return RESYNC, None
+            self.words = self.words[:offset] + words
+        return INTERIM, list(self.words)
+
+
+def coalesce(pending, message):
+    """
+    The message that should wait in a session's mailbox (see admission.py)
+    when message arrives behind the interim message pending.
+
+    A newer interim of the same segment is merged into the pending one, so
+    the words of the delta that is dropped are not lost; an interim of a
+    new segment replaces it. A final keeps the pending interim only if it
+    belongs to a later segment, and returns None otherwise.
+    """
+    if message.get('v') != PROTOCOL_VERSION:
+        return pending
+    segment = int(message.get('segment', 0))
+    pending_segment = int(pending.get('segment', 0))
+    if message.get('final'):
+        return pending if pending_segment > segment else None
+    if segment != pending_segment:
+        return message
+
+    offset = int(message.get('offset', 0))
+    pending_offset = int(pending.get('offset', 0))
+    pending_words = str(pending.get('text', '')).split()
+    if not pending_offset <= offset <= pending_offset + len(pending_words):
+        # Either self-contained already, or out of step (the server will ask for a resync)
+        return message
+    words = pending_words[:offset - pending_offset] + str(message.get('text', '')).split()
+    return dict(message, offset=pending_offset, text=' '.join(words))
+
+
+# Stored by position in compact results; only append to this list
+ERROR_KINDS = ('incorrect', 'missing', 'extra')
+ERROR_KIND_IDS = {kind: i for i, kind in enumerate(ERROR_KINDS)}
+
+
+class RecitationError:
+    """
+    One realtime error, as kept in the session.
+
+    Only the spoken word is stored; the expected word is the word at
+    position in the surah's index.
+    """
+
+    __slots__ = ('kind', 'position', 'spoken', 'similarity', 'confusion', 'surah')
+
+    def __init__(self, kind, position, spoken, similarity, confusion, surah):
+        self.kind = kind                # index into ERROR_KINDS
+        self.position = position        # word offset within the surah
+        self.spoken = spoken            # normalized spoken word ('' for missing words)
+        self.similarity = similarity    # percent
+        self.confusion = confusion      # index into confusions.LABELS, or -1
+        self.surah = surah              # surah number
+
+    @classmethod
+    def from_error(cls, error, surah):
+        """Record of an aligner error dict (see aligner.py)"""
+        confusion = error.get('confusion')
+        return cls(ERROR_KIND_IDS[error['type']], error['position'], error['spoken'], error['similarity'],
+                   confusions.LABEL_IDS[confusion] if confusion else -1, error.get('surah', surah))
+
+    def __reduce__(self):
+        # Pickled as a plain tuple rather than a dict of slot names
+        return RecitationError, (self.kind, self.position, self.spoken, self.similarity, self.confusion,
+                                 self.surah)
+
+    def __repr__(self):
+        return (f"RecitationError({ERROR_KINDS[self.kind]!r}, surah={self.surah}, position={self.position}, "
+                f"spoken={self.spoken!r})")
+
+    def compact(self, surah):
+        """Positional form for compact results of a session on surah"""
+        row = [self.kind, self.position, self.spoken, self.similarity, self.confusion]
+        if self.surah != surah:
+            row.append(self.surah)
+        return row
+
+    def to_dict(self, surah_index):
+        """The error dict of the original schema, words looked up in the index of its surah"""
+        kind = ERROR_KINDS[self.kind]
+        expected = ''
+        if kind != 'extra' and surah_index is not None and self.position < surah_index.total_words:
+            expected = surah_index.words[self.position]
+        error = {
+            'position': self.position,
+            'spoken': self.spoken,
+            'expected': expected,
+            'type': kind,
+            'similarity': self.similarity,
+            'original_spoken': self.spoken,
+            'surah': self.surah,
+        }
+        if self.confusion >= 0:
+            error['confusion'] = confusions.LABELS[self.confusion]
+        if expected:
+            error['original_expected'] = surah_index.original_words[self.position] if surah_index.original_words else expected
+        return error
+
+
+# Keys of the original schema that compact results replace or leave to the client
+_DERIVED_KEYS = frozenset({'errors', 'current_position', 'suggestion', 'progress_percentage', 'total_words'})
+
+
+def encode_result(result, schema, surah, index_of):
+    """
+    JSON-ready form of a realtime result in the requested schema.
+
+    surah is the surah the session is on and index_of(number) returns the
+    SurahIndex that errors of the original schema look their words up in.
+    """
+    errors = result.get('errors', [])
+    if schema == COMPACT_SCHEMA:
+        encoded = {key: value for key, value in result.items() if key not in _DERIVED_KEYS}
+        encoded['schema'] = COMPACT_SCHEMA
+        encoded['p'] = result.get('current_position', 0)
+        encoded['e'] = [error.compact(surah) for error in errors]
+        if 'total_words' in result and encoded['p'] >= result['total_words']:
+            # Past the end the next words may come from the following surah, which the client does not have
+            encoded['suggestion'] = result.get('suggestion', '')
+        return encoded
+    if not errors:
+        return result
+    indexes = {}
+    encoded_errors = []
+    for error in errors:
+        if error.surah not in indexes:
+            indexes[error.surah] = index_of(error.surah)
+        encoded_errors.append(error.to_dict(indexes[error.surah]))
+    return dict(result, errors=encoded_errors)
+
+
+def wants_msgpack(accept_mimetypes):
+    """Whether a request's Accept header prefers MessagePack to JSON (and we can send it)"""
+    if msgpack is None:
+        return False
+    return accept_mimetypes.quality(MSGPACK_MIMETYPE) > accept_mimetypes.quality('application/json')
+
+
+def pack(encoded):
+    """MessagePack body of an encoded result"""
+    return msgpack.packb(encoded, use_bin_type=True)
@@ -0,0 +1,61 @@
+"""
+Paginated error groups of the recitation report.
+
+A full attempt at a long surah can have hundreds of errors, and /report
+used to render every one of them, grouped by type, before sending the
+first byte. The report now streams its header and summary first and lists
+errors grouped by ayah, GROUPS_PER_PAGE ayahs at a time: the first page is
+part of the page, later ones are fetched as JSON from /report/errors as the
+reader asks for them. Only one page of groups is ever built per request.
+
+A group is
+
+    {"ayah": 7, "errors": [difference, ...]}
+
+with the final analysis' differences (see analysis.py) in word order.
+"""
+
+GROUPS_PER_PAGE = 20
+ERROR_TYPES = ('incorrect', 'missing', 'extra')
+
+
+def _errors(analysis):
+    errors_by_type = analysis.get('errors_by_type') or {}
+    for error_type in ERROR_TYPES:
+        yield from errors_by_type.get(error_type, ())
+
+
+def _ayah(error, surah_index):
+    return surah_index.ayah_at(error.get('position', 0))
+
+
+def error_ayahs(analysis, surah_index):
+    """Sorted ayah numbers that have at least one error"""
+    return sorted({_ayah(error, surah_index) for error in _errors(analysis)})
+
+
+def error_page(analysis, surah_index, page=1, per_page=GROUPS_PER_PAGE):
+    """
+    One page of ayah groups: {"page", "pages", "next_page", "groups"}.
+
+    next_page is None on the last page; pages past it are empty.
+    """
+    ayahs = error_ayahs(analysis, surah_index)
+    pages = max((len(ayahs) + per_page - 1) // per_page, 1)
+    page = max(page, 1)
+    page_ayahs = ayahs[(page - 1) * per_page:page * per_page]
+
+    groups = {ayah: [] for ayah in page_ayahs}
+    if groups:
+        for error in _errors(analysis):
+            group = groups.get(_ayah(error, surah_index))
+            if group is not None:
+                group.append(error)
+    return {
+        'page': page,
+        'pages': pages,
+        'next_page': page + 1 if page < pages else None,
+        'groups': [{'ayah': ayah, 'errors': sorted(groups[ayah], key=lambda error: error.get('position', 0))}
+                   for ayah in page_ayahs],
+    }
+
@@ -0,0 +1,195 @@
+"""
+Server-side session storage.
+
+The browser cookie only carries a random session id; everything else
+(selected surah number, position, realtime errors, analysis results) lives
+in a pluggable store on the server. Two backends are provided:
+
+- MemorySessionStore: in-process LRU with a TTL, for single-process runs.
+- SQLiteSessionStore: a file-backed store that survives restarts and can be
+  shared by several worker processes on one host.
+
+Memory is the default for a single process and SQLite for several; the
+memory store is refused outright when several workers are configured.
+"""
+import os
+import pickle
+import secrets
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from flask.sessions import SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+
+DEFAULT_TTL = 6 * 60 * 60  # seconds
+DEFAULT_MAX_ENTRIES = 10000
+
+
+class MemorySessionStore:
+    """In-process LRU session store with a per-entry TTL"""
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, ttl=DEFAULT_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # sid -> (expires_at, data)
+        self._lock = threading.Lock()
+
+    def get(self, sid):
+        with self._lock:
+            entry = self._entries.get(sid)
+            if entry is None:
+                return None
+            expires_at, data = entry
+            if expires_at < time.monotonic():
+                del self._entries[sid]
+                return None
+            self._entries.move_to_end(sid)
+            return data
+
+    def set(self, sid, data):
+        with self._lock:
+            self._entries[sid] = (time.monotonic() + self.ttl, data)
+            self._entries.move_to_end(sid)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, sid):
+        with self._lock:
+            self._entries.pop(sid, None)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteSessionStore:
+    """File-backed session store; expired rows are pruned on write"""
+
+    PRUNE_EVERY = 200  # writes
+
+    def __init__(self, path, ttl=DEFAULT_TTL):
+        self.path = path
+        self.ttl = ttl
+        self._local = threading.local()
+        self._writes = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        connection = self._connection()
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "sid TEXT PRIMARY KEY, expires_at REAL NOT NULL, data BLOB NOT NULL)")
+        connection.execute("CREATE INDEX IF NOT EXISTS sessions_expires ON sessions(expires_at)")
+        connection.commit()
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5)
+            self._local.connection = connection
+        return connection
+
+    def get(self, sid):
+        row = self._connection().execute(
+            "SELECT data FROM sessions WHERE sid = ? AND expires_at >= ?",
+            (sid, time.time())).fetchone()
+        if row is None:
+            return None
+        return pickle.loads(row[0])
+
+    def set(self, sid, data):
+        connection = self._connection()
+        connection.execute(
+            "INSERT OR REPLACE INTO sessions (sid, expires_at, data) VALUES (?, ?, ?)",
+            (sid, time.time() + self.ttl, pickle.dumps(data, pickle.HIGHEST_PROTOCOL)))
+        self._writes += 1
+        if self._writes % self.PRUNE_EVERY == 0:
+            connection.execute("DELETE FROM sessions WHERE expires_at < ?", (time.time(),))
+        connection.commit()
+
+    def delete(self, sid):
+        connection = self._connection()
+        connection.execute("DELETE FROM sessions WHERE sid = ?", (sid,))
+        connection.commit()
+
+    def __len__(self):
+        return self._connection().execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+
+class ServerSession(CallbackDict, SessionMixin):
+    """Session dict that only tracks a server-side id in the cookie"""
+
+    def __init__(self, initial=None, sid=None, new=False):
+        def on_update(self):
+            self.modified = True
+
+        CallbackDict.__init__(self, initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.modified = False
+
+
+class ServerSideSessionInterface(SessionInterface):
+    """Flask session interface backed by one of the stores above"""
+
+    session_class = ServerSession
+
+    def __init__(self, store):
+        self.store = store
+
+    def _new_session(self):
+        return self.session_class(sid=secrets.token_urlsafe(32), new=True)
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if not sid:
+            return self._new_session()
+        data = self.store.get(sid)
+        if data is None:
+            return self._new_session()
+        return self.session_class(dict(data), sid=sid)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if not session:
+            if session.modified and not session.new:
+                self.store.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        if not (session.modified or session.new or self.should_set_cookie(app, session)):
+            return
+
+        self.store.set(session.sid, dict(session))
+        response.set_cookie(
+            name,
+            session.sid,
+            expires=self.get_expiration_time(app, session),
+            httponly=self.get_cookie_httponly(app),
+            domain=domain,
+            path=path,
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app),
+        )
+
+
+def default_session_backend(workers=1):
+    """The session backend to use when none is configured: memory is per process, so several workers share SQLite"""
+    return 'sqlite' if workers > 1 else 'memory'
+
+
+def create_session_store(backend, sqlite_path=None, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES, workers=1):
+    """Build a session store from configuration values, for a server running `workers` processes"""
+    if backend == 'sqlite':
+        return SQLiteSessionStore(sqlite_path, ttl=ttl)
+    if backend == 'memory':
+        if workers > 1:
+            raise ValueError(f"The memory session backend is per process and cannot serve {workers} workers; "
+                             "use SESSION_BACKEND=sqlite")
+        return MemorySessionStore(max_entries=max_entries, ttl=ttl)
+    raise ValueError(f"Unknown session backend: {backend}")
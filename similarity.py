@@ -0,0 +1,225 @@
+"""
+Fast similarity and alignment for Arabic words and transcripts.
+
+Replaces difflib.SequenceMatcher on the hot paths:
+
+- Word pairs are scored with a bit-parallel LCS (Hyyrö's formulation of the
+  Allison-Dix bit-vector algorithm), using Python ints as bit vectors. The
+  score is 2 * LCS / (len(a) + len(b)), the same formula SequenceMatcher's
+  ratio() approximates with its longest-block heuristic, so thresholds tuned
+  for the old ratio (0.8) still apply. When only the verdict is needed
+  (is_similar), pairs that cannot reach the cutoff are rejected from their
+  lengths alone.
+- Edit distances use Myers' bit-parallel Levenshtein on the same masks.
+- Whole transcripts are aligned word by word with Hirschberg's linear-memory
+  divide and conquer, where each half-row is computed with the same
+  bit-parallel LCS. The result uses SequenceMatcher's opcode format.
+"""
+from itertools import accumulate
+
+SIMILARITY_THRESHOLD = 0.8
+
+# Below this many DP cells the plain quadratic table is faster than recursion
+SMALL_ALIGNMENT_CELLS = 400
+
+
+def _pattern_masks(pattern):
+    """Bit mask of positions for each symbol of the pattern"""
+    masks = {}
+    bit = 1
+    for symbol in pattern:
+        masks[symbol] = masks.get(symbol, 0) | bit
+        bit <<= 1
+    return masks
+
+
+def _lcs_vector(masks, length, text):
+    """Run the bit-parallel LCS over text; zero bits of the result mark matched pattern positions"""
+    all_ones = (1 << length) - 1
+    vector = all_ones
+    for symbol in text:
+        matches = vector & masks.get(symbol, 0)
+        vector = ((vector + matches) | (vector - matches)) & all_ones
+    return vector
+
+
+def lcs_length(a, b):
+    """Length of the longest common subsequence of two sequences"""
+    if not a or not b:
+        return 0
+    if len(a) > len(b):
+        a, b = b, a
+    vector = _lcs_vector(_pattern_masks(a), len(a), b)
+    return len(a) - bin(vector).count('1')
+
+
+def levenshtein(a, b):
+    """Edit distance of two sequences, with Myers' bit-parallel algorithm"""
+    if len(a) < len(b):
+        a, b = b, a
+    length = len(b)
+    if length == 0:
+        return len(a)
+    masks = _pattern_masks(b)
+    all_ones = (1 << length) - 1
+    last = 1 << (length - 1)
+    positive, negative = all_ones, 0
+    distance = length
+    for symbol in a:
+        matches = masks.get(symbol, 0)
+        vertical = matches | negative
+        horizontal = ((((matches & positive) + positive) & all_ones) ^ positive) | matches
+        plus = negative | (~(horizontal | positive) & all_ones)
+        minus = positive & horizontal
+        if plus & last:
+            distance += 1
+        elif minus & last:
+            distance -= 1
+        plus = ((plus << 1) | 1) & all_ones
+        minus = (minus << 1) & all_ones
+        positive = minus | (~(vertical | plus) & all_ones)
+        negative = plus & vertical
+    return distance
+
+
+def ratio(a, b):
+    """2 * LCS / (len(a) + len(b)), comparable to SequenceMatcher.ratio()"""
+    total = len(a) + len(b)
+    if total == 0:
+        return 1.0
+    if a == b:
+        return 1.0
+    return 2.0 * lcs_length(a, b) / total
+
+
+def is_similar(a, b, cutoff=SIMILARITY_THRESHOLD):
+    """
+    Whether two normalized words score at least cutoff.
+
+    Pairs whose lengths alone keep them below cutoff are rejected without
+    computing their LCS.
+    """
+    if a == b:
+        return True
+    total = len(a) + len(b)
+    # The best ratio words of these lengths can reach
+    if 2.0 * min(len(a), len(b)) / total < cutoff:
+        return False
+    return 2.0 * lcs_length(a, b) / total >= cutoff
+
+
+def word_similarity(a, b, cutoff=SIMILARITY_THRESHOLD):
+    """Return (is_similar, score) for two normalized words"""
+    if a == b:
+        return True, 1.0
+    total = len(a) + len(b)
+    score = 2.0 * lcs_length(a, b) / total
+    return score >= cutoff, score
+
+
+def batch_similarity(word, candidates, cutoff=SIMILARITY_THRESHOLD):
+    """Score one word against many candidates, building its bit masks only once"""
+    results = []
+    masks = _pattern_masks(word)
+    length = len(word)
+    for candidate in candidates:
+        if candidate == word:
+            results.append((True, 1.0))
+            continue
+        total = length + len(candidate)
+        if length == 0:
+            score = 0.0
+        else:
+            vector = _lcs_vector(masks, length, candidate)
+            score = 2.0 * (length - bin(vector).count('1')) / total
+        results.append((score >= cutoff, score))
+    return results
+
+
+def _lcs_row(a, b):
+    """LCS(a[:i], b) for every i in 0..len(a), in linear memory"""
+    length = len(a)
+    if length == 0:
+        return [0]
+    vector = _lcs_vector(_pattern_masks(a), length, b)
+    # Bit i (lowest first) is 0 when a[i] is matched; count matches per prefix
+    bits = format(vector, f'0{length}b')[::-1]
+    return [0] + list(accumulate(1 if bit == '0' else 0 for bit in bits))
+
+
+def _small_alignment(a, b, a_offset, b_offset, pairs):
+    """Quadratic LCS table with backtracking, for small sub-problems"""
+    rows = [[0] * (len(b) + 1) for _ in range(len(a) + 1)]
+    for i in range(len(a) - 1, -1, -1):
+        row, below = rows[i], rows[i + 1]
+        for j in range(len(b) - 1, -1, -1):
+            if a[i] == b[j]:
+                row[j] = below[j + 1] + 1
+            else:
+                row[j] = max(below[j], row[j + 1])
+    i = j = 0
+    while i < len(a) and j < len(b):
+        if a[i] == b[j]:
+            pairs.append((a_offset + i, b_offset + j))
+            i += 1
+            j += 1
+        elif rows[i + 1][j] >= rows[i][j + 1]:
+            i += 1
+        else:
+            j += 1
+
+
+def _hirschberg(a, b, a_offset, b_offset, pairs):
+    # Common ends are matched directly; recitations are mostly equal runs
+    prefix = 0
+    limit = min(len(a), len(b))
+    while prefix < limit and a[prefix] == b[prefix]:
+        prefix += 1
+    suffix = 0
+    while suffix < limit - prefix and a[len(a) - 1 - suffix] == b[len(b) - 1 - suffix]:
+        suffix += 1
+    pairs.extend((a_offset + k, b_offset + k) for k in range(prefix))
+    a_end, b_end = len(a) - suffix, len(b) - suffix
+    a, b = a[prefix:a_end], b[prefix:b_end]
+
+    if a and b:
+        if len(a) * len(b) <= SMALL_ALIGNMENT_CELLS or len(b) == 1:
+            _small_alignment(a, b, a_offset + prefix, b_offset + prefix, pairs)
+        else:
+            middle = len(b) // 2
+            forward = _lcs_row(a, b[:middle])
+            backward = _lcs_row(a[::-1], b[:middle - 1:-1])
+            length = len(a)
+            split = max(range(length + 1), key=lambda i: forward[i] + backward[length - i])
+            _hirschberg(a[:split], b[:middle], a_offset + prefix, b_offset + prefix, pairs)
+            _hirschberg(a[split:], b[middle:], a_offset + prefix + split, b_offset + prefix + middle, pairs)
+
+    pairs.extend((a_offset + a_end + k, b_offset + b_end + k) for k in range(suffix))
+
+
+def matching_pairs(a, b):
+    """Index pairs (i, j) of one longest common subsequence of a and b"""
+    pairs = []
+    _hirschberg(a, b, 0, 0, pairs)
+    return pairs
+
+
+def get_opcodes(a, b):
+    """Align two sequences and return SequenceMatcher-style (tag, i1, i2, j1, j2) opcodes"""
+    opcodes = []
+    i = j = 0
+    for match_i, match_j in matching_pairs(a, b) + [(len(a), len(b))]:
+        if i < match_i and j < match_j:
+            opcodes.append(('replace', i, match_i, j, match_j))
+        elif i < match_i:
+            opcodes.append(('delete', i, match_i, j, j))
+        elif j < match_j:
+            opcodes.append(('insert', i, i, j, match_j))
+        if match_i < len(a):
+            if opcodes and opcodes[-1][0] == 'equal':
+                tag, i1, _, j1, _ = opcodes.pop()
+                opcodes.append(('equal', i1, match_i + 1, j1, match_j + 1))
+            else:
+                opcodes.append(('equal', match_i, match_i + 1, match_j, match_j + 1))
+        i, j = match_i + 1, match_j + 1
+    return opcodes
@@ -0,0 +1,271 @@
+/*
+ * Client-side realtime checking (see word_pack.py).
+ *
+ * WordNormalizer gives the same words as arabic_normalizer.ArabicNormalizer
+ * from the table of a word pack; normalizer_cases.json holds the cases both
+ * are checked against (python word_pack.py check). WordMatcher is a port of
+ * aligner.StreamingAligner with the same move costs and window. Words count
+ * as similar by the same LCS ratio as similarity.word_similarity; errors are
+ * not labelled with the kind of confusion (see confusions.py), which the
+ * server's final analysis does.
+ */
+(function (exports) {
+    'use strict';
+
+    const TATWEEL = 'ـ';
+    // Characters str.isspace() accepts, which str.split() splits on
+    const SPACE = '[\\t\\n\\v\\f\\r \\x1c-\\x1f\\x85\\xa0\\u1680\\u2000-\\u200a\\u2028\\u2029\\u202f\\u205f\\u3000]';
+    const SPACES = new RegExp(SPACE + '+', 'u');
+    // VERSE_NUMBER_OR_DIGITS: Python's \d and \s are Unicode-aware
+    const VERSE_NUMBER_OR_DIGITS = new RegExp('\\(' + SPACE + '*\\p{Nd}+' + SPACE + '*\\)|\\p{Nd}+', 'gu');
+
+    const SIMILARITY_THRESHOLD = 0.8;
+
+    class WordNormalizer {
+        constructor(pack) {
+            this.table = new Map(Object.entries(pack.table));
+            this.ranges = pack.ranges;
+            this.mappings = pack.mappings;
+            // Python's unicodedata.combining() != 0, which \p{M} is not
+            this.combining = pack.combining;
+            this.cache = new Map();
+        }
+
+        isCombining(char) {
+            const codepoint = char.codePointAt(0);
+            let low = 0;
+            let high = this.combining.length;
+            while (low < high) {
+                const middle = (low + high) >> 1;
+                if (this.combining[middle][1] <= codepoint) low = middle + 1;
+                else high = middle;
+            }
+            return low < this.combining.length && this.combining[low][0] <= codepoint;
+        }
+
+        // Code points outside the pack's ranges, resolved like _TranslationTable.__missing__
+        resolve(char) {
+            const codepoint = char.codePointAt(0);
+            for (const [start, stop] of this.ranges) {
+                if (codepoint >= start && codepoint < stop) return char;
+            }
+            let value = '';
+            for (const part of char.normalize('NFKD')) {
+                if (!this.isCombining(part)) value += this.mappings[part] || part;
+            }
+            value = value.split(TATWEEL).join('');
+            this.table.set(char, value);
+            return value;
+        }
+
+        normalize(text) {
+            if (!text) return '';
+            let translated = '';
+            for (const char of text) {
+                const value = this.table.get(char);
+                translated += value !== undefined ? value : this.resolve(char);
+            }
+            translated = translated.replace(VERSE_NUMBER_OR_DIGITS, '');
+            return splitWords(translated).join(' ').normalize('NFKC');
+        }
+
+        normalizeWords(text) {
+            const words = [];
+            for (const token of splitWords(text)) {
+                let normalized = this.cache.get(token);
+                if (normalized === undefined) {
+                    normalized = this.normalize(token);
+                    this.cache.set(token, normalized);
+                }
+                if (normalized) words.push(...splitWords(normalized));
+            }
+            return words;
+        }
+    }
+
+    function splitWords(text) {
+        return text.split(SPACES).filter(Boolean);
+    }
+
+    function lcsLength(a, b) {
+        let previous = new Array(b.length + 1).fill(0);
+        for (let i = 0; i < a.length; i++) {
+            const current = [0];
+            for (let j = 0; j < b.length; j++) {
+                current.push(a[i] === b[j] ? previous[j] + 1 : Math.max(previous[j + 1], current[j]));
+            }
+            previous = current;
+        }
+        return previous[b.length];
+    }
+
+    // [isSimilar, score] like similarity.word_similarity
+    function wordSimilarity(a, b, cutoff = SIMILARITY_THRESHOLD) {
+        if (a === b) return [true, 1.0];
+        a = Array.from(a);
+        b = Array.from(b);
+        const total = a.length + b.length;
+        if (total === 0) return [true, 1.0];
+        const score = 2.0 * lcsLength(a, b) / total;
+        return [score >= cutoff, score];
+    }
+
+    // Move costs and window of aligner.py
+    const EXTRA_COST = 1.0;
+    const SKIP_COST = 0.9;
+    const SIMILAR_COST = 0.3;
+    const MISMATCH_COST = 1.0;
+    const JUMP_AHEAD_COST = 2.5;
+    const JUMP_BACK_COST = 0.9;
+    const LOOK_BEHIND = 32;
+    const LOOK_AHEAD = 48;
+    const ALIGN = 0, EXTRA = 1, SKIP = 2, JUMP = 3;
+
+    class WordMatcher {
+        constructor(words, position = 0) {
+            this.words = words;
+            this.position = Math.min(Math.max(position, 0), words.length);
+            this.lo = this.position;
+            this.row = [0.0];
+        }
+
+        state() {
+            return { position: this.position, lo: this.lo, row: this.row.slice() };
+        }
+
+        restore(state) {
+            this.position = state.position;
+            this.lo = state.lo;
+            this.row = state.row.slice();
+        }
+
+        substitutionCosts(word, lo, hi) {
+            const costs = lo === 0 ? [Infinity] : [];
+            const wordCosts = new Map();
+            for (let k = Math.max(lo - 1, 0); k < hi; k++) {
+                const expected = this.words[k];
+                let cost = wordCosts.get(expected);
+                if (cost === undefined) {
+                    cost = word === expected ? 0.0 : wordSimilarity(word, expected)[0] ? SIMILAR_COST : MISMATCH_COST;
+                    wordCosts.set(expected, cost);
+                }
+                costs.push(cost);
+            }
+            return costs;
+        }
+
+        advance(word) {
+            const previous = this.position;
+            const lo = Math.max(0, previous - LOOK_BEHIND);
+            const hi = Math.min(this.words.length, previous + LOOK_AHEAD);
+            const bestOld = Math.min(...this.row);
+            const jumpFrom = this.lo + this.row.indexOf(bestOld);
+            const subCosts = this.substitutionCosts(word, lo, hi);
+
+            // Previous row over cells [lo - 1, hi]
+            const old = new Array(hi - lo + 2).fill(Infinity);
+            const shift = this.lo - lo + 1;
+            for (let i = Math.max(shift, 0); i < Math.min(shift + this.row.length, old.length); i++) {
+                old[i] = this.row[i - shift];
+            }
+
+            const costs = [];
+            const moves = [];
+            for (let i = 0, k = lo; k <= hi; i++, k++) {
+                let cost = old[i + 1] + EXTRA_COST;
+                let move = EXTRA;
+                const diagonal = old[i] + subCosts[i];
+                if (diagonal < cost) {
+                    cost = diagonal;
+                    move = ALIGN;
+                }
+                const jump = bestOld + subCosts[i] + (k - 1 < jumpFrom ? JUMP_BACK_COST : JUMP_AHEAD_COST);
+                if (jump < cost) {
+                    cost = jump;
+                    move = JUMP;
+                }
+                costs.push(cost);
+                moves.push(move);
+            }
+            for (let i = 1; i < costs.length; i++) {
+                const skipped = costs[i - 1] + SKIP_COST;
+                if (skipped < costs[i]) {
+                    costs[i] = skipped;
+                    moves[i] = SKIP;
+                }
+            }
+
+            const floor = Math.min(...costs);
+            this.lo = lo;
+            this.row = costs.map(cost => cost - floor);
+            let best = -1;
+            costs.forEach((cost, i) => {
+                if (cost === floor && (best < 0 || Math.abs(lo + i - previous - 1) < Math.abs(lo + best - previous - 1))) {
+                    best = i;
+                }
+            });
+            this.position = lo + best;
+            return { lo: lo, moves: moves, jumpFrom: jumpFrom, subCosts: subCosts };
+        }
+
+        // Align spoken words and return errors shaped like the server's realtime errors
+        feed(spokenWords) {
+            const start = this.position;
+            const traces = spokenWords.map(word => [word, this.advance(word)]);
+
+            const errors = [];
+            let k = this.position;
+            for (let t = traces.length - 1; t >= 0; t--) {
+                const [word, trace] = traces[t];
+                let i = k - trace.lo;
+                while (trace.moves[i] === SKIP) {
+                    errors.push(this.error('missing', k - 1));
+                    k--;
+                    i--;
+                }
+                const move = trace.moves[i];
+                if (move === EXTRA) {
+                    errors.push(this.error('extra', k, word));
+                    continue;
+                }
+                if (trace.subCosts[i] === MISMATCH_COST) {
+                    const similarity = wordSimilarity(word, this.words[k - 1])[1];
+                    errors.push(this.error('incorrect', k - 1, word, similarity));
+                }
+                if (move === JUMP) {
+                    for (let skipped = k - 2; skipped >= trace.jumpFrom; skipped--) {
+                        errors.push(this.error('missing', skipped));
+                    }
+                    k = trace.jumpFrom;
+                } else {
+                    k--;
+                }
+            }
+            for (let skipped = k - 1; skipped >= start; skipped--) {
+                errors.push(this.error('missing', skipped));
+            }
+            return errors.reverse();
+        }
+
+        error(type, position, spoken = '', similarity = 0.0) {
+            const expected = type !== 'extra' && position < this.words.length ? this.words[position] : '';
+            return {
+                type: type,
+                position: position,
+                spoken: spoken,
+                expected: expected,
+                similarity: Math.round(similarity * 1000) / 10
+            };
+        }
+
+        // Like WordIndexMixin.expected_words
+        expectedWords(position, count) {
+            if (position >= this.words.length) return 'End of Surah';
+            return this.words.slice(Math.max(position, 0), position + count).join(' ');
+        }
+    }
+
+    exports.WordNormalizer = WordNormalizer;
+    exports.WordMatcher = WordMatcher;
+    exports.wordSimilarity = wordSimilarity;
+})(typeof module !== 'undefined' ? module.exports : (window.wordMatcher = {}));
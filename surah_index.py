@@ -0,0 +1,121 @@
+"""
+Precompiled per-surah word index.
+
+A SurahIndex is built once per surah when the corpus loads. It keeps the
+normalized word array next to the original-script words and their ayah
+numbers, so the realtime path only needs to slice a small window around
+the reciter's position instead of re-normalizing the whole surah.
+"""
+
+
+def build_full_text(surah_data):
+    """Concatenate all ayahs with their verse numbers, as shown on the recite page"""
+    ayahs = surah_data.get('ayahs', [])
+    full_text = ""
+
+    if surah_data['number'] == 1 and len(ayahs) > 0:
+        # For Al-Fatiha, handle Bismillah separately
+        full_text += ayahs[0]['text'] + "\n"
+        for idx, ayah in enumerate(ayahs[1:], start=1):
+            full_text += ayah['text'] + f" ({idx}) "
+    else:
+        for idx, ayah in enumerate(ayahs, start=1):
+            full_text += ayah['text'] + f" ({idx}) "
+
+    return full_text.strip()
+
+
+class WordIndexMixin:
+    """
+    Lookups shared by every surah index implementation.
+
+    Subclasses provide number, words, original_words, word_ayahs,
+    ayah_offsets, total_words, full_text and normalized_text, and may
+    provide ids, the vocabulary ids of the words (see vocabulary.py).
+    """
+
+    __slots__ = ()
+
+    # Only indexes over a mapped corpus image have vocabulary ids
+    ids = None
+
+    def window(self, position, size):
+        """Normalized words in [position, position + size)"""
+        if position < 0:
+            position = 0
+        return self.words[position:position + size]
+
+    def expected_words(self, position, num_words=5):
+        """Space-joined normalized words starting at position"""
+        if position >= self.total_words:
+            return "End of Surah"
+        return ' '.join(self.window(position, num_words))
+
+    def ayah_at(self, position):
+        """Ayah number (numberInSurah) of the word at position"""
+        if not self.word_ayahs:
+            return None
+        position = min(max(position, 0), self.total_words - 1)
+        return self.word_ayahs[position]
+
+    def ayah_words(self, ayah_idx):
+        """Normalized words of the ayah at zero-based index ayah_idx"""
+        return self.words[self.ayah_offsets[ayah_idx]:self.ayah_offsets[ayah_idx + 1]]
+
+    @property
+    def ayah_count(self):
+        return len(self.ayah_offsets) - 1
+
+
+class SurahIndex(WordIndexMixin):
+    """Immutable normalized word index for a single surah"""
+
+    __slots__ = ('number', 'words', 'original_words', 'word_ayahs',
+                 'ayah_offsets', 'total_words', 'full_text', 'normalized_text')
+
+    def __init__(self, number, words, original_words, word_ayahs, ayah_offsets, full_text):
+        set_ = object.__setattr__
+        set_(self, 'number', number)
+        set_(self, 'words', tuple(words))
+        set_(self, 'original_words', tuple(original_words))
+        set_(self, 'word_ayahs', tuple(word_ayahs))
+        set_(self, 'ayah_offsets', tuple(ayah_offsets))
+        set_(self, 'total_words', len(self.words))
+        set_(self, 'full_text', full_text)
+        set_(self, 'normalized_text', ' '.join(self.words))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("SurahIndex is immutable")
+
+    def __reduce__(self):
+        # Rebuild through __init__, since attributes cannot be set one by one
+        return (SurahIndex, (self.number, self.words, self.original_words, self.word_ayahs,
+                             self.ayah_offsets, self.full_text))
+
+    @classmethod
+    def build(cls, surah_data, normalize):
+        """
+        Build the index from API-shaped surah data.
+
+        Each original token is normalized on its own so it stays paired with
+        its display form; tokens that normalize to nothing (pause marks,
+        stray diacritics) are dropped exactly as the full-text normalizer
+        drops them.
+        """
+        words = []
+        original_words = []
+        word_ayahs = []
+        ayah_offsets = []
+
+        for ayah in surah_data.get('ayahs', []):
+            ayah_offsets.append(len(words))
+            ayah_number = ayah.get('numberInSurah', len(ayah_offsets))
+            for token in ayah['text'].split():
+                for word in normalize(token).split():
+                    words.append(word)
+                    original_words.append(token)
+                    word_ayahs.append(ayah_number)
+        ayah_offsets.append(len(words))
+
+        return cls(surah_data['number'], words, original_words, word_ayahs,
+                   ayah_offsets, build_full_text(surah_data))
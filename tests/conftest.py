@@ -0,0 +1,95 @@
+"""
+Shared fixtures.
+
+The app loads its corpus when it is imported, so a small corpus dump is
+written and the environment pointed at it (and at a scratch instance
+directory) before any test imports app.py.
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from quran_corpus import write_corpus  # noqa: E402
+
+# A few short surahs with distinct text, so located positions are unambiguous
+SURAHS = [
+    (1, "سورة الفاتحة", "Al-Faatiha", [
+        "بِسْمِ ٱللَّهِ ٱلرَّحْمَٰنِ ٱلرَّحِيمِ",
+        "ٱلْحَمْدُ لِلَّهِ رَبِّ ٱلْعَٰلَمِينَ",
+        "ٱلرَّحْمَٰنِ ٱلرَّحِيمِ",
+        "مَٰلِكِ يَوْمِ ٱلدِّينِ",
+        "إِيَّاكَ نَعْبُدُ وَإِيَّاكَ نَسْتَعِينُ",
+        "ٱهْدِنَا ٱلصِّرَٰطَ ٱلْمُسْتَقِيمَ",
+        "صِرَٰطَ ٱلَّذِينَ أَنْعَمْتَ عَلَيْهِمْ غَيْرِ ٱلْمَغْضُوبِ عَلَيْهِمْ وَلَا ٱلضَّآلِّينَ",
+    ]),
+    (2, "سورة الكوثر", "Al-Kawthar", [
+        "إِنَّآ أَعْطَيْنَٰكَ ٱلْكَوْثَرَ",
+        "فَصَلِّ لِرَبِّكَ وَٱنْحَرْ",
+        "إِنَّ شَانِئَكَ هُوَ ٱلْأَبْتَرُ",
+    ]),
+    (3, "سورة الإخلاص", "Al-Ikhlaas", [
+        "قُلْ هُوَ ٱللَّهُ أَحَدٌ",
+        "ٱللَّهُ ٱلصَّمَدُ",
+        "لَمْ يَلِدْ وَلَمْ يُولَدْ",
+        "وَلَمْ يَكُن لَّهُۥ كُفُوًا أَحَدٌۢ",
+    ]),
+    (4, "سورة الفلق", "Al-Falaq", [
+        "قُلْ أَعُوذُ بِرَبِّ ٱلْفَلَقِ",
+        "مِن شَرِّ مَا خَلَقَ",
+        "وَمِن شَرِّ غَاسِقٍ إِذَا وَقَبَ",
+        "وَمِن شَرِّ ٱلنَّفَّٰثَٰتِ فِى ٱلْعُقَدِ",
+        "وَمِن شَرِّ حَاسِدٍ إِذَا حَسَدَ",
+    ]),
+]
+
+
+def api_surahs():
+    """SURAHS in the shape of the Quran API"""
+    surahs = []
+    ayah_number = 0
+    for number, name, english_name, ayahs in SURAHS:
+        rows = []
+        for number_in_surah, text in enumerate(ayahs, 1):
+            ayah_number += 1
+            rows.append({'number': ayah_number, 'numberInSurah': number_in_surah, 'text': text})
+        surahs.append({'number': number, 'name': name, 'englishName': english_name,
+                       'englishNameTranslation': '', 'revelationType': 'Meccan',
+                       'numberOfAyahs': len(rows), 'ayahs': rows})
+    return surahs
+
+
+_instance = tempfile.mkdtemp(prefix='lefqih-tests-')
+os.environ['QURAN_CORPUS_PATH'] = os.path.join(_instance, 'corpus.sqlite')
+os.environ['QURAN_API_FALLBACK'] = '0'
+os.environ['ARTIFACT_DIR'] = os.path.join(_instance, 'artifacts')
+os.environ['PROGRESS_DB_PATH'] = os.path.join(_instance, 'progress.sqlite')
+os.environ['QURAN_API_CACHE_DIR'] = os.path.join(_instance, 'api-cache')
+os.environ['SESSION_BACKEND'] = 'memory'
+write_corpus(os.environ['QURAN_CORPUS_PATH'], api_surahs())
+
+
+@pytest.fixture(scope='session')
+def lefqih():
+    """The app module, loaded on the test corpus"""
+    import app
+    return app
+
+
+@pytest.fixture
+def client(lefqih):
+    lefqih.app.config['TESTING'] = True
+    with lefqih.app.test_client() as client:
+        yield client
+
+
+@pytest.fixture
+def pool(lefqih):
+    """A two-process worker pool, forked after the app is loaded"""
+    import worker_pool
+    yield worker_pool.start(2)
+    worker_pool.shutdown()
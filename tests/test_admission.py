@@ -0,0 +1,106 @@
+import threading
+import time
+
+from admission import ADMITTED, COALESCED, SHED, RealtimeAdmission
+from realtime_protocol import coalesce
+
+
+def interim(seq, text, segment=0, offset=0):
+    return {'v': 2, 'seq': seq, 'segment': segment, 'final': False, 'offset': offset, 'text': text}
+
+
+def final(seq, text, segment=0):
+    return {'v': 2, 'seq': seq, 'segment': segment, 'final': True, 'offset': 0, 'text': text}
+
+
+class Waiter(threading.Thread):
+    """acquire() on a thread, since waiting requests block; returns once the message waits in the mailbox"""
+
+    def __init__(self, admission, key, message):
+        super().__init__(daemon=True)
+        self.admission, self.key, self.message = admission, key, message
+        self.result = None
+        self.start()
+        deadline = time.monotonic() + 2
+        while self.is_alive() and not self.queued() and time.monotonic() < deadline:
+            time.sleep(0.001)
+
+    def queued(self):
+        mailbox = self.admission._mailboxes.get(self.key)
+        if mailbox is None:
+            return False
+        if self.message['final']:
+            return bool(mailbox.finals)
+        return mailbox.pending is not None and mailbox.pending[0]['seq'] == self.message['seq']
+
+    def run(self):
+        self.result = self.admission.acquire(self.key, self.message, self.message['final'])
+
+
+def test_idle_session_is_admitted_at_once():
+    admission = RealtimeAdmission(coalesce=coalesce)
+    assert admission.acquire('a', interim(1, 'x'), False) == (ADMITTED, interim(1, 'x'))
+    admission.release('a')
+    assert admission.depth == 0
+
+
+def test_waiting_interims_are_coalesced_into_the_newest():
+    admission = RealtimeAdmission(coalesce=coalesce)
+    admission.acquire('a', interim(1, 'a'), False)
+    first = Waiter(admission, 'a', interim(2, 'b', offset=1))
+    second = Waiter(admission, 'a', interim(3, 'c', offset=2))
+    first.join(2)
+    assert first.result[0] == COALESCED
+
+    admission.release('a')
+    second.join(2)
+    # The words of the dropped delta are merged in, not lost
+    assert second.result == (ADMITTED, interim(3, 'b c', offset=1))
+    admission.release('a')
+    assert admission.counts() == {ADMITTED: 2, COALESCED: 1, SHED: 0}
+
+
+def test_final_drops_the_waiting_interim_of_its_segment():
+    admission = RealtimeAdmission(coalesce=coalesce)
+    admission.acquire('a', interim(1, 'a'), False)
+    stale = Waiter(admission, 'a', interim(2, 'a b'))
+    committed = Waiter(admission, 'a', final(3, 'a b c'))
+    stale.join(2)
+    assert stale.result[0] == COALESCED
+
+    admission.release('a')
+    committed.join(2)
+    assert committed.result == (ADMITTED, final(3, 'a b c'))
+    admission.release('a')
+
+
+def test_sessions_do_not_wait_for_each_other():
+    admission = RealtimeAdmission(coalesce=coalesce)
+    admission.acquire('a', interim(1, 'a'), False)
+    assert admission.acquire('b', interim(1, 'b'), False)[0] == ADMITTED
+    admission.release('a')
+    admission.release('b')
+
+
+def test_interims_are_shed_before_finals():
+    admission = RealtimeAdmission(shed_depth=2, max_depth=3, coalesce=coalesce)
+    admission.acquire('a', interim(1, 'a'), False)
+    admission.acquire('b', interim(1, 'b'), False)
+    assert admission.acquire('c', interim(1, 'c'), False)[0] == SHED
+    assert admission.acquire('c', final(2, 'c'), True)[0] == ADMITTED
+    assert admission.acquire('d', final(1, 'd'), True)[0] == SHED
+    for key in 'abc':
+        admission.release(key)
+    assert admission.depth == 0
+    assert admission.acquire('c', interim(3, 'c'), False)[0] == ADMITTED
+    admission.release('c')
+
+
+def test_waiting_final_is_shed_after_max_wait():
+    admission = RealtimeAdmission(max_wait=0.05, coalesce=coalesce)
+    admission.acquire('a', final(1, 'a'), True)
+    late = Waiter(admission, 'a', final(2, 'b', segment=1))
+    late.join(2)
+    assert late.result[0] == SHED
+    admission.release('a')
+    assert admission.depth == 0
@@ -0,0 +1,90 @@
+import random
+
+import pytest
+
+import confusions
+import similarity
+import vocabulary
+from aligner import StreamingAligner
+
+LETTERS = 'ابتثجحخدذرزسشصضطظعغفقكلمنهوي'
+
+
+def distinct_words(count, seed=1):
+    """Random words no two of which compare as similar"""
+    rng = random.Random(seed)
+    words = []
+    while len(words) < count:
+        word = ''.join(rng.choice(LETTERS) for _ in range(rng.randint(4, 6)))
+        if not any(similarity.word_similarity(word, other)[0] for other in words):
+            words.append(word)
+    return words
+
+
+WORDS = distinct_words(120)
+
+
+def feed(batches, words=WORDS, **kwargs):
+    aligner = StreamingAligner(words, confusions.compare_words, **kwargs)
+    results = []
+    for batch in batches:
+        errors = aligner.feed(batch)
+        results.append((aligner.position, [(error['type'], error['position']) for error in errors]))
+    return results
+
+
+def test_exact_recitation_has_no_errors():
+    assert feed([WORDS[:5], WORDS[5:8]]) == [(5, []), (8, [])]
+
+
+def test_short_skip_is_reported_as_missing_words():
+    assert feed([WORDS[:5], WORDS[7:12]])[-1] == (12, [('missing', 5), ('missing', 6)])
+
+
+def test_long_skip_reanchors_ahead():
+    position, errors = feed([WORDS[:5], WORDS[20:25]])[-1]
+    assert position == 25
+    assert errors == [('missing', k) for k in range(5, 20)]
+
+
+@pytest.mark.parametrize('batches', [
+    [WORDS[:6], WORDS[3:6], WORDS[6:9]],   # repeated in a later result
+    [WORDS[:6] + WORDS[3:9]],              # repeated within one result
+])
+def test_repeated_words_are_not_errors(batches):
+    results = feed(batches)
+    assert results[-1][0] == 9
+    assert all(not errors for _, errors in results)
+
+
+def test_extra_and_wrong_words():
+    assert feed([WORDS[:3] + ['زائد'] + WORDS[3:5]]) == [(5, [('extra', 3)])]
+    assert feed([WORDS[:3] + ['ظظظظظظ'] + WORDS[4:6]]) == [(6, [('incorrect', 3)])]
+
+
+def test_similar_word_is_accepted():
+    word = 'الصراط'
+    words = WORDS[:3] + [word] + WORDS[3:10]
+    misread = 'الصراتط'
+    assert similarity.word_similarity(misread, word)[0]
+    assert feed([words[:3] + [misread] + words[4:6]], words=words) == [(6, [])]
+
+
+def test_resumes_from_saved_state():
+    batches = [WORDS[:4], WORDS[4:9] + ['زائد'], WORDS[11:15], WORDS[12:18]]
+    continuous = feed(batches)
+    aligner = StreamingAligner(WORDS, confusions.compare_words)
+    resumed = []
+    for batch in batches:
+        errors = aligner.feed(batch)
+        resumed.append((aligner.position, [(error['type'], error['position']) for error in errors]))
+        aligner = StreamingAligner.from_state(WORDS, confusions.compare_words, dict(aligner.state()))
+    assert resumed == continuous
+
+
+def test_vocabulary_ids_give_the_same_alignment():
+    words = WORDS[:60]
+    vocab = vocabulary.Vocabulary.build(words)
+    ids = [vocab.ids[word] for word in words]
+    batches = [words[:5], words[7:12] + ['زائد'], words[9:14], words[30:33]]
+    assert feed(batches, words=words, ids=ids, vocabulary=vocab) == feed(batches, words=words)
@@ -0,0 +1,37 @@
+import pytest
+
+from arabic_normalizer import ArabicNormalizer
+from bench.normalizer import legacy_normalize
+from conftest import SURAHS
+
+CASES = [
+    '',
+    'بِسْمِ ٱللَّهِ ٱلرَّحْمَٰنِ ٱلرَّحِيمِ (1) ٱلْحَمْدُ لِلَّهِ ( 2 )',
+    'الرحمــــن',           # tatweel
+    'کتاب گل ی',            # Farsi letters
+    'ﻻ ﷲ ﭐ',               # presentation forms
+    'سورة 12 آية ٣',        # ASCII and Arabic-Indic digits
+    'café é',          # outside the precomputed blocks
+    '  قل\tهو\nالله  ',
+]
+
+
+@pytest.fixture(scope='module')
+def normalizations(lefqih):
+    return lefqih.qtc.arabic_normalizations
+
+
+@pytest.mark.parametrize('text', CASES + [ayah for _, _, _, ayahs in SURAHS for ayah in ayahs])
+def test_matches_the_legacy_pipeline(normalizations, text):
+    normalizer = ArabicNormalizer(normalizations)
+    assert normalizer.normalize(text) == legacy_normalize(text, normalizations)
+    assert normalizer.normalize_words(text) == [
+        word for token in text.split() for word in legacy_normalize(token, normalizations).split()]
+
+
+def test_tokens_are_cached(normalizations):
+    normalizer = ArabicNormalizer(normalizations, cache_size=16)
+    normalizer.normalize_words('قل هو الله احد')
+    normalizer.normalize_words('الله الصمد')
+    info = normalizer.cache_info()
+    assert (info.hits, info.misses) == (1, 5)
@@ -0,0 +1,38 @@
+import pytest
+
+pytest.importorskip('a2wsgi')
+
+from asgi import RecitationChannel  # noqa: E402
+
+
+def open_channel(client, lefqih):
+    response = client.post('/start', data={'surah_number': '3'})
+    sid = response.headers['Set-Cookie'].split(';')[0].split('=', 1)[1]
+    client.post('/start_realtime_session')
+    store = lefqih.app.session_interface.store
+    return store, RecitationChannel(store, sid, dict(store.get(sid)))
+
+
+def recite(channel, text):
+    return channel.handle({'type': 'transcript', 'text': text})
+
+
+def test_reset_restarts_an_open_channel(client, lefqih):
+    store, channel = open_channel(client, lefqih)
+    assert recite(channel, 'قل هو الله احد الله زائد')['errors']
+
+    client.post('/reset_session')
+    reply = recite(channel, 'قل هو')
+    assert reply['current_position'] == 2 and reply['errors'] == []
+    # Nothing of the recitation before the reset is written back
+    assert not store.get(channel.sid).get('realtime_errors')
+
+
+def test_a_result_for_the_old_recitation_is_not_saved(client, lefqih):
+    store, channel = open_channel(client, lefqih)
+    recite(channel, 'قل هو')
+    assert channel.reload()
+    channel.state['current_position'] = 9
+    client.post('/start_realtime_session')
+    channel.save()
+    assert store.get(channel.sid)['current_position'] == 0
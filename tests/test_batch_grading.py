@@ -0,0 +1,42 @@
+import json
+
+import batch_grading
+
+LINES = [
+    json.dumps({'student': 'Amina', 'surah': 3, 'transcript': 'قل هو الله احد الله الصمد'}),
+    json.dumps({'student': 'Yusuf', 'surah': 999, 'transcript': 'قل هو الله احد'}),
+    'not json',
+    json.dumps({'surah': 2, 'transcript': ''}),
+    json.dumps({'student': 'Maryam', 'surah': 2, 'transcript': 'انا اعطيناك الكوثر فصل لربك وانحر'}),
+]
+
+
+def grade(lefqih, parallel=True):
+    return list(batch_grading.grade_lines(enumerate(LINES, start=1), lefqih.grade_transcript, parallel))
+
+
+def test_grades_lines_in_order(lefqih):
+    results = grade(lefqih)
+    assert [result['line'] for result in results] == [1, 2, 3, 4, 5]
+    assert results[0]['analysis']['spoken_words'] == 6
+    assert results[1]['error'] == 'Unknown surah 999'
+    assert results[2]['error'].startswith('Invalid JSON')
+    assert results[3]['error'] == 'Missing transcript'
+    assert results[4]['analysis']['error_counts']['missing'] == 4
+
+
+def test_pool_gives_the_same_results(lefqih, pool):
+    def comparable(results):
+        for result in results:
+            result.get('analysis', {}).pop('timestamp', None)
+        return results
+
+    assert comparable(grade(lefqih)) == comparable(grade(lefqih, parallel=False))
+
+
+def test_batch_analysis_route(client):
+    response = client.post('/batch_analysis', data='\n'.join(LINES[:2]).encode('utf-8'))
+    results = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [result['line'] for result in results] == [1, 2]
+    assert 'analysis' in results[0] and 'error' in results[1]
+
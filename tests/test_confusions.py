@@ -0,0 +1,34 @@
+import confusions
+import vocabulary
+
+WORDS = ['رحمه', 'رحمت', 'سماء', 'سما', 'رحمها', 'قال', 'الذين']
+
+
+def test_label_does_not_make_words_similar():
+    # ta marbuta read as ta: a 0.75 ratio stays an error, labelled for the suggestion
+    assert confusions.compare_words('رحمت', 'رحمه') == (False, 0.75)
+    assert confusions.classify('رحمت', 'رحمه') == 'ta_marbuta'
+
+
+def test_index_agrees_with_pairwise_comparison():
+    index = confusions.ConfusionIndex.build(WORDS)
+    pairs = [(spoken, expected) for spoken in WORDS for expected in WORDS]
+    pairwise = {pair: (confusions.compare_words(*pair), confusions.classify(*pair)) for pair in pairs}
+    previous = confusions.get_index()
+    confusions.set_index(index)
+    try:
+        for pair in pairs:
+            is_similar, score = confusions.compare_words(*pair)
+            assert is_similar == pairwise[pair][0][0]
+            assert abs(score - pairwise[pair][0][1]) < 1e-3
+            assert confusions.classify(*pair) == pairwise[pair][1]
+    finally:
+        confusions.set_index(previous)
+
+
+def test_vocabulary_similarity_follows_the_threshold():
+    vocab = vocabulary.Vocabulary.build(WORDS)
+    for spoken in WORDS:
+        similar = {vocab.words[i] for i in vocab.similar_to(vocab.ids[spoken])}
+        assert similar == {expected for expected in WORDS
+                           if expected != spoken and confusions.compare_words(spoken, expected)[0]}
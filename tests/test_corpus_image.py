@@ -0,0 +1,47 @@
+import os
+
+import pytest
+
+from corpus_image import MappedSurahIndex
+from quran_corpus import SQLiteCorpusBackend
+from surah_index import SurahIndex
+
+
+@pytest.fixture(scope='module')
+def backend():
+    return SQLiteCorpusBackend(os.environ['QURAN_CORPUS_PATH'])
+
+
+def test_app_serves_the_mapped_image(lefqih):
+    assert lefqih.corpus.image is not None
+    assert isinstance(lefqih.corpus.get_index(1), MappedSurahIndex)
+
+
+@pytest.mark.parametrize('number', [1, 2, 3, 4])
+def test_mapped_index_matches_a_built_one(lefqih, backend, number):
+    mapped = lefqih.corpus.get_index(number)
+    built = SurahIndex.build(backend.load_surah(number), lefqih.corpus.normalize)
+    assert list(mapped.words) == list(built.words)
+    assert list(mapped.original_words) == list(built.original_words)
+    assert list(mapped.word_ayahs) == list(built.word_ayahs)
+    assert list(mapped.ayah_offsets) == list(built.ayah_offsets)
+    assert mapped.total_words == built.total_words
+    assert mapped.full_text == built.full_text
+    assert mapped.normalized_text == built.normalized_text
+    assert mapped.expected_words(2, 3) == built.expected_words(2, 3)
+
+
+def test_surahs_decode_from_the_image(lefqih, backend):
+    for number in (1, 4):
+        assert lefqih.corpus.get_surah(number) == backend.load_surah(number)
+
+
+def test_word_slices(lefqih):
+    words = lefqih.corpus.get_index(4).words
+    decoded = list(words)
+    assert words[1:4] == decoded[1:4]
+    assert words[::3] == decoded[::3]
+    assert words[5:2] == []
+    assert words[-1] == decoded[-1]
+    with pytest.raises(IndexError):
+        words[len(decoded)]
@@ -0,0 +1,49 @@
+import locator
+
+
+def surah_words(lefqih, number):
+    return list(lefqih.corpus.get_index(number).words)
+
+
+def test_locates_a_distinctive_passage(lefqih):
+    words = surah_words(lefqih, 4)
+    candidates = lefqih.corpus.get_locator().locate(words[4:12])
+    assert (candidates[0].surah, candidates[0].position) == (4, 4)
+    assert candidates[0].coverage == 1.0
+
+
+def test_locates_through_a_misheard_and_a_skipped_word(lefqih):
+    words = surah_words(lefqih, 1)
+    query = words[10:13] + ['زائد'] + words[13:16] + words[17:22]
+    best = lefqih.corpus.get_locator().locate(query)[0]
+    assert best.surah == 1 and abs(best.position - 10) <= locator.DRIFT
+
+
+def test_shingles_do_not_span_surahs():
+    index = locator.ShingleIndex.build([(1, ['a', 'b', 'c']), (2, ['d', 'e', 'f'])])
+    assert index.locate(['c', 'd']) == []
+    best = index.locate(['d', 'e', 'f'])[0]
+    assert (best.surah, best.position) == (2, 0)
+
+
+def test_locate_route(client, lefqih):
+    text = ' '.join(surah_words(lefqih, 2)[3:7])
+    candidates = client.get('/locate', query_string={'text': text}).get_json()['candidates']
+    assert (candidates[0]['surah'], candidates[0]['position']) == (2, 3)
+
+
+def test_locate_mode_seeds_the_session(client, lefqih):
+    client.post('/start', data={'surah_number': 'locate'})
+    client.post('/start_realtime_session')
+    words = surah_words(lefqih, 4)
+
+    result = client.post('/check_realtime', json={'text': ' '.join(words[8:10])}).get_json()
+    assert result['locating'] and result['heard_words'] == 2
+
+    result = client.post('/check_realtime', json={'text': ' '.join(words[10:16])}).get_json()
+    assert result['located']['surah'] == 4
+    assert result['current_position'] == 16
+    assert result['errors'] == []
+    with client.session_transaction() as state:
+        assert state['surah_number'] == 4
+        assert 'locate_words' not in state
@@ -0,0 +1,14 @@
+import re
+
+
+def stage_count(client, name):
+    text = client.get('/metrics').get_data(as_text=True)
+    match = re.search(r'^lefqih_stage_seconds_count\{stage="%s"\} (\S+)$' % name, text, re.M)
+    return float(match.group(1)) if match else 0.0
+
+
+def test_corpus_lookups_are_timed(client, lefqih):
+    client.post('/start', data={'surah_number': '3'})
+    before = stage_count(client, 'corpus')
+    lefqih.current_surah_index({'surah_number': 3})
+    assert stage_count(client, 'corpus') == before + 1
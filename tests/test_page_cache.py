@@ -0,0 +1,55 @@
+import gzip
+
+from page_cache import PageCache
+
+
+def test_surah_list_revalidates_with_its_etag(client):
+    page = client.get('/')
+    etag = page.headers['ETag']
+    assert page.status_code == 200 and page.headers['Cache-Control'] == 'no-cache'
+
+    again = client.get('/', headers={'If-None-Match': etag})
+    assert again.status_code == 304 and again.data == b''
+    assert again.headers['ETag'] == etag
+
+
+def test_compressed_variant(client):
+    plain = client.get('/')
+    compressed = client.get('/', headers={'Accept-Encoding': 'gzip'})
+    assert compressed.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(compressed.data) == plain.data
+    assert compressed.headers['ETag'] != plain.headers['ETag']
+    assert 'Accept-Encoding' in compressed.headers['Vary']
+
+
+def test_recite_page_is_shared_per_surah(lefqih):
+    etags = []
+    for surah_number in ('3', '3', '4'):
+        with lefqih.app.test_client() as client:
+            client.post('/start', data={'surah_number': surah_number})
+            response = client.get('/recite')
+            assert response.status_code == 200 and 'Cookie' in response.headers['Vary']
+            etags.append(response.headers['ETag'])
+    assert etags[0] == etags[1] != etags[2]
+
+
+def test_template_or_corpus_changes_miss_the_cache(tmp_path):
+    template = tmp_path / 'page.html'
+    template.write_text('v1')
+    version = ['corpus-1']
+    cache = PageCache(str(tmp_path), lambda: version[0])
+    renders = []
+
+    def render():
+        renders.append(1)
+        return 'body'
+
+    cache.get('page.html', 1, render)
+    cache.get('page.html', 1, render)
+    assert len(renders) == 1
+    template.write_text('v2 longer')
+    cache.get('page.html', 1, render)
+    version[0] = 'corpus-2'
+    cache.get('page.html', 1, render)
+    assert len(renders) == 3
+    assert cache.cache_info().hits == 1
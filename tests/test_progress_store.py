@@ -0,0 +1,92 @@
+import pytest
+
+from progress_store import ProgressStore
+
+
+def analysis(accuracy, incorrect=(), missing=(), extra=(), ayah_words=(4, 2, 4, 6)):
+    return {
+        'overall_accuracy': accuracy,
+        'completion_percentage': 100.0,
+        'total_words': sum(ayah_words),
+        'spoken_words': sum(ayah_words),
+        'total_errors': len(incorrect) + len(missing) + len(extra),
+        'errors_by_type': {
+            'incorrect': [{'position': p, 'type': 'incorrect', 'correct': f'w{p}', 'spoken': 'x'} for p in incorrect],
+            'missing': [{'position': p, 'type': 'missing', 'missing': f'w{p}'} for p in missing],
+            'extra': [{'position': p, 'type': 'extra', 'spoken': 'x'} for p in extra],
+        },
+        'ayah_accuracy': [{'words': words} for words in ayah_words],
+    }
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ProgressStore(str(tmp_path / 'progress.sqlite'), flush_interval=0.01)
+
+
+def test_accuracy_over_time(store):
+    store.record('a', 3, analysis(50.0), ts=1)
+    store.record('a', 3, analysis(75.0), ts=3)
+    store.record('a', 4, analysis(60.0), ts=2)
+    store.record('b', 3, analysis(10.0), ts=2)
+    assert store.flush(timeout=5)
+    assert [r['accuracy'] for r in store.accuracy_over_time('a')] == [50.0, 60.0, 75.0]
+    assert [r['accuracy'] for r in store.accuracy_over_time('a', surah=3)] == [50.0, 75.0]
+    assert [r['accuracy'] for r in store.accuracy_over_time('a', since=2)] == [60.0, 75.0]
+    # The newest recitations, still in time order
+    assert [r['ts'] for r in store.accuracy_over_time('a', limit=2)] == [2, 3]
+
+
+def test_most_missed_positions(store):
+    store.record('a', 3, analysis(50.0, incorrect=[2], missing=[5, 7]))
+    store.record('a', 3, analysis(50.0, incorrect=[5], extra=[1]))
+    store.record('b', 3, analysis(50.0, missing=[2, 2]))
+    assert store.flush(timeout=5)
+    assert [(m['position'], m['misses'], m['incorrect'], m['missing']) for m in
+            store.most_missed_positions(3, 'a')] == [(5, 2, 1, 1), (2, 1, 1, 0), (7, 1, 0, 1)]
+    everyone = store.most_missed_positions(3, limit=2)
+    assert [(m['position'], m['misses']) for m in everyone] == [(2, 3), (5, 2)]
+    assert everyone[0]['expected'] == 'w2'
+
+
+def test_missing_words_past_the_reached_ayahs_are_not_logged(store):
+    store.record('a', 3, analysis(20.0, missing=[1, 6, 9], ayah_words=(4, 2)))
+    assert store.flush(timeout=5)
+    assert [m['position'] for m in store.most_missed_positions(3, 'a')] == [1]
+
+
+def test_a_full_queue_drops_instead_of_blocking(tmp_path):
+    store = ProgressStore(str(tmp_path / 'progress.sqlite'), queue_size=1)
+    store._ensure_writer = lambda: None  # nothing drains the queue
+    assert store.record('a', 3, analysis(50.0))
+    assert not store.record('a', 3, analysis(50.0))
+    assert store.dropped == 1
+
+
+def test_history_routes(client, lefqih):
+    client.post('/start', data={'surah_number': '3', 'student': 'student-history'})
+    client.post('/final_analysis', json={'transcript': 'قل هو الله زائد الله الصمد'})
+    assert lefqih.progress.flush(timeout=5)
+
+    accuracy = client.get('/progress/accuracy?surah=3').get_json()
+    assert accuracy['user'] == 'student-history'
+    assert len(accuracy['recitations']) == 1
+    missed = client.get('/progress/missed/3').get_json()
+    assert (missed['positions'][0]['position'], missed['positions'][0]['word']) == (3, 'أَحَدٌ')
+    assert client.get('/progress/missed/99').status_code == 404
+
+
+def test_other_students_history_needs_the_teacher_token(client, lefqih, monkeypatch):
+    client.post('/start', data={'surah_number': '3', 'student': 'student-private'})
+    for url in ('/progress/accuracy?user=someone-else', '/progress/missed/3?user=someone-else',
+                '/progress/missed/3?all=1'):
+        assert client.get(url).status_code == 403
+        assert client.get(url, headers={'X-Teacher-Token': 'guess'}).status_code == 403
+
+    monkeypatch.setitem(lefqih.app.config, 'PROGRESS_TEACHER_TOKEN', 'teacher-secret')
+    teacher = {'X-Teacher-Token': 'teacher-secret'}
+    assert client.get('/progress/missed/3?all=1', headers=teacher).get_json()['user'] is None
+    assert client.get('/progress/accuracy?user=someone-else', headers=teacher).get_json()['user'] == 'someone-else'
+    assert client.get('/progress/missed/3?all=1', headers={'X-Teacher-Token': 'guess'}).status_code == 403
+    # Asking for yourself by name needs no token
+    assert client.get('/progress/accuracy?user=student-private').status_code == 200
@@ -0,0 +1,95 @@
+import pytest
+
+from quran_api import ApiError, CircuitBreaker, CircuitOpenError, QuranApiClient
+
+SURAH = {'number': 112, 'englishName': 'Al-Ikhlaas'}
+
+
+class FakeResponse:
+    def __init__(self, status_code, data=None, etag=None):
+        self.status_code = status_code
+        self._data = data
+        self.headers = {'ETag': etag} if etag else {}
+
+    def json(self):
+        return {'data': self._data}
+
+
+class FakeSession:
+    """Answers requests from a scripted list of responses and records them"""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    def get(self, url, headers=None, timeout=None):
+        self.requests.append((url, dict(headers or {})))
+        return self.responses.pop(0)
+
+    def close(self):
+        pass
+
+
+class Clock:
+    now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_client(*responses, **kwargs):
+    kwargs.setdefault('backoff_base', 0)
+    return QuranApiClient('http://quran.test/v1', session=FakeSession(*responses), **kwargs)
+
+
+def test_retries_server_errors():
+    client = make_client(FakeResponse(503), FakeResponse(500), FakeResponse(200, SURAH))
+    assert client.get_surah(112) == SURAH
+    assert len(client.session.requests) == 3
+
+
+def test_client_errors_are_not_retried():
+    client = make_client(FakeResponse(404))
+    with pytest.raises(ApiError):
+        client.get_surah(115)
+    assert len(client.session.requests) == 1
+    assert client.breaker.state == 'closed'
+
+
+def test_circuit_opens_and_lets_one_probe_through():
+    clock = Clock()
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30, clock=clock)
+    client = make_client(FakeResponse(503), FakeResponse(503), FakeResponse(200, SURAH),
+                         max_retries=0, breaker=breaker)
+    for _ in range(2):
+        with pytest.raises(ApiError):
+            client.get_surah(112)
+    with pytest.raises(CircuitOpenError):
+        client.get_surah(112)
+    assert len(client.session.requests) == 2
+
+    clock.now = 30
+    assert client.get_surah(112) == SURAH
+    assert breaker.state == 'closed'
+
+
+def test_responses_are_cached_on_disk(tmp_path):
+    client = make_client(FakeResponse(200, SURAH, etag='"v1"'), cache_dir=str(tmp_path))
+    assert client.get_surah(112) == SURAH
+    assert client.get_surah(112) == SURAH
+    assert len(client.session.requests) == 1
+
+    # A new process answers from the disk cache even with the API down
+    restarted = make_client(FakeResponse(503), cache_dir=str(tmp_path), max_retries=0)
+    assert restarted.get_surah(112) == SURAH
+    assert restarted.session.requests == []
+    assert restarted.cache.cache_info().hits == 1
+
+
+def test_stale_entries_are_served_and_revalidated(tmp_path):
+    client = make_client(FakeResponse(200, SURAH, etag='"v1"'), FakeResponse(304), ttl=0)
+    client.get_surah(112)
+    assert client.get_surah(112) == SURAH
+    client._refresher.shutdown(wait=True)
+    assert client.session.requests[-1][1] == {'If-None-Match': '"v1"'}
+    assert client.cache.cache_info().stale == 1
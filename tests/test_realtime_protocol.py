@@ -0,0 +1,134 @@
+import pickle
+
+import pytest
+
+from realtime_protocol import (COMPACT_SCHEMA, DUPLICATE, ERROR_KINDS, FINAL, INTERIM, MSGPACK_MIMETYPE, RESYNC,
+                               RealtimeStream, RecitationError, coalesce)
+
+
+def message(seq, segment, text, final=False, offset=0):
+    return {'v': 2, 'seq': seq, 'segment': segment, 'final': final, 'offset': offset, 'text': text}
+
+
+def test_interim_deltas_build_the_segment():
+    stream = RealtimeStream()
+    assert stream.receive(message(1, 0, 'a b')) == (INTERIM, ['a', 'b'])
+    assert stream.receive(message(2, 0, 'c d', offset=2)) == (INTERIM, ['a', 'b', 'c', 'd'])
+    # A revised tail replaces the words after the offset
+    assert stream.receive(message(3, 0, 'x', offset=1)) == (INTERIM, ['a', 'x'])
+
+
+def test_repeated_and_older_interims_are_duplicates():
+    stream = RealtimeStream()
+    stream.receive(message(5, 0, 'a b'))
+    assert stream.receive(message(5, 0, 'a b')) == (DUPLICATE, None)
+    assert stream.receive(message(4, 0, 'a')) == (DUPLICATE, None)
+
+
+def test_final_is_committed_once():
+    stream = RealtimeStream()
+    stream.receive(message(1, 0, 'a'))
+    assert stream.receive(message(2, 0, 'a b', final=True)) == (FINAL, ['a', 'b'])
+    assert stream.receive(message(2, 0, 'a b', final=True)) == (DUPLICATE, None)
+    # Late interims of a committed segment change nothing
+    assert stream.receive(message(9, 0, 'a b c')) == (DUPLICATE, None)
+
+
+def test_final_may_arrive_after_a_newer_interim():
+    stream = RealtimeStream()
+    stream.receive(message(3, 1, 'c'))
+    assert stream.receive(message(2, 0, 'a b', final=True)) == (FINAL, ['a', 'b'])
+    assert stream.receive(message(4, 1, 'd', offset=1)) == (INTERIM, ['c', 'd'])
+
+
+def test_delta_past_known_words_asks_for_a_resync():
+    stream = RealtimeStream()
+    assert stream.receive(message(1, 0, 'c', offset=2)) == (RESYNC, None)
+    stream.receive(message(2, 0, 'a'))
+    assert stream.receive(message(3, 0, 'c', offset=2)) == (RESYNC, None)
+
+
+def test_state_round_trip():
+    stream = RealtimeStream()
+    stream.receive(message(1, 0, 'a b', final=True))
+    stream.receive(message(2, 1, 'c'))
+    restored = RealtimeStream.from_state(stream.state())
+    assert restored.receive(message(2, 1, 'c')) == (DUPLICATE, None)
+    assert restored.receive(message(1, 0, 'a b', final=True)) == (DUPLICATE, None)
+    assert restored.receive(message(3, 1, 'd', offset=1)) == (INTERIM, ['c', 'd'])
+
+
+@pytest.mark.parametrize('pending, incoming, expected', [
+    (message(1, 0, 'a b'), message(2, 0, 'c', offset=2), message(2, 0, 'a b c')),
+    (message(1, 0, 'b', offset=1), message(2, 0, 'c d', offset=2), message(2, 0, 'b c d', offset=1)),
+    (message(1, 0, 'a b'), message(2, 1, 'c'), message(2, 1, 'c')),
+    (message(1, 0, 'a b'), message(2, 0, 'a b c', final=True), None),
+    (message(3, 1, 'c'), message(2, 0, 'a b', final=True), message(3, 1, 'c')),
+])
+def test_coalesce(pending, incoming, expected):
+    assert coalesce(pending, incoming) == expected
+
+
+def send(client, **fields):
+    return client.post('/check_realtime', json=dict({'v': 2, 'offset': 0}, **fields)).get_json()
+
+
+def test_check_realtime_is_idempotent(client, lefqih):
+    client.post('/start', data={'surah_number': '3'})
+    client.post('/start_realtime_session')
+    send(client, seq=1, segment=0, final=False, text='قل هو')
+    first = send(client, seq=2, segment=0, final=True, text='قل هو الله احد')
+    assert (first['current_position'], first['errors']) == (4, [])
+
+    wrong = send(client, seq=3, segment=1, final=True, text='الله الصمد زائد')
+    assert [error['position'] for error in wrong['errors']] == [6]
+    repeated = send(client, seq=3, segment=1, final=True, text='الله الصمد زائد')
+    assert repeated['duplicate'] and repeated['current_position'] == wrong['current_position']
+    stale = send(client, seq=1, segment=0, final=False, text='قل هو')
+    assert stale['duplicate'] and stale['current_position'] == wrong['current_position']
+
+    with client.session_transaction() as state:
+        assert state['current_position'] == 7
+        assert len(state['realtime_errors']) == 1
+
+    assert send(client, seq=4, segment=2, final=False, offset=3, text='يولد')['resync']
+
+
+def test_compact_schema(client):
+    client.post('/start', data={'surah_number': '3'})
+    client.post('/start_realtime_session')
+    result = send(client, seq=1, segment=0, final=True, schema=COMPACT_SCHEMA, text='قل هو زائد الله احد')
+    assert result['schema'] == COMPACT_SCHEMA and result['p'] == 4
+    assert result['e'] == [[ERROR_KINDS.index('extra'), 2, 'زايد', 0.0, -1]]
+    assert not {'errors', 'current_position', 'suggestion', 'debug_info'} & set(result)
+
+
+def test_compact_results_as_msgpack(client):
+    msgpack = pytest.importorskip('msgpack')
+    client.post('/start', data={'surah_number': '3'})
+    client.post('/start_realtime_session')
+    message = {'v': 2, 'offset': 0, 'seq': 1, 'segment': 0, 'final': True, 'schema': COMPACT_SCHEMA,
+               'text': 'قل هو الله'}
+    response = client.post('/check_realtime', json=message, headers={'Accept': MSGPACK_MIMETYPE})
+    assert response.mimetype == MSGPACK_MIMETYPE
+    assert msgpack.unpackb(response.data)['p'] == 3
+    # The original schema is always JSON
+    message.update(seq=2, segment=1, schema=None, text='احد')
+    assert client.post('/check_realtime', json=message, headers={'Accept': MSGPACK_MIMETYPE}).is_json
+
+
+def test_debug_info_only_on_request(client):
+    client.post('/start', data={'surah_number': '3'})
+    client.post('/start_realtime_session')
+    assert 'debug_info' not in send(client, seq=1, segment=0, final=False, text='قل')
+    assert 'debug_info' in send(client, seq=2, segment=0, final=False, text='قل هو', debug=True)
+
+
+def test_recitation_errors_pickle_as_tuples(lefqih):
+    error = RecitationError(ERROR_KINDS.index('incorrect'), 1, 'هوو', 85.7, -1, 3)
+    assert b'position' not in pickle.dumps(error)
+    restored = pickle.loads(pickle.dumps(error))
+    as_dict = restored.to_dict(lefqih.corpus.get_index(3))
+    assert (as_dict['expected'], as_dict['original_expected']) == ('هو', 'هُوَ')
+    assert restored.compact(3) == [0, 1, 'هوو', 85.7, -1]
+    assert restored.compact(4) == [0, 1, 'هوو', 85.7, -1, 3]
@@ -0,0 +1,35 @@
+import json
+import re
+
+
+def recite_data(response):
+    match = re.search(r'<script id="recite-data" type="application/json">(.*?)</script>',
+                      response.get_data(as_text=True))
+    return json.loads(match.group(1))
+
+
+def test_recite_page_of_a_surah(client):
+    client.post('/start', data={'surah_number': '3'})
+    response = client.get('/recite')
+    assert response.status_code == 200
+    data = recite_data(response)
+    assert data['surah'] == 3
+    assert data['words'][:3] == ['قل', 'هو', 'الله']
+
+
+def test_recite_page_in_locate_mode(client):
+    client.post('/start', data={'surah_number': 'locate'})
+    response = client.get('/recite')
+    assert response.status_code == 200
+    data = recite_data(response)
+    assert data['surah'] is None
+    assert data['words'] == []
+
+
+def test_recite_form_fallback(client):
+    client.post('/start', data={'surah_number': '3'})
+    response = client.post('/recite', data={'user_input': ''})
+    assert 'Empty input' in response.get_data(as_text=True)
+    response = client.post('/recite', data={'user_input': 'قل هو الله احد'})
+    assert response.status_code == 302
+    assert response.headers['Location'].endswith('/report')
@@ -0,0 +1,43 @@
+import report_pages
+
+
+def analysis_with_errors(positions):
+    return {'errors_by_type': {
+        'incorrect': [{'position': p, 'type': 'incorrect'} for p in positions[::2]],
+        'missing': [{'position': p, 'type': 'missing'} for p in positions[1::2]],
+    }}
+
+
+def test_errors_are_grouped_by_ayah_in_word_order(lefqih):
+    index = lefqih.corpus.get_index(4)
+    analysis = analysis_with_errors([index.ayah_offsets[3] + 1, 0, index.ayah_offsets[3], 2])
+    page = report_pages.error_page(analysis, index)
+    assert (page['page'], page['pages'], page['next_page']) == (1, 1, None)
+    assert [(group['ayah'], [error['position'] for error in group['errors']]) for group in page['groups']] == [
+        (1, [0, 2]), (4, [index.ayah_offsets[3], index.ayah_offsets[3] + 1])]
+
+
+def test_pages(lefqih):
+    index = lefqih.corpus.get_index(4)
+    analysis = analysis_with_errors(list(index.ayah_offsets[:-1]))
+    pages = [report_pages.error_page(analysis, index, page, per_page=2) for page in (1, 2, 3, 4)]
+    assert [[group['ayah'] for group in page['groups']] for page in pages] == [[1, 2], [3, 4], [5], []]
+    assert [page['next_page'] for page in pages] == [2, 3, None, None]
+
+
+def test_report_streams_the_first_page(client):
+    client.post('/start', data={'surah_number': '4'})
+    client.post('/final_analysis', json={'transcript': 'قل اعوذ برب الفلق من شر'})
+    response = client.get('/report')
+    assert response.is_streamed
+    assert response.status_code == 200
+    assert 'سورة الفلق' in response.get_data(as_text=True)
+
+    more = client.get('/report/errors', query_string={'page': 1}).get_json()
+    assert more['groups'] and more['groups'][0]['ayah'] == 2
+
+
+def test_error_pages_need_an_analysis(lefqih):
+    with lefqih.app.test_client() as client:
+        client.post('/start', data={'surah_number': '4'})
+        assert client.get('/report/errors').status_code == 404
@@ -0,0 +1,54 @@
+import pytest
+
+from session_store import MemorySessionStore, SQLiteSessionStore, create_session_store, default_session_backend
+
+
+def test_memory_store_evicts_the_least_recently_used():
+    store = MemorySessionStore(max_entries=2)
+    store.set('a', {'n': 1})
+    store.set('b', {'n': 2})
+    assert store.get('a') == {'n': 1}
+    store.set('c', {'n': 3})
+    assert store.get('b') is None
+    assert (store.get('a'), store.get('c')) == ({'n': 1}, {'n': 3})
+
+
+@pytest.mark.parametrize('make_store', [
+    lambda tmp_path: MemorySessionStore(ttl=-1),
+    lambda tmp_path: SQLiteSessionStore(str(tmp_path / 'sessions.sqlite'), ttl=-1),
+])
+def test_expired_sessions_are_not_returned(tmp_path, make_store):
+    store = make_store(tmp_path)
+    store.set('a', {'n': 1})
+    assert store.get('a') is None
+
+
+def test_sqlite_store_is_shared_between_processes(tmp_path):
+    path = str(tmp_path / 'sessions.sqlite')
+    first, second = SQLiteSessionStore(path), SQLiteSessionStore(path)
+    first.set('a', {'surah_number': 3, 'realtime_errors': [{'position': 1}]})
+    assert second.get('a') == {'surah_number': 3, 'realtime_errors': [{'position': 1}]}
+    second.delete('a')
+    assert first.get('a') is None
+    assert len(first) == 0
+
+
+def test_unknown_backend_is_rejected():
+    with pytest.raises(ValueError):
+        create_session_store('redis')
+
+
+def test_cookie_only_carries_the_session_id(client, lefqih):
+    response = client.post('/start', data={'surah_number': '3'})
+    cookie = response.headers['Set-Cookie']
+    sid = cookie.split(';')[0].split('=', 1)[1]
+    assert 'surah' not in cookie
+    assert lefqih.app.session_interface.store.get(sid)['surah_number'] == 3
+
+
+def test_several_workers_share_sessions_through_sqlite(tmp_path):
+    assert default_session_backend(1) == 'memory'
+    assert default_session_backend(4) == 'sqlite'
+    with pytest.raises(ValueError):
+        create_session_store('memory', workers=4)
+    assert isinstance(create_session_store('sqlite', str(tmp_path / 's.sqlite'), workers=4), SQLiteSessionStore)
@@ -0,0 +1,99 @@
+import random
+from difflib import SequenceMatcher
+
+import similarity
+
+LETTERS = 'ابتثجحخدذرزسشصضطظعغفقكلمنهوي'
+
+
+def random_words(count, seed, max_length=12):
+    rng = random.Random(seed)
+    # A small alphabet makes common subsequences (and edge cases) likely
+    alphabet = LETTERS[:rng.randint(2, len(LETTERS))]
+    return [''.join(rng.choice(alphabet) for _ in range(rng.randint(0, max_length))) for _ in range(count)]
+
+
+def reference_lcs(a, b):
+    row = [0] * (len(b) + 1)
+    for x in a:
+        previous = row[:]
+        for j, y in enumerate(b, 1):
+            row[j] = previous[j - 1] + 1 if x == y else max(previous[j], row[j - 1])
+    return row[-1]
+
+
+def reference_levenshtein(a, b):
+    row = list(range(len(b) + 1))
+    for i, x in enumerate(a, 1):
+        previous, row = row, [i] + [0] * len(b)
+        for j, y in enumerate(b, 1):
+            row[j] = min(previous[j] + 1, row[j - 1] + 1, previous[j - 1] + (x != y))
+    return row[-1]
+
+
+def pairs(count=300):
+    words = random_words(2 * count, seed=7)
+    # Long words cross the 64-bit boundary of the bit vectors
+    words += random_words(20, seed=8, max_length=90) * 2
+    return list(zip(words[::2], words[1::2]))
+
+
+def test_lcs_and_ratio_match_the_dynamic_program():
+    for a, b in pairs():
+        lcs = reference_lcs(a, b)
+        assert similarity.lcs_length(a, b) == lcs
+        expected = 1.0 if not a and not b else 2.0 * lcs / (len(a) + len(b))
+        assert similarity.ratio(a, b) == expected
+
+
+def test_levenshtein_matches_the_dynamic_program():
+    for a, b in pairs():
+        assert similarity.levenshtein(a, b) == reference_levenshtein(a, b)
+
+
+def test_ratio_is_never_below_difflib():
+    # SequenceMatcher's longest-block heuristic finds at most the LCS
+    for a, b in pairs():
+        assert similarity.ratio(a, b) >= SequenceMatcher(None, a, b, autojunk=False).ratio() - 1e-12
+
+
+def test_word_and_batch_similarity_agree():
+    words = random_words(60, seed=9, max_length=8)
+    for word in words:
+        batch = similarity.batch_similarity(word, words)
+        for candidate, (is_similar, score) in zip(words, batch):
+            assert similarity.word_similarity(word, candidate) == (is_similar, score)
+            assert score == similarity.ratio(word, candidate)
+            assert is_similar == similarity.is_similar(word, candidate)
+            assert is_similar == (similarity.ratio(word, candidate) >= similarity.SIMILARITY_THRESHOLD)
+
+
+def test_length_rejected_pairs_keep_their_score():
+    # The lengths alone rule out a match, but the score is still the ratio, not that bound
+    assert similarity.word_similarity('قال', 'الرحمن') == (False, 4 / 9)
+    assert similarity.batch_similarity('قال', ['الرحمن']) == [(False, 4 / 9)]
+    assert not similarity.is_similar('قال', 'الرحمن')
+
+
+def test_opcodes_rebuild_the_second_sequence():
+    rng = random.Random(3)
+    vocabulary = random_words(15, seed=4, max_length=4)
+    for _ in range(50):
+        a = [rng.choice(vocabulary) for _ in range(rng.randint(0, 60))]
+        b = [rng.choice(vocabulary) for _ in range(rng.randint(0, 60))]
+        opcodes = similarity.get_opcodes(a, b)
+        rebuilt = []
+        equal = i_end = j_end = 0
+        for tag, i1, i2, j1, j2 in opcodes:
+            assert (i1, j1) == (i_end, j_end)
+            if tag == 'equal':
+                assert a[i1:i2] == b[j1:j2]
+                equal += i2 - i1
+            rebuilt.extend(b[j1:j2])
+            i_end, j_end = i2, j2
+        assert (i_end, j_end) == (len(a), len(b))
+        assert rebuilt == b
+        assert equal == reference_lcs(a, b)
+        difflib_equal = sum(i2 - i1 for tag, i1, i2, _, _ in SequenceMatcher(None, a, b, autojunk=False).get_opcodes()
+                            if tag == 'equal')
+        assert equal >= difflib_equal
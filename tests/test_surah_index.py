@@ -0,0 +1,30 @@
+from surah_index import SurahIndex
+
+
+def test_words_match_the_normalized_surah(lefqih):
+    index = lefqih.corpus.get_index(4)
+    assert list(index.words) == lefqih.qtc.normalize_arabic_text(index.full_text).split()
+    assert index.total_words == len(index.words)
+
+
+def test_words_stay_paired_with_their_ayah_and_display_form(lefqih):
+    index = lefqih.corpus.get_index(3)
+    assert index.ayah_count == 4
+    assert list(index.ayah_words(2)) == ['لم', 'يلد', 'ولم', 'يولد']
+    position = index.ayah_offsets[2]
+    assert index.ayah_at(position) == 3
+    assert index.original_words[position] == 'لَمْ'
+    assert index.expected_words(position, 2) == 'لم يلد'
+    assert index.expected_words(index.total_words) == 'End of Surah'
+
+
+def test_index_is_built_once(lefqih):
+    assert lefqih.corpus.get_index(2) is lefqih.corpus.get_index(2)
+
+
+def test_tokens_that_normalize_to_nothing_are_dropped(lefqih):
+    surah = {'number': 9, 'ayahs': [{'numberInSurah': 1, 'text': 'قُلْ ۚ هُوَ'}]}
+    index = SurahIndex.build(surah, lefqih.qtc.normalize_arabic_text)
+    assert index.words == ('قل', 'هو')
+    assert index.original_words == ('قُلْ', 'هُوَ')
+    assert index.word_ayahs == (1, 1)
@@ -0,0 +1,36 @@
+import confusions
+import vocabulary
+from surah_index import SurahIndex
+
+
+def corpus_words(lefqih):
+    return sorted({word for number in (1, 2, 3, 4) for word in lefqih.corpus.get_index(number).words})
+
+
+def test_corpus_words_are_stored_as_ids(lefqih):
+    vocab = vocabulary.get_vocabulary()
+    index = lefqih.corpus.get_index(1)
+    assert [vocab.words[i] for i in index.ids] == list(index.words)
+    assert list(vocab.encode(['الله', 'زائد'])) == [vocab.id('الله'), vocabulary.OOV]
+
+
+def test_similar_ids_match_pairwise_comparison(lefqih):
+    vocab = vocabulary.get_vocabulary()
+    words = corpus_words(lefqih)
+    for spoken in words:
+        similar = {vocab.words[i] for i in vocab.similar_to(vocab.id(spoken))}
+        assert similar == {expected for expected in words
+                           if expected != spoken and confusions.compare_words(spoken, expected)[0]}
+
+
+def test_analysis_by_id_matches_analysis_by_word(lefqih):
+    mapped = lefqih.corpus.get_index(1)
+    built = SurahIndex.build(lefqih.corpus.get_surah(1), lefqih.corpus.normalize)
+    assert mapped.ids is not None and built.ids is None
+    words = list(built.words)
+    transcript = ' '.join(words[:9] + ['زائد'] + words[12:20] + ['الصراتط'] + words[21:])
+    by_id = lefqih.build_final_analysis(transcript, mapped)
+    by_word = lefqih.build_final_analysis(transcript, built)
+    by_id.pop('timestamp'), by_word.pop('timestamp')
+    assert by_id == by_word
+    assert by_id['total_errors'] > 0
@@ -0,0 +1,38 @@
+import os
+
+import pytest
+
+import confusions
+import vocabulary
+import warmup
+from quran_corpus import QuranCorpus, SQLiteCorpusBackend
+
+
+@pytest.fixture
+def restore_indexes():
+    index, vocab = confusions.get_index(), vocabulary.get_vocabulary()
+    yield
+    confusions.set_index(index)
+    vocabulary.set_vocabulary(vocab)
+
+
+def make_corpus(lefqih, path):
+    return QuranCorpus(SQLiteCorpusBackend(path), normalize=lefqih.qtc.normalizer.normalize_word).load()
+
+
+def test_counts_the_surahs_actually_indexed(lefqih, tmp_path):
+    corpus = make_corpus(lefqih, str(tmp_path / 'missing.sqlite'))
+    state = warmup.warm_up(lefqih.app, lefqih.qtc, corpus, 'all')
+    assert state.surahs == 0
+
+
+def test_local_corpus_is_served_from_the_artifact(lefqih, tmp_path, monkeypatch, restore_indexes):
+    monkeypatch.setitem(lefqih.app.config, 'ARTIFACT_DIR', str(tmp_path))
+    corpus = make_corpus(lefqih, os.environ['QURAN_CORPUS_PATH'])
+    built = warmup.warm_up(lefqih.app, lefqih.qtc, corpus, 'all')
+    assert (built.source, built.surahs) == ('built', 4)
+
+    corpus = make_corpus(lefqih, os.environ['QURAN_CORPUS_PATH'])
+    loaded = warmup.warm_up(lefqih.app, lefqih.qtc, corpus, 'all')
+    assert (loaded.source, loaded.surahs) == ('artifact', 4)
+    assert list(corpus.get_index(3).words[:3]) == ['قل', 'هو', 'الله']
@@ -0,0 +1,96 @@
+import json
+import random
+import shutil
+
+import pytest
+
+import confusions
+import word_pack
+from aligner import StreamingAligner
+from arabic_normalizer import ARABIC_NORMALIZATIONS, ArabicNormalizer
+
+needs_node = pytest.mark.skipif(shutil.which('node') is None, reason="node is not installed")
+
+
+@pytest.fixture(scope='module')
+def cases():
+    with open(word_pack.CASES_PATH, encoding='utf-8') as f:
+        return json.load(f)['cases']
+
+
+def test_python_normalizer_matches_the_cases(cases):
+    normalizer = ArabicNormalizer(ARABIC_NORMALIZATIONS)
+    for case in cases:
+        assert normalizer.normalize(case['text']) == case['normalized']
+        assert normalizer.normalize_words(case['text']) == case['words']
+
+
+@needs_node
+def test_javascript_normalizer_matches_the_cases(cases):
+    results = word_pack._javascript_results(ArabicNormalizer(ARABIC_NORMALIZATIONS), cases)
+    for case, (text, words) in zip(cases, results):
+        assert (text, words) == (case['normalized'], case['words']), case['text']
+
+
+def recitations(words, count, seed=0):
+    """Batches of recognized words with skips, repeats, extra and misread words"""
+    rng = random.Random(seed)
+    for _ in range(count):
+        spoken = []
+        k = 0
+        while k < len(words) and len(spoken) < 80:
+            roll = rng.random()
+            if roll < 0.08:
+                k += rng.randint(1, 6)
+            elif roll < 0.12:
+                k = max(k - rng.randint(1, 4), 0)
+            elif roll < 0.16:
+                spoken.append(rng.choice(words))
+            elif roll < 0.22:
+                spoken.append(words[k][:-1] + 'ب' if len(words[k]) > 1 else words[k])
+                k += 1
+            else:
+                spoken.append(words[k])
+                k += 1
+        batches = []
+        while spoken:
+            size = rng.randint(1, 8)
+            batches.append(spoken[:size])
+            spoken = spoken[size:]
+        yield batches
+
+
+@needs_node
+def test_javascript_matcher_aligns_like_the_server(lefqih):
+    # The whole test corpus as one text, so long skips and jumps happen too
+    words = [word for number in lefqih.corpus.surah_numbers for word in lefqih.corpus.get_index(number).words]
+    samples = list(recitations(words, 30))
+    for batches, javascript in zip(samples, word_pack.javascript_alignments(words, samples)):
+        aligner = StreamingAligner(words, confusions.compare_words)
+        for batch, (js_errors, js_position) in zip(batches, javascript):
+            errors = aligner.feed(batch)
+            assert js_position == aligner.position
+            assert [(e['type'], e['position'], e['spoken'], e['expected']) for e in js_errors] == \
+                [(e['type'], e['position'], e['spoken'], e['expected']) for e in errors]
+            for js_error, error in zip(js_errors, errors):
+                assert js_error['similarity'] == pytest.approx(error['similarity'], abs=0.1)
+
+
+def test_word_pack_route(client, lefqih):
+    response = client.get('/start/word_pack/3')
+    assert response.status_code == 200 and response.mimetype == 'application/json'
+    pack = response.get_json()
+    index = lefqih.corpus.get_index(3)
+    assert pack['format'] == word_pack.WORD_PACK_FORMAT
+    assert pack['words'] == list(index.words)
+    assert pack['ayahs'] == [[1, 0], [2, 4], [3, 6], [4, 10]]
+    assert client.get('/start/word_pack/3', headers={'If-None-Match': response.headers['ETag']}).status_code == 304
+    assert client.get('/start/word_pack/999').status_code == 404
+
+
+def test_offload_mode_points_at_the_word_pack(client, lefqih, monkeypatch):
+    monkeypatch.setitem(lefqih.app.config, 'REALTIME_OFFLOAD', True)
+    client.post('/start', data={'surah_number': '3'})
+    assert client.post('/start_realtime_session').get_json()['word_pack'] == '/start/word_pack/3'
+    client.post('/start', data={'surah_number': 'locate'})
+    assert 'word_pack' not in client.post('/start_realtime_session').get_json()
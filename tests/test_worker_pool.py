@@ -0,0 +1,24 @@
+import os
+
+import analysis
+import worker_pool
+
+
+def test_importing_the_app_starts_no_pool(lefqih):
+    assert worker_pool.get_pool() is None and worker_pool.size() == 1
+
+
+def test_the_pool_is_started_once(pool):
+    assert worker_pool.start(4) is pool and worker_pool.size() == 2
+    # Workers inherit the parent's pool object but never use it
+    assert pool.submit(worker_pool.get_pool).result() is None
+    assert pool.submit(os.getpid).result() != os.getpid()
+
+
+def test_analysis_on_the_pool_matches_one_process(lefqih, pool, monkeypatch):
+    monkeypatch.setattr(analysis, 'PARALLEL_MIN_WORDS', 0)
+    index = lefqih.corpus.get_index(4)
+    spoken = list(index.words)
+    spoken[3], spoken[12] = 'زائد', 'قلب'
+    del spoken[7]
+    assert analysis.chunked_compare(spoken, index) == analysis.chunked_compare(spoken, index, parallel=False)
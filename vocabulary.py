@@ -0,0 +1,174 @@
+"""
+Integer vocabulary of the normalized corpus.
+
+Every distinct normalized word of the corpus gets an int32 id (its rank in
+the sorted vocabulary), every corpus word is stored as the id of its form,
+and transcripts are encoded through the same table, with OOV (-1) for
+words the corpus does not have. Exact matches then become integer
+comparisons, which NumPy can do a whole window or segment at a time.
+
+Each id also lists the ids it is similar to in the sense of
+confusions.compare_words() at the vocabulary's cutoff: a word spoken
+where another was expected is similar iff the expected id is in the spoken
+word's list. Candidates are found with the same deletion index as the
+confusion index, searched deep enough to reach every pair whose similarity
+ratio can pass the cutoff, and checked pairwise, so the lists are exact
+and string similarity only runs for out-of-vocabulary words and for the
+scores of reported errors.
+
+Sections of the warm-up artifact (see warmup.py):
+
+    vocab.meta             JSON: format version and cutoff
+    vocab.blob / .offsets  the vocabulary, sorted
+    vocab.similar.offsets  V + 1 offsets into vocab.similar, one per id
+    vocab.similar          uint32 ids each word is similar to, sorted per id
+    norm.ids               int32 vocabulary id of every corpus word (see corpus_image.py)
+
+NumPy is optional: without it ids are plain int arrays and the callers
+fall back to Python loops over them.
+"""
+import json
+from array import array
+
+import confusions
+import similarity as fast_similarity
+from corpus_image import StringTable
+
+try:
+    import numpy
+except ImportError:  # Optional: vectorized scoring
+    numpy = None
+
+VOCABULARY_FORMAT = 1
+OOV = -1
+
+assert array('i').itemsize == 4 and array('I').itemsize == 4
+
+
+def deletion_depth(word, cutoff=fast_similarity.SIMILARITY_THRESHOLD):
+    """
+    Deletions a word needs to reach the LCS it shares with any word it may be similar to.
+
+    A ratio of at least c leaves len * (2 - 2c) / (2 - c) unmatched letters
+    at most (a third of the word at 0.8).
+    """
+    return int(len(word) * (2 - 2 * cutoff) / (2 - cutoff) + 1e-9)
+
+
+def similar_pairs(vocabulary, cutoff=fast_similarity.SIMILARITY_THRESHOLD):
+    """(spoken id, expected id) for every ordered pair of a sorted vocabulary that compares as similar"""
+    buckets = {}
+    variants = []
+    for word_id, word in enumerate(vocabulary):
+        word_variants = confusions.deletes(word, deletion_depth(word, cutoff))
+        variants.append(word_variants)
+        for variant in word_variants:
+            buckets.setdefault(variant, []).append(word_id)
+
+    for first, word in enumerate(vocabulary):
+        candidates = set()
+        for variant in variants[first]:
+            candidates.update(buckets[variant])
+        for second in candidates:
+            if second <= first:
+                continue
+            # The ratio is symmetric: one check covers both directions
+            if fast_similarity.is_similar(word, vocabulary[second], cutoff):
+                yield first, second
+                yield second, first
+
+
+def build_sections(corpus_words, cutoff=fast_similarity.SIMILARITY_THRESHOLD):
+    """Artifact sections of the vocabulary of a corpus, given all its normalized words in order"""
+    vocabulary = sorted(set(corpus_words))
+    ids = {word: i for i, word in enumerate(vocabulary)}
+    similar = [[] for _ in vocabulary]
+    for spoken, expected in similar_pairs(vocabulary, cutoff):
+        similar[spoken].append(expected)
+
+    blob = bytearray()
+    word_offsets = array('I', [0])
+    offsets = array('I', [0])
+    similar_ids = array('I')
+    for word, word_similar in zip(vocabulary, similar):
+        blob += word.encode('utf-8')
+        word_offsets.append(len(blob))
+        similar_ids.extend(sorted(word_similar))
+        offsets.append(len(similar_ids))
+
+    return {
+        'vocab.meta': json.dumps({'format': VOCABULARY_FORMAT, 'cutoff': cutoff}).encode('utf-8'),
+        'vocab.blob': bytes(blob),
+        'vocab.offsets': word_offsets.tobytes(),
+        'vocab.similar.offsets': offsets.tobytes(),
+        'vocab.similar': similar_ids.tobytes(),
+        'norm.ids': array('i', (ids[word] for word in corpus_words)).tobytes(),
+    }
+
+
+SECTION_NAMES = tuple(name for name in build_sections([]) if name != 'norm.ids')
+
+
+class Vocabulary:
+    """Word <-> id table of the corpus, with the similar ids of every word"""
+
+    def __init__(self, sections):
+        meta = json.loads(bytes(sections['vocab.meta']))
+        if meta.get('format') != VOCABULARY_FORMAT:
+            raise ValueError(f"Unsupported vocabulary format {meta.get('format')}")
+        self.cutoff = meta['cutoff']
+        self.words = StringTable(memoryview(sections['vocab.blob']), memoryview(sections['vocab.offsets']).cast('I'))
+        self.ids = {word: i for i, word in enumerate(self.words)}
+        self.similar_offsets = memoryview(sections['vocab.similar.offsets']).cast('I')
+        self.similar_ids = memoryview(sections['vocab.similar']).cast('I')
+        self._similar = {}
+
+    @classmethod
+    def build(cls, words, cutoff=fast_similarity.SIMILARITY_THRESHOLD):
+        """In-memory vocabulary of a word collection, for corpora without an artifact"""
+        return cls(build_sections(words, cutoff))
+
+    @classmethod
+    def from_artifact(cls, artifact):
+        return cls({name: artifact.section(name) for name in SECTION_NAMES})
+
+    def __len__(self):
+        return len(self.words)
+
+    def __contains__(self, word):
+        return word in self.ids
+
+    @property
+    def nbytes(self):
+        return self.similar_offsets.nbytes + self.similar_ids.nbytes
+
+    def id(self, word):
+        return self.ids.get(word, OOV)
+
+    def encode(self, words):
+        """int32 ids of a word sequence, OOV for unknown words (a NumPy array when NumPy is installed)"""
+        get = self.ids.get
+        ids = array('i', [get(word, OOV) for word in words])
+        return numpy.frombuffer(ids, dtype=numpy.int32) if numpy is not None else ids
+
+    def similar_to(self, word_id):
+        """frozenset of the ids that count as similar when word_id is spoken in their place"""
+        similar = self._similar.get(word_id)
+        if similar is None:
+            start, stop = self.similar_offsets[word_id], self.similar_offsets[word_id + 1]
+            similar = self._similar[word_id] = frozenset(self.similar_ids[start:stop])
+        return similar
+
+
+# Vocabulary of the mapped corpus; set once the corpus is warmed up.
+# Worker processes forked after that inherit it.
+_vocabulary = None
+
+
+def set_vocabulary(vocabulary):
+    global _vocabulary
+    _vocabulary = vocabulary
+
+
+def get_vocabulary():
+    return _vocabulary
@@ -0,0 +1,293 @@
+"""
+Startup warm-up and the on-disk artifact cache.
+
+At startup the app compiles the templates, pre-renders the surah list page
+and, for a local corpus, packs the whole corpus and its normalized word
+index into a read-only image (see corpus_image.py), along with its integer
+vocabulary (see vocabulary.py), the confusion index of that vocabulary
+(see confusions.py) and the locate index of the whole text (see
+locator.py). All of them are written to a versioned artifact file in
+ARTIFACT_DIR; every worker then maps that file instead of building its own
+copy, so the corpus is held once in the page cache however many workers
+run, and later starts skip the normalizer.
+
+WARMUP_SURAHS ("all", "none" or a list such as "1,36,67") selects which
+surah indexes are built in memory when there is no local corpus;
+"none" disables warm-up, and with it the shared image.
+
+An artifact is a single file:
+
+    b'LQAR' | header length (uint32 LE) | JSON header | section bytes...
+
+where the header holds the artifact version, its cache key and the
+(offset, length) of each named section. Sections start on 8-byte
+boundaries so they can be cast to integer arrays in place. Files are opened
+with mmap, so section reads are slices of the page cache shared by all
+workers. The cache key covers the artifact version, the corpus file, the
+normalization table, the code that builds the image and the templates, so
+any of those changing simply produces a new file; older ones are removed.
+
+Only a local corpus is cached on disk: API-backed deployments still warm
+up in memory, through the API client's own cache, and compare words
+pairwise as strings rather than through the vocabulary and confusion index.
+"""
+import hashlib
+import json
+import mmap
+import os
+import struct
+import time
+from array import array
+
+import confusions
+import locator
+import vocabulary
+from corpus_image import CorpusImage, build_sections
+from quran_corpus import SURAH_FIELDS
+
+ARTIFACT_VERSION = 6
+MAGIC = b'LQAR'
+HEADER = struct.Struct('<4sI')
+ARTIFACT_PREFIX = 'warmup-'
+ALIGNMENT = 8
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+# Source files whose changes invalidate cached indexes
+INDEX_SOURCES = ('arabic_normalizer.py', 'surah_index.py', 'corpus_image.py', 'confusions.py', 'similarity.py',
+                 'locator.py', 'vocabulary.py', 'warmup.py')
+
+
+class Artifact:
+    """Read-only, memory-mapped artifact file"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._map)
+        magic, header_length = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not an artifact file")
+        self.header = json.loads(bytes(self._view[HEADER.size:HEADER.size + header_length]))
+
+    @property
+    def key(self):
+        return self.header.get('key')
+
+    def section(self, name):
+        """Zero-copy view of a section"""
+        offset, length = self.header['sections'][name]
+        return self._view[offset:offset + length]
+
+    def close(self):
+        self._view.release()
+        self._map.close()
+
+
+def _align(offset):
+    return -offset % ALIGNMENT
+
+
+def write_artifact(path, key, sections):
+    """Write named byte sections to an artifact file, atomically"""
+    names = list(sections)
+    # Offsets depend on the header size and vice versa; grow the header until they agree
+    header_length = 0
+    while True:
+        offset = HEADER.size + header_length
+        table = {}
+        for name in names:
+            offset += _align(offset)
+            table[name] = [offset, len(sections[name])]
+            offset += len(sections[name])
+        header = json.dumps({'version': ARTIFACT_VERSION, 'key': key, 'sections': table}).encode('utf-8')
+        if len(header) <= header_length:
+            header = header.ljust(header_length)
+            break
+        header_length = len(header)
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, header_length))
+        f.write(header)
+        for name in names:
+            f.write(b'\0' * _align(f.tell()))
+            f.write(sections[name])
+    os.replace(tmp_path, path)
+
+
+class ArtifactCache:
+    """Directory of versioned artifacts, one current file per cache key"""
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def path(self, key):
+        return os.path.join(self.directory, f"{ARTIFACT_PREFIX}v{ARTIFACT_VERSION}-{key}.bin")
+
+    def load(self, key):
+        path = self.path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            artifact = Artifact(path)
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable artifact {path}: {e}")
+            return None
+        if artifact.key != key or artifact.header.get('version') != ARTIFACT_VERSION:
+            artifact.close()
+            return None
+        return artifact
+
+    def save(self, key, sections):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path(key)
+        write_artifact(path, key, sections)
+        # Older versions and keys are never read again
+        for name in os.listdir(self.directory):
+            stale = os.path.join(self.directory, name)
+            if name.startswith(ARTIFACT_PREFIX) and stale != path and name.endswith('.bin'):
+                try:
+                    os.remove(stale)
+                except OSError:
+                    pass
+        return path
+
+
+def _file_digest(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def artifact_key(corpus_path, normalizations, template_paths):
+    """Cache key of everything an artifact is derived from"""
+    stat = os.stat(corpus_path)
+    digest = hashlib.sha1()
+    digest.update(f"{ARTIFACT_VERSION}|{os.path.abspath(corpus_path)}|{stat.st_size}|{stat.st_mtime_ns}".encode())
+    digest.update(repr(sorted(normalizations.items())).encode('utf-8'))
+    for name in INDEX_SOURCES:
+        digest.update(_file_digest(os.path.join(BASE_DIR, name)).encode())
+    for path in template_paths:
+        digest.update(_file_digest(path).encode())
+    return digest.hexdigest()[:16]
+
+
+def parse_surah_selection(value, available):
+    """WARMUP_SURAHS value -> sorted surah numbers to warm ([] disables warm-up)"""
+    value = (value or '').strip().lower()
+    if value in ('', 'none', 'off', '0'):
+        return []
+    if value == 'all':
+        return sorted(available)
+    numbers = set()
+    for part in value.split(','):
+        part = part.strip()
+        if '-' in part:
+            first, last = part.split('-', 1)
+            numbers.update(range(int(first), int(last) + 1))
+        elif part:
+            numbers.add(int(part))
+    return sorted(numbers)
+
+
+class WarmState:
+    """What the warm-up produced, kept in app.extensions['warmup']"""
+
+    def __init__(self, index_page=None, surahs=0, source=None, seconds=0.0, artifact=None):
+        self.index_page = index_page
+        self.surahs = surahs
+        self.source = source
+        self.seconds = seconds
+        self.artifact = artifact
+
+
+def _load_image(cache, key, corpus):
+    """Map the artifact for key and serve the corpus from it; None if it is missing"""
+    artifact = cache.load(key)
+    if artifact is None:
+        return None
+    try:
+        image = CorpusImage(artifact)
+        word_vocabulary = vocabulary.Vocabulary.from_artifact(artifact)
+        confusion_index = confusions.ConfusionIndex.from_artifact(artifact)
+        locate_index = locator.ShingleIndex.from_artifact(artifact)
+    except (KeyError, ValueError) as e:
+        print(f"Ignoring incompatible artifact {artifact.path}: {e}")
+        artifact.close()
+        return None
+    corpus.attach_image(image, locate_index)
+    confusions.set_index(confusion_index)
+    vocabulary.set_vocabulary(word_vocabulary)
+    return artifact
+
+
+def warm_up(app, qtc, corpus, selection=None):
+    """Map (or build) the shared corpus image and pre-render pages"""
+    start = time.perf_counter()
+    selection = app.config.get('WARMUP_SURAHS', 'all') if selection is None else selection
+    available = corpus.surah_numbers if corpus.is_local else range(1, 115)
+    numbers = parse_surah_selection(selection, available)
+    if not numbers:
+        return None
+
+    from flask import render_template
+
+    # Compile every template now rather than on its first request
+    for name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(name)
+
+    if not corpus.is_local:
+        # Only the surahs the API (or its cache) actually returned are indexed
+        indexed = corpus.build_indexes(numbers)
+        with app.test_request_context('/'):
+            index_page = render_template('index.html', surahs=qtc.get_surah_list()).encode('utf-8')
+        state = WarmState(index_page, indexed, 'built', time.perf_counter() - start)
+        app.extensions['warmup'] = state
+        return state
+
+    template_path = os.path.join(app.root_path, app.template_folder, 'index.html')
+    cache = ArtifactCache(app.config['ARTIFACT_DIR'])
+    key = artifact_key(corpus.backend.path, qtc.arabic_normalizations, [template_path])
+    source = 'artifact'
+    artifact = _load_image(cache, key, corpus)
+    if artifact is None:
+        source = 'built'
+        surah_list, surahs = corpus.backend.load_all()
+        sections = build_sections(surah_list, surahs, corpus.normalize, SURAH_FIELDS)
+        del surahs
+        words = str(sections['norm.blob'], 'utf-8').split()
+        surah_words = array('I', sections['surah.words'])
+        numbers = [surah['number'] for surah in json.loads(sections['meta'])['surahs']]
+        sections.update(vocabulary.build_sections(words))
+        sections.update(confusions.build_sections(set(words)))
+        sections.update(locator.build_sections(
+            (number, words[surah_words[i]:surah_words[i + 1]]) for i, number in enumerate(numbers)))
+        del words
+        with app.test_request_context('/'):
+            sections['index_page'] = render_template('index.html', surahs=qtc.get_surah_list()).encode('utf-8')
+        try:
+            cache.save(key, sections)
+        except OSError as e:
+            print(f"Could not write warm-up artifact: {e}")
+        else:
+            # Serve from the file just written, like every other worker will
+            artifact = _load_image(cache, key, corpus)
+        if artifact is None:
+            indexed = corpus.build_indexes(numbers)
+            state = WarmState(sections['index_page'], indexed, source, time.perf_counter() - start)
+            app.extensions['warmup'] = state
+            return state
+
+    state = WarmState(artifact.section('index_page').tobytes(), len(corpus.image.surah_list), source,
+                      time.perf_counter() - start, artifact)
+    app.extensions['warmup'] = state
+    return state
+
+
+def corpus_version(app, corpus):
+    """Token that changes with the corpus being served: the artifact key, or where the corpus came from"""
+    state = app.extensions.get('warmup')
+    if state is not None and state.artifact is not None:
+        return state.artifact.key
+    return corpus.source
@@ -0,0 +1,216 @@
+"""
+Per-surah word packs for client-side realtime checking.
+
+With REALTIME_OFFLOAD=1 the recite page does the realtime work itself:
+it downloads the word pack of its surah once from /start/word_pack/<n>
+and aligns the recognizer's results against it in the browser
+(static/word_matcher.js, a port of aligner.StreamingAligner), so no
+/check_realtime requests are sent at all. Only the final transcript goes
+to the server, for /final_analysis. Locate mode and continuous hifz need
+the whole corpus and keep using the server.
+
+A pack is JSON:
+
+    format        WORD_PACK_FORMAT
+    surah         surah number
+    words         the surah's normalized words
+    ayahs         [ayah number, offset of its first word] of every ayah with words
+    table         {char: replacement} wherever the normalizer's translation
+                  table differs from the identity in its precomputed ranges
+    ranges        those ranges, as [start, stop) code points
+    mappings      the raw character mappings (ARABIC_NORMALIZATIONS), for
+                  characters outside the ranges
+    combining     [start, stop) code point ranges with a nonzero canonical
+                  combining class (unicodedata.combining), the marks the
+                  normalizer drops after NFKD (not the same as category M)
+
+It is the same for every visitor and is served through the page cache
+(compressed, with an ETag). The word matcher's normalizer must give the
+same words as arabic_normalizer.ArabicNormalizer; normalizer_cases.json is
+the corpus both are checked against:
+
+    python word_pack.py check [--update]
+
+checks the Python normalizer and, when node is installed, the JavaScript
+one; --update records the Python normalizer's output as the expected one
+(after adding cases). The test suite runs the same check, and also feeds
+the same recitations to aligner.StreamingAligner and the word matcher
+(javascript_alignments), so neither port can drift silently.
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import unicodedata
+from functools import lru_cache
+
+from arabic_normalizer import ARABIC_NORMALIZATIONS, PRECOMPUTED_RANGES, ArabicNormalizer
+
+WORD_PACK_FORMAT = 2
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+MATCHER_PATH = os.path.join(ROOT, 'static', 'word_matcher.js')
+CASES_PATH = os.path.join(ROOT, 'normalizer_cases.json')
+
+
+def normalization_table(normalizer):
+    """{char: replacement} of the precomputed ranges, where the replacement is not the char itself"""
+    table = {}
+    for start, stop in PRECOMPUTED_RANGES:
+        for codepoint in range(start, stop):
+            value = normalizer.table[codepoint]
+            if value != chr(codepoint):
+                table[chr(codepoint)] = value
+    return table
+
+
+@lru_cache(maxsize=1)
+def combining_ranges():
+    """[start, stop) code point ranges where unicodedata.combining() is nonzero"""
+    ranges = []
+    start = None
+    for codepoint in range(sys.maxunicode + 2):
+        combining = codepoint <= sys.maxunicode and unicodedata.combining(chr(codepoint)) != 0
+        if combining and start is None:
+            start = codepoint
+        elif not combining and start is not None:
+            ranges.append([start, codepoint])
+            start = None
+    return ranges
+
+
+def client_normalizer(normalizer):
+    """The normalizer fields of a word pack"""
+    return {
+        'table': normalization_table(normalizer),
+        'ranges': [list(block) for block in PRECOMPUTED_RANGES],
+        'mappings': normalizer.normalizations,
+        'combining': combining_ranges(),
+    }
+
+
+def build_word_pack(surah_index, normalizer):
+    """Word pack of a surah, as a dict"""
+    offsets = surah_index.ayah_offsets
+    ayahs = [[surah_index.word_ayahs[start], start]
+             for start, stop in zip(offsets, offsets[1:]) if start < stop]
+    pack = {
+        'format': WORD_PACK_FORMAT,
+        'surah': surah_index.number,
+        'words': list(surah_index.words),
+        'ayahs': ayahs,
+    }
+    pack.update(client_normalizer(normalizer))
+    return pack
+
+
+def render_word_pack(surah_index, normalizer):
+    """JSON body of a surah's word pack"""
+    return json.dumps(build_word_pack(surah_index, normalizer), ensure_ascii=False, separators=(',', ':'))
+
+
+# Runs the JavaScript normalizer over {"normalizer": ..., "texts": [...]} on stdin
+_NODE_CHECK = """
+const { WordNormalizer } = require(process.argv[1]);
+let input = '';
+process.stdin.on('data', chunk => input += chunk);
+process.stdin.on('end', () => {
+    const request = JSON.parse(input);
+    const normalizer = new WordNormalizer(request.normalizer);
+    const results = request.texts.map(text => [normalizer.normalize(text), normalizer.normalizeWords(text)]);
+    process.stdout.write(JSON.stringify(results));
+});
+"""
+
+# Feeds each recitation of {"words": [...], "recitations": [[batch, ...], ...]} on stdin to a new WordMatcher
+_NODE_MATCH = """
+const { WordMatcher } = require(process.argv[1]);
+let input = '';
+process.stdin.on('data', chunk => input += chunk);
+process.stdin.on('end', () => {
+    const request = JSON.parse(input);
+    const results = request.recitations.map(batches => {
+        const matcher = new WordMatcher(request.words);
+        return batches.map(batch => [matcher.feed(batch), matcher.position]);
+    });
+    process.stdout.write(JSON.stringify(results));
+});
+"""
+
+
+def _mismatches(cases, results):
+    for case, (text, words) in zip(cases, results):
+        if text != case['normalized'] or list(words) != case['words']:
+            yield case['text'], (case['normalized'], case['words']), (text, list(words))
+
+
+def check(update=False):
+    """Check both normalizers against the shared cases; returns the number of mismatches"""
+    with open(CASES_PATH, encoding='utf-8') as f:
+        corpus = json.load(f)
+    cases = corpus['cases']
+    normalizer = ArabicNormalizer(ARABIC_NORMALIZATIONS)
+    python_results = [(normalizer.normalize(case['text']), normalizer.normalize_words(case['text']))
+                      for case in cases]
+
+    if update:
+        for case, (text, words) in zip(cases, python_results):
+            case['normalized'], case['words'] = text, words
+        with open(CASES_PATH, 'w', encoding='utf-8') as f:
+            json.dump(corpus, f, ensure_ascii=False, indent=2)
+            f.write('\n')
+        print(f"Recorded the Python normalizer's output for {len(cases)} cases")
+
+    failures = 0
+    for name, results in (('python', python_results), ('javascript', _javascript_results(normalizer, cases))):
+        if results is None:
+            print(f"{name}: skipped (node is not installed)")
+            continue
+        mismatches = list(_mismatches(cases, results))
+        for text, expected, actual in mismatches:
+            print(f"{name}: {text!r}\n    expected {expected!r}\n    got      {actual!r}")
+        print(f"{name}: {len(cases) - len(mismatches)}/{len(cases)} cases agree")
+        failures += len(mismatches)
+    return failures
+
+
+def _run_node(script, request):
+    node = shutil.which('node')
+    if node is None:
+        return None
+    completed = subprocess.run([node, '-e', script, MATCHER_PATH], input=json.dumps(request),
+                               capture_output=True, text=True, encoding='utf-8', check=True)
+    return json.loads(completed.stdout)
+
+
+def _javascript_results(normalizer, cases):
+    request = {'normalizer': client_normalizer(normalizer), 'texts': [case['text'] for case in cases]}
+    return _run_node(_NODE_CHECK, request)
+
+
+def javascript_alignments(words, recitations):
+    """
+    For each recitation (a list of batches of normalized words), the word
+    matcher's (errors, position) after every batch; None without node.
+    """
+    return _run_node(_NODE_MATCH, {'words': list(words), 'recitations': recitations})
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Word pack tools")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    checker = commands.add_parser('check', help='Check the Python and JavaScript normalizers against the shared cases')
+    checker.add_argument('--update', action='store_true', help="Record the Python normalizer's output as expected first")
+
+    args = parser.parse_args(argv)
+    if args.command == 'check':
+        failures = check(update=args.update)
+        print("✅ Normalizers agree" if not failures else f"❌ {failures} mismatches")
+        sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+The process pool shared by chunked surah analysis (analysis.py) and batch
+grading (batch_grading.py).
+
+There is at most one pool per server process, and it is only ever started
+explicitly, by whoever owns the process, before it runs request threads:
+
+- python app.py and uvicorn asgi:application start it at startup,
+- gunicorn starts it in each worker from a post_fork hook:
+
+      def post_fork(server, worker):
+          import app
+          app.start_worker_pool()
+
+- the batch_grading CLI starts one with its --workers.
+
+Importing the app never forks, and nothing starts, replaces or shuts down
+the pool while serving a request; without a pool everything runs in the
+calling process. Workers are forked from the process that already loaded
+the corpus, so they share it instead of loading it again. The default size
+is small (POOL_WORKERS, at most DEFAULT_MAX_WORKERS) since every web worker
+process carries its own pool.
+"""
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+DEFAULT_MAX_WORKERS = 2
+
+_executor = None
+_workers = 1
+# The process that started the pool; forked children inherit _executor but cannot use it
+_owner = None
+
+
+def default_workers():
+    return int(os.environ.get('POOL_WORKERS', min(os.cpu_count() or 1, DEFAULT_MAX_WORKERS)))
+
+
+def _init_worker():
+    # Results go back through the pool; keep log output off a JSONL stdout (see batch_grading.py)
+    sys.stdout = sys.stderr
+
+
+def _ready():
+    return True
+
+
+def start(workers=None):
+    """
+    Fork the pool's workers now and return it, or None for a single worker.
+
+    A pool that is already running is returned as it is, whatever its size.
+    """
+    global _executor, _workers, _owner
+    workers = default_workers() if workers is None else workers
+    if get_pool() is not None or workers <= 1:
+        return get_pool()
+    executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('fork'),
+                                   initializer=_init_worker)
+    # A forking pool starts all its workers with the first task
+    executor.submit(_ready).result()
+    _executor, _workers, _owner = executor, workers, os.getpid()
+    return executor
+
+
+def get_pool():
+    """The running pool of this process, or None (always None inside a pool worker)"""
+    return _executor if _owner == os.getpid() else None
+
+
+def size():
+    """Worker processes of the running pool, 1 without one"""
+    return _workers if get_pool() is not None else 1
+
+
+def shutdown():
+    global _executor, _workers, _owner
+    if get_pool() is not None:
+        _executor.shutdown()
+    _executor, _workers, _owner = None, 1, None